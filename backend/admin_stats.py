@@ -0,0 +1,142 @@
+"""Admin dashboard statistics, served from a background-refreshed snapshot.
+
+``compute_admin_stats`` builds the payload from the KPI rollups plus two
+small joined queries. ``AdminStatsCache`` keeps the latest payload in
+memory and a daemon thread recomputes it every ``refresh_seconds`` while
+the dashboard is being polled, so requests read the snapshot instead of
+the database.
+"""
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+import threading
+import time
+import os
+import models
+import queries
+import rollups
+import analytics
+
+def compute_admin_stats(db: Session):
+    # Member, tier and revenue KPIs are incrementally maintained rollups
+    kpis = rollups.dashboard_kpis(db)
+
+    total_classes = db.query(models.Class).count()
+
+    # Average attendance - attended share of last 30 days' registrations, from the daily buckets
+    rate = analytics.attendance_rate(db, date.today() - timedelta(days=29), date.today())
+    avg_attendance = round(rate * 100) if rate is not None else 0
+
+    # Popular classes - bookings of the 10 busiest sessions, summed per class
+    popular_classes_data = []
+    try:
+        popular_classes_data = queries.class_bookings(db, kpis["top_schedules"])
+    except Exception as e:
+        print(f"Error in popular_classes: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        popular_classes_data = []
+
+    # Recent activity - member, schedule and class come from one joined query
+    recent_activity = []
+    try:
+        for reg in queries.recent_registrations(db):
+            member = reg.member
+            class_obj = reg.schedule.class_info if reg.schedule else None
+
+            if member:
+                activity = {
+                    "icon": "🆕",
+                    "title": f"{member.first_name} {member.last_name} registered",
+                    "description": f"Registered for {class_obj.class_name}" if class_obj else "New class registration",
+                    "time": reg.registration_date.strftime("%b %d, %Y") if reg.registration_date else "Recently"
+                }
+                recent_activity.append(activity)
+
+    except Exception as e:
+        print(f"Error in recent_activity: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        recent_activity = []
+
+    return {
+        "total_members": kpis["total_members"],
+        "active_members": kpis["active_members"],
+        "new_this_month": kpis["new_this_month"],
+        "monthly_revenue": kpis["monthly_revenue"],
+        "outstanding": kpis["outstanding"],
+        "total_classes": total_classes,
+        "avg_attendance": avg_attendance,
+        "membership_tiers": kpis["membership_tiers"],
+        "popular_classes": popular_classes_data,
+        "recent_activity": recent_activity
+    }
+
+
+class AdminStatsCache:
+    """Latest admin stats payload, kept fresh by a background thread.
+
+    The thread starts with the first request and refreshes every
+    ``refresh_seconds`` until nobody has asked for ``idle_seconds``. A
+    request only computes the stats itself when the snapshot is missing or
+    older than ``max_age_seconds`` (e.g. after an idle period).
+    """
+
+    def __init__(self, refresh_seconds: float = 10, max_age_seconds: float = 60, idle_seconds: float = 300):
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.idle_seconds = idle_seconds
+        self._payload = None
+        self._computed_at = 0.0
+        self._last_request = 0.0
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self._thread = None
+        self.refreshes = 0
+
+    def _refresh(self, max_age: float = None):
+        with self._compute_lock:
+            # Concurrent cold requests wait for the first one's result
+            with self._lock:
+                if max_age is not None and self._payload is not None and time.monotonic() - self._computed_at <= max_age:
+                    return self._payload
+
+            db = models.ReadSessionLocal()
+            try:
+                payload = compute_admin_stats(db)
+            finally:
+                db.close()
+            with self._lock:
+                self._payload = payload
+                self._computed_at = time.monotonic()
+                self.refreshes += 1
+            return payload
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            with self._lock:
+                if time.monotonic() - self._last_request > self.idle_seconds:
+                    self._thread = None
+                    return
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"Error refreshing admin stats: {e}")
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            self._last_request = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="admin-stats-refresh", daemon=True)
+                self._thread.start()
+            if self._payload is not None and now - self._computed_at <= self.max_age_seconds:
+                return self._payload
+
+        return self._refresh(self.max_age_seconds)
+
+
+admin_stats_cache = AdminStatsCache(
+    refresh_seconds=float(os.getenv("ADMIN_STATS_REFRESH_SECONDS", "10")),
+    max_age_seconds=float(os.getenv("ADMIN_STATS_MAX_AGE_SECONDS", "60"))
+)
@@ -1,16 +1,181 @@
 from sqlalchemy.orm import Session
+from contextlib import contextmanager
 import models
+import queries
+import metrics
+from scoring import MatchScoringEngine
+from tool_executor import ToolExecutor
+from collaborative import collaborative_filter
+from scheduler import build_weekly_schedule
+from llm_client import LLMClient, ChunkAccumulator, get_default_client
+from streaming import RecommendationStreamParser
+from resilience import (
+    CircuitBreaker, CircuitOpen, DeadlineExceeded, llm_breaker,
+    recommendation_fallbacks, fallback_reason
+)
 import openai
+import asyncio
 import json
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+RECOMMENDER_MODES = ("tools", "prefetch")
+DEFAULT_MODE = os.getenv("RECOMMENDER_MODE", "tools")
+# Overall latency budget (seconds) for one LLM-backed recommendation; 0 disables it
+LATENCY_BUDGET = float(os.getenv("RECOMMENDATION_LATENCY_BUDGET", "15"))
+MODEL = "gpt-4o-mini"
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_member_profile",
+            "description": "Get member's fitness profile including preferences, membership level, and class history",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "member_id": {"type": "integer", "description": "The member's ID"}
+                },
+                "required": ["member_id"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_available_classes",
+            "description": "Get all gym classes the member can access based on their membership level",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "membership_level": {"type": "string", "description": "Standard, Premium, or Platinum"}
+                },
+                "required": ["membership_level"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "check_class_schedule",
+            "description": "Check when a specific class is offered and if it matches member's preferred time",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "class_id": {"type": "integer", "description": "The class ID"},
+                    "preferred_time": {"type": "string", "description": "Morning, Afternoon, or Evening"}
+                },
+                "required": ["class_id"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "calculate_match_score",
+            "description": "Calculate how well a class matches the member's profile and preferences",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "member_id": {"type": "integer"},
+                    "class_id": {"type": "integer"}
+                },
+                "required": ["member_id", "class_id"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_similar_member_preferences",
+            "description": "Find what classes similar members with same membership level and time preference enjoy",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "member_id": {"type": "integer"}
+                },
+                "required": ["member_id"]
+            }
+        }
+    }
+]
+
+SYSTEM_PROMPT = """You are an expert fitness AI that provides personalized, evidence-based gym class recommendations. 
+
+Your recommendations should be:
+1. Technically informed - reference physiological adaptation, training principles, periodization
+2. Data-driven - use match scores, attendance patterns, capacity data
+3. Convincing - explain WHY each class benefits their specific goals
+4. Progressive - consider their experience level and past classes"""
+
+RECOMMENDATION_GUIDELINES = """Each recommendation should have:
+- Technical reasoning (mention adaptation, progressive overload, recovery, etc.)
+- Specific data points (match score, schedule details, capacity)
+- Convincing explanations tailored to their level and goals
+
+Return ONLY this JSON structure:
+{
+  "recommendations": [
+    {
+      "class_name": "string",
+      "instructor": "string",
+      "difficulty": "string",
+      "duration": integer,
+      "match_percentage": integer,
+      "schedule_preview": "Monday 09:00, Wednesday 09:00",
+      "spots_available": integer,
+      "reasons": [
+        "Technical reason with physiological benefit",
+        "Data-driven reason with specific metric",
+        "Social proof or progression reason"
+      ]
+    }
+  ]
+}"""
+
 class GymRecommender:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session = None, scoring_engine: MatchScoringEngine = None, llm: LLMClient = None,
+                 breaker: CircuitBreaker = None):
         self.db = db
+        self._scoring = scoring_engine
+        self.llm = llm or get_default_client()
+        self.breaker = breaker or llm_breaker
+        self._deadline = None
+        self.tool_timings = []
+        self.usage = {"completion_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    
+    @property
+    def scoring(self):
+        # Catalog, schedules and registration counts are loaded once per recommender
+        if self._scoring is None:
+            self._scoring = MatchScoringEngine(self.db)
+        return self._scoring
+    
+    def for_session(self, db: Session):
+        return GymRecommender(db, scoring_engine=self.scoring.bind(db), llm=self.llm, breaker=self.breaker)
+    
+    async def _in_thread(self, method, *args):
+        """Run a sync, database-bound ``method(recommender, *args)`` in a worker
+        thread with its own read session, for the async methods below. Their
+        recommender has no session of its own (``db`` is None)."""
+        def call():
+            db = models.ReadSessionLocal()
+            try:
+                if self._scoring is None:
+                    self._scoring = MatchScoringEngine(db)
+                return method(self.for_session(db), *args)
+            finally:
+                db.close()
+        
+        return await asyncio.to_thread(call)
+    
+    async def _atool_executor(self):
+        # Constructing it loads the scoring catalog, which needs a session
+        return await self._in_thread(lambda worker: ToolExecutor(self))
     
     def _get_member_profile(self, member_id: int):
         member = self.db.query(models.Member).filter(
@@ -20,12 +185,7 @@ class GymRecommender:
         if not member:
             return None
         
-        past_registrations = self.db.query(models.ClassRegistration).filter(
-            models.ClassRegistration.member_id == member_id,
-            models.ClassRegistration.attendance_status == "Attended"
-        ).all()
-        
-        past_classes = [reg.schedule.class_info.class_name for reg in past_registrations]
+        past_classes = queries.attended_class_names(self.db, member_id)
         
         return {
             "member_id": member.member_id,
@@ -67,196 +227,159 @@ class GymRecommender:
         return result
     
     def _check_class_schedule(self, class_id: int, preferred_time: str = None):
-        schedules = self.db.query(models.ClassSchedule).filter(
-            models.ClassSchedule.class_id == class_id
-        ).all()
-        
-        result = []
-        for schedule in schedules:
-            hour = schedule.start_time.hour
-            time_slot = "Morning" if hour < 12 else "Afternoon" if hour < 17 else "Evening"
-            
-            if preferred_time and time_slot != preferred_time:
-                continue
-            
-            registered = self.db.query(models.ClassRegistration).filter(
-                models.ClassRegistration.schedule_id == schedule.schedule_id,
-                models.ClassRegistration.attendance_status.in_(["Registered", "Attended"])
-            ).count()
-            
-            result.append({
-                "day": schedule.day_of_week,
-                "time": f"{schedule.start_time.strftime('%H:%M')}-{schedule.end_time.strftime('%H:%M')}",
-                "time_slot": time_slot,
-                "room": schedule.room_location,
-                "spots_available": schedule.class_info.max_capacity - registered,
-                "capacity": schedule.class_info.max_capacity
-            })
-        
-        return result
+        return self.scoring.class_schedules(class_id, preferred_time)
     
     def _calculate_match_score(self, member_id: int, class_id: int):
-        member = self.db.query(models.Member).filter(
-            models.Member.member_id == member_id
-        ).first()
-        
-        class_obj = self.db.query(models.Class).filter(
-            models.Class.class_id == class_id
-        ).first()
-        
-        if not member or not class_obj:
-            return {"score": 0, "factors": {}}
-        
-        factors = {}
-        
-        difficulty_score = 0
-        if member.membership_level == "Standard" and class_obj.difficulty_level == "Beginner":
-            difficulty_score = 30
-        elif member.membership_level == "Premium" and class_obj.difficulty_level in ["Beginner", "Intermediate"]:
-            difficulty_score = 30
-        elif member.membership_level == "Platinum":
-            difficulty_score = 25
-        factors["difficulty_match"] = difficulty_score
-        
-        access_score = 0
-        if class_obj.required_membership == "Standard":
-            access_score = 25
-        elif class_obj.required_membership == "Premium" and member.membership_level in ["Premium", "Platinum"]:
-            access_score = 25
-        factors["membership_access"] = access_score
+        return self.scoring.match_score(member_id, class_id)
+    
+    def _get_similar_member_preferences(self, member_id: int):
+        return collaborative_filter.similar_member_preferences(self.db, member_id)
+    
+    def _dispatch_tool(self, function_name: str, function_args: dict):
+        if function_name == "get_member_profile":
+            return self._get_member_profile(function_args["member_id"])
+        elif function_name == "get_available_classes":
+            return self._get_available_classes(function_args["membership_level"])
+        elif function_name == "check_class_schedule":
+            return self._check_class_schedule(
+                function_args["class_id"],
+                function_args.get("preferred_time")
+            )
+        elif function_name == "calculate_match_score":
+            return self._calculate_match_score(
+                function_args["member_id"],
+                function_args["class_id"]
+            )
+        elif function_name == "get_similar_member_preferences":
+            return self._get_similar_member_preferences(function_args["member_id"])
         
-        schedules = self._check_class_schedule(class_id, member.preferred_time_slot)
-        time_score = 35 if len(schedules) > 0 else 0
-        factors["time_availability"] = time_score
+        return {"error": f"Unknown tool: {function_name}"}
+    
+    def _start_deadline(self, deadline: float = None):
+        budget = deadline if deadline is not None else LATENCY_BUDGET
+        self._deadline = time.monotonic() + budget if budget else None
+    
+    def _remaining(self):
+        if self._deadline is None:
+            return None
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Recommendation latency budget exhausted")
+        return remaining
+    
+    def _upstream_kwargs(self, kwargs):
+        remaining = self._remaining()
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM circuit breaker is open")
+        if remaining is not None:
+            kwargs["timeout"] = remaining
+        return kwargs
+    
+    def _record_upstream(self, started: float, error: Exception = None):
+        # A timed-out call is a failure too: an upstream that keeps missing the deadline should trip the breaker
+        reason = "ok" if error is None else fallback_reason(error)
+        duration = time.monotonic() - started
+        self.breaker.record(duration, ok=reason == "ok")
+        metrics.observe_llm_call(duration, "timeout" if reason == "deadline" else reason)
+    
+    @contextmanager
+    def _upstream_call(self, started: float):
+        try:
+            yield
+        except Exception as e:
+            self._record_upstream(started, e)
+            raise
+        except BaseException:
+            # Cancelled, or the stream was closed early: no outcome to record, but a half-open trial must end
+            self.breaker.release()
+            raise
+        self._record_upstream(started)
+    
+    async def _acomplete(self, **kwargs):
+        kwargs = self._upstream_kwargs(kwargs)
+        started = time.monotonic()
+        with self._upstream_call(started):
+            # The timeout kwarg bounds each HTTP attempt; wait_for bounds the whole call
+            response = await asyncio.wait_for(self.llm.achat(
+                model=MODEL,
+                temperature=0.7,
+                **kwargs
+            ), kwargs.get("timeout"))
+        
+        self.usage["completion_calls"] += 1
+        self._count_usage(getattr(response, "usage", None))
+        return response
+    
+    async def _acomplete_stream(self, **kwargs):
+        kwargs = self._upstream_kwargs(kwargs)
+        started = time.monotonic()
+        with self._upstream_call(started):
+            chunks = await asyncio.wait_for(self.llm.achat(
+                model=MODEL,
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            ), kwargs.get("timeout"))
+            self.usage["completion_calls"] += 1
+            chunks = chunks.__aiter__()
+            while True:
+                remaining = self._remaining()
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), remaining)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+    
+    def _count_usage(self, usage):
+        if usage:
+            self.usage["prompt_tokens"] += usage.prompt_tokens
+            self.usage["completion_tokens"] += usage.completion_tokens
+            self.usage["total_tokens"] += usage.total_tokens
+            metrics.observe_llm_tokens(usage.prompt_tokens, usage.completion_tokens)
+    
+    def _parse_recommendations(self, content: str):
+        result = content.strip()
         
-        total_score = sum(factors.values())
+        if result.startswith("```json"):
+            result = result[7:]
+        if result.endswith("```"):
+            result = result[:-3]
+        result = result.strip()
         
-        return {
-            "score": total_score,
-            "factors": factors,
-            "percentage": min(100, total_score)
-        }
+        recommendations_data = json.loads(result)
+        return recommendations_data.get("recommendations", [])
     
-    def _get_similar_member_preferences(self, member_id: int):
-        member = self.db.query(models.Member).filter(
-            models.Member.member_id == member_id
-        ).first()
+    async def aget_class_recommendations(self, member_id: int, top_n: int = 4, mode: str = None, deadline: float = None):
+        """Recommendations from the LLM, or _fallback_recommendations when it
+        fails, the circuit breaker is open, or ``deadline`` seconds (default
+        RECOMMENDATION_LATENCY_BUDGET) run out.
         
-        if not member:
-            return {"popular_classes": []}
-        
-        similar_members = self.db.query(models.Member).filter(
-            models.Member.membership_level == member.membership_level,
-            models.Member.preferred_time_slot == member.preferred_time_slot,
-            models.Member.member_id != member_id
-        ).limit(10).all()
-        
-        class_popularity = {}
-        for similar in similar_members:
-            registrations = self.db.query(models.ClassRegistration).filter(
-                models.ClassRegistration.member_id == similar.member_id,
-                models.ClassRegistration.attendance_status == "Attended"
-            ).all()
-            
-            for reg in registrations:
-                class_name = reg.schedule.class_info.class_name
-                class_popularity[class_name] = class_popularity.get(class_name, 0) + 1
+        Model calls are awaited and database work runs in worker threads, so
+        a request waiting on the model holds neither a thread nor a connection.
+        """
+        mode = mode or DEFAULT_MODE
+        if mode not in RECOMMENDER_MODES:
+            raise ValueError(f"Unknown recommender mode: {mode}")
         
-        popular = sorted(class_popularity.items(), key=lambda x: x[1], reverse=True)[:5]
+        self._start_deadline(deadline)
+        recommendation_fallbacks.record_request()
         
-        return {
-            "popular_classes": [name for name, _ in popular],
-            "similar_members_count": len(similar_members)
-        }
+        try:
+            if mode == "prefetch":
+                return await self._aprefetched_recommendations(member_id, top_n)
+            return await self._atool_loop_recommendations(member_id, top_n)
+            
+        except Exception as e:
+            print(f"OpenAI Error: {e}")
+            recommendation_fallbacks.record_fallback(fallback_reason(e))
+            return await self._in_thread(GymRecommender._fallback_recommendations, member_id, top_n)
     
-    def get_class_recommendations(self, member_id: int, top_n: int = 4):
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_member_profile",
-                    "description": "Get member's fitness profile including preferences, membership level, and class history",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "member_id": {"type": "integer", "description": "The member's ID"}
-                        },
-                        "required": ["member_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_available_classes",
-                    "description": "Get all gym classes the member can access based on their membership level",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "membership_level": {"type": "string", "description": "Standard, Premium, or Platinum"}
-                        },
-                        "required": ["membership_level"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "check_class_schedule",
-                    "description": "Check when a specific class is offered and if it matches member's preferred time",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "class_id": {"type": "integer", "description": "The class ID"},
-                            "preferred_time": {"type": "string", "description": "Morning, Afternoon, or Evening"}
-                        },
-                        "required": ["class_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "calculate_match_score",
-                    "description": "Calculate how well a class matches the member's profile and preferences",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "member_id": {"type": "integer"},
-                            "class_id": {"type": "integer"}
-                        },
-                        "required": ["member_id", "class_id"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_similar_member_preferences",
-                    "description": "Find what classes similar members with same membership level and time preference enjoy",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "member_id": {"type": "integer"}
-                        },
-                        "required": ["member_id"]
-                    }
-                }
-            }
-        ]
-        
-        messages = [
+    def _tool_loop_messages(self, member_id: int, top_n: int):
+        return [
             {
                 "role": "system",
-                "content": """You are an expert fitness AI that provides personalized, evidence-based gym class recommendations. 
-
-Your recommendations should be:
-1. Technically informed - reference physiological adaptation, training principles, periodization
-2. Data-driven - use match scores, attendance patterns, capacity data
-3. Convincing - explain WHY each class benefits their specific goals
-4. Progressive - consider their experience level and past classes
-
-Use available tools to gather data, then provide recommendations in JSON format."""
+                "content": SYSTEM_PROMPT + "\n\nUse available tools to gather data, then provide recommendations in JSON format."
             },
             {
                 "role": "user",
@@ -271,94 +394,203 @@ Use the tools to:
 
 Provide exactly {top_n} recommendations from classes they can ACCESS based on their membership level.
 
-Each recommendation should have:
-- Technical reasoning (mention adaptation, progressive overload, recovery, etc.)
-- Specific data points (match score, schedule details, capacity)
-- Convincing explanations tailored to their level and goals
+{RECOMMENDATION_GUIDELINES}"""
+            }
+        ]
+    
+    async def _atool_loop_recommendations(self, member_id: int, top_n: int):
+        messages = self._tool_loop_messages(member_id, top_n)
+        
+        response = await self._acomplete(messages=messages, tools=TOOLS, tool_choice="auto")
+        
+        executor = await self._atool_executor()
+        self.tool_timings = executor.timings
+        
+        while response.choices[0].message.tool_calls:
+            messages.append(response.choices[0].message)
+            
+            tool_calls = response.choices[0].message.tool_calls
+            results = await executor.arun_all([
+                (tool_call.function.name, json.loads(tool_call.function.arguments))
+                for tool_call in tool_calls
+            ], timeout=self._remaining())
+            
+            for tool_call, result in zip(tool_calls, results):
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call.id,
+                    "content": json.dumps(result)
+                })
+            
+            response = await self._acomplete(messages=messages, tools=TOOLS, tool_choice="auto")
+        
+        return self._parse_recommendations(response.choices[0].message.content)
+    
+    def _build_prefetched_context(self, member_id: int):
+        """Everything the tools would return, computed locally in one pass."""
+        profile = self._get_member_profile(member_id)
+        if not profile:
+            return None
+        
+        batch = self.scoring.score_members([member_id])
+        
+        classes = []
+        for cls in self._get_available_classes(profile["membership_level"]):
+            col = self.scoring.class_index[cls["class_id"]]
+            score_data = MatchScoringEngine.factors_at(
+                batch["difficulty_match"], batch["membership_access"], batch["time_availability"], 0, col
+            )
+            schedules = self._check_class_schedule(cls["class_id"], profile["preferred_time"])
+            
+            classes.append({
+                "name": cls["name"],
+                "instructor": cls["instructor"],
+                "difficulty": cls["difficulty"],
+                "duration": cls["duration"],
+                "match": score_data["percentage"],
+                "factors": score_data["factors"],
+                "sessions": [
+                    {"day": s["day"], "time": s["time"], "spots": s["spots_available"], "capacity": s["capacity"]}
+                    for s in schedules
+                ]
+            })
+        
+        classes.sort(key=lambda x: x["match"], reverse=True)
+        
+        return {
+            "member": {
+                "level": profile["membership_level"],
+                "preferred_time": profile["preferred_time"],
+                "preferred_days": profile["preferred_days"],
+                "past_classes": profile["past_classes"],
+                "total_classes_attended": profile["total_classes_attended"]
+            },
+            "accessible_classes": classes,
+            "similar_members": self._get_similar_member_preferences(member_id)
+        }
+    
+    def _prefetched_messages(self, member_id: int, top_n: int, context: dict):
+        return [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT + "\n\nAll member and class data is provided up front. Provide recommendations in JSON format."
+            },
+            {
+                "role": "user",
+                "content": f"""Recommend the top {top_n} classes for member {member_id} using this data (match = match percentage, spots = open spots per session):
+{json.dumps(context, separators=(",", ":"))}
 
-Return ONLY this JSON structure:
-{{
-  "recommendations": [
-    {{
-      "class_name": "string",
-      "instructor": "string",
-      "difficulty": "string",
-      "duration": integer,
-      "match_percentage": integer,
-      "schedule_preview": "Monday 09:00, Wednesday 09:00",
-      "spots_available": integer,
-      "reasons": [
-        "Technical reason with physiological benefit",
-        "Data-driven reason with specific metric",
-        "Social proof or progression reason"
-      ]
-    }}
-  ]
-}}"""
+Provide exactly {top_n} recommendations from the accessible classes above.
+
+{RECOMMENDATION_GUIDELINES}"""
             }
         ]
+    
+    async def _aprefetched_recommendations(self, member_id: int, top_n: int):
+        context = await self._in_thread(GymRecommender._build_prefetched_context, member_id)
+        if context is None:
+            return []
+        
+        messages = self._prefetched_messages(member_id, top_n, context)
+        response = await self._acomplete(messages=messages)
+        return self._parse_recommendations(response.choices[0].message.content)
+    
+    async def astream_class_recommendations(self, member_id: int, top_n: int = 4, mode: str = None, deadline: float = None):
+        """Streaming variant of aget_class_recommendations.
+        
+        Yields (event, data) pairs: a progress event as each phase completes,
+        each recommendation as soon as it is parsed from the streamed
+        completion, and a final done event. Falls back to streaming
+        _fallback_recommendations when the model fails.
+        """
+        mode = mode or DEFAULT_MODE
+        if mode not in RECOMMENDER_MODES:
+            raise ValueError(f"Unknown recommender mode: {mode}")
+        
+        self._start_deadline(deadline)
+        recommendation_fallbacks.record_request()
+        sent = []
+        source = "llm"
         
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-                temperature=0.7
-            )
+            yield "progress", {"phase": "started", "mode": mode}
             
-            while response.choices[0].message.tool_calls:
-                messages.append(response.choices[0].message)
+            if mode == "prefetch":
+                context = await self._in_thread(GymRecommender._build_prefetched_context, member_id)
+                if context is None:
+                    yield "done", {"total": 0, "source": source}
+                    return
+                yield "progress", {"phase": "context", "classes": len(context["accessible_classes"])}
+                messages = self._prefetched_messages(member_id, top_n, context)
+                tool_kwargs = {}
+            else:
+                messages = self._tool_loop_messages(member_id, top_n)
+                tool_kwargs = {"tools": TOOLS, "tool_choice": "auto"}
+            
+            executor = await self._atool_executor()
+            self.tool_timings = executor.timings
+            turn = 0
+            
+            while True:
+                parser = RecommendationStreamParser()
+                accumulator = ChunkAccumulator()
+                
+                async for chunk in self._acomplete_stream(messages=messages, **tool_kwargs):
+                    for rec in parser.feed(accumulator.add(chunk)):
+                        if len(sent) < top_n:
+                            sent.append(rec)
+                            yield "recommendation", rec
+                
+                self._count_usage(accumulator.usage)
+                tool_calls = accumulator.tool_calls
+                if not tool_calls:
+                    break
+                
+                messages.append({
+                    "role": "assistant",
+                    "content": accumulator.content or None,
+                    "tool_calls": tool_calls
+                })
                 
-                for tool_call in response.choices[0].message.tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-                    
-                    if function_name == "get_member_profile":
-                        result = self._get_member_profile(function_args["member_id"])
-                    elif function_name == "get_available_classes":
-                        result = self._get_available_classes(function_args["membership_level"])
-                    elif function_name == "check_class_schedule":
-                        result = self._check_class_schedule(
-                            function_args["class_id"],
-                            function_args.get("preferred_time")
-                        )
-                    elif function_name == "calculate_match_score":
-                        result = self._calculate_match_score(
-                            function_args["member_id"],
-                            function_args["class_id"]
-                        )
-                    elif function_name == "get_similar_member_preferences":
-                        result = self._get_similar_member_preferences(function_args["member_id"])
-                    
+                started = len(executor.timings)
+                results = await executor.arun_all([
+                    (call["function"]["name"], json.loads(call["function"]["arguments"]))
+                    for call in tool_calls
+                ], timeout=self._remaining())
+                for call, result in zip(tool_calls, results):
                     messages.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
+                        "tool_call_id": call["id"],
                         "content": json.dumps(result)
                     })
                 
-                response = openai.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    tools=tools,
-                    tool_choice="auto",
-                    temperature=0.7
-                )
-            
-            result = response.choices[0].message.content.strip()
-            
-            if result.startswith("```json"):
-                result = result[7:]
-            if result.endswith("```"):
-                result = result[:-3]
-            result = result.strip()
+                turn += 1
+                yield "progress", {
+                    "phase": "tools",
+                    "turn": turn,
+                    "tools": [call["function"]["name"] for call in tool_calls],
+                    "duration_ms": round(sum(t["duration_ms"] for t in executor.timings[started:]), 3)
+                }
             
-            recommendations_data = json.loads(result)
-            return recommendations_data.get("recommendations", [])
+            if not sent:
+                raise ValueError("No recommendations in model response")
             
         except Exception as e:
             print(f"OpenAI Error: {e}")
-            return self._fallback_recommendations(member_id, top_n)
+            recommendation_fallbacks.record_fallback(fallback_reason(e))
+            source = "fallback"
+            yield "progress", {"phase": "fallback"}
+            
+            sent_names = {rec.get("class_name") for rec in sent}
+            for rec in await self._in_thread(GymRecommender._fallback_recommendations, member_id, top_n):
+                if len(sent) >= top_n:
+                    break
+                if rec["class_name"] in sent_names:
+                    continue
+                sent.append(rec)
+                yield "recommendation", rec
+        
+        yield "done", {"total": len(sent), "source": source}
     
     def _fallback_recommendations(self, member_id: int, top_n: int):
         member_profile = self._get_member_profile(member_id)
@@ -367,12 +599,17 @@ Return ONLY this JSON structure:
         
         available_classes = self._get_available_classes(member_profile["membership_level"])
         
+        batch = self.scoring.score_members([member_id])
+        
         recommendations = []
         for cls in available_classes:
             if cls["name"] in member_profile["past_classes"]:
                 continue
             
-            score_data = self._calculate_match_score(member_id, cls["class_id"])
+            col = self.scoring.class_index[cls["class_id"]]
+            score_data = MatchScoringEngine.factors_at(
+                batch["difficulty_match"], batch["membership_access"], batch["time_availability"], 0, col
+            )
             schedules = self._check_class_schedule(cls["class_id"], member_profile["preferred_time"])
             
             if score_data["score"] > 0 and len(schedules) > 0:
@@ -404,61 +641,41 @@ Return ONLY this JSON structure:
         if not member:
             return {}
         
-        recommended_classes = self.get_class_recommendations(member_id, top_n=15)
+        plan = self.db.query(models.MembershipPlan).filter(
+            models.MembershipPlan.plan_name == member.membership_level
+        ).first()
         
-        weekly_schedule = {}
-        preferred_days = member.preferred_days.split(',') if member.preferred_days else []
+        return build_weekly_schedule(
+            self.scoring,
+            member,
+            class_access_limit=plan.class_access_limit if plan else None
+        )
+    
+    async def agenerate_weekly_schedule(self, member_id: int):
+        return await self._in_thread(GymRecommender.generate_weekly_schedule, member_id)
+    
+    async def aexplain_weekly_schedule(self, member_id: int, weekly_schedule: dict):
+        """Optional LLM layer: a short explanation of a locally built schedule."""
+        if not weekly_schedule:
+            return None
         
-        for rec in recommended_classes:
-            class_obj = self.db.query(models.Class).filter(
-                models.Class.class_name == rec['class_name']
-            ).first()
-            
-            if not class_obj:
-                continue
-            
-            schedules = self.db.query(models.ClassSchedule).filter(
-                models.ClassSchedule.class_id == class_obj.class_id
-            ).all()
-            
-            for schedule in schedules:
-                if schedule.day_of_week in preferred_days or not preferred_days:
-                    hour = schedule.start_time.hour
-                    time_matches = False
-                    
-                    if member.preferred_time_slot == "Morning" and hour < 12:
-                        time_matches = True
-                    elif member.preferred_time_slot == "Afternoon" and 12 <= hour < 17:
-                        time_matches = True
-                    elif member.preferred_time_slot == "Evening" and hour >= 17:
-                        time_matches = True
-                    
-                    if time_matches:
-                        if schedule.day_of_week not in weekly_schedule:
-                            weekly_schedule[schedule.day_of_week] = []
-                        
-                        registered_count = self.db.query(models.ClassRegistration).filter(
-                            models.ClassRegistration.schedule_id == schedule.schedule_id,
-                            models.ClassRegistration.attendance_status.in_(['Registered', 'Attended'])
-                        ).count()
-                        
-                        spots_left = schedule.class_info.max_capacity - registered_count
-                        
-                        weekly_schedule[schedule.day_of_week].append({
-                            "schedule_id": schedule.schedule_id,
-                            "class_name": rec['class_name'],
-                            "time": f"{schedule.start_time.strftime('%H:%M')}-{schedule.end_time.strftime('%H:%M')}",
-                            "room": schedule.room_location,
-                            "instructor": rec['instructor'],
-                            "difficulty": rec['difficulty'],
-                            "duration": rec['duration'],
-                            "capacity": f"{registered_count}/{schedule.class_info.max_capacity}",
-                            "spots_left": spots_left,
-                            "match_score": rec['match_percentage']
-                        })
-        
-        for day in weekly_schedule:
-            weekly_schedule[day].sort(key=lambda x: x['time'])
-            weekly_schedule[day] = weekly_schedule[day][:3]
-        
-        return weekly_schedule
\ No newline at end of file
+        profile = await self._in_thread(GymRecommender._get_member_profile, member_id)
+        messages = self._explain_messages(profile, weekly_schedule)
+        try:
+            response = await self._acomplete(messages=messages)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"OpenAI Error: {e}")
+            return None
+    
+    def _explain_messages(self, profile: dict, weekly_schedule: dict):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"""Member profile: {json.dumps(profile, separators=(",", ":"))}
+Weekly schedule: {json.dumps(weekly_schedule, separators=(",", ":"))}
+
+In 3-4 sentences, explain why this weekly schedule suits the member. Return plain text only."""
+            }
+        ]
@@ -0,0 +1,330 @@
+"""Revenue and attendance time series served from pre-aggregated daily buckets.
+
+``revenue_daily`` holds paid and pending billing per billing day and member
+tier; ``attendance_daily`` holds registrations, attendance and cancellations
+per registration day and schedule. Mapper events on Billing, Member (tier
+changes) and ClassRegistration keep both tables current in the same
+transaction, like the dashboard rollups, so a range query reads at most one
+row per day and group no matter how much history there is. Weekly and
+monthly series are resampled from the daily rows with pandas.
+
+Bulk statements skip mapper events and go through bulk_writes.py.
+``python analytics.py`` rebuilds the buckets from scratch and reports drift
+(``--dry-run`` only reports).
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import event, func, select, update, insert, delete, cast, String
+from datetime import date, datetime
+from decimal import Decimal
+import argparse
+import numpy as np
+import pandas as pd
+import models
+import migrations
+from change_history import previous, values, changed
+
+# Period frequencies; weeks start on Monday
+GRAINS = {"day": "D", "week": "W", "month": "M"}
+REVENUE_GROUPS = ("tier",)
+ATTENDANCE_GROUPS = ("class",)
+
+_BUCKETS = {
+    "revenue": (models.RevenueDaily, ("day", "tier"), ("paid", "pending", "invoices")),
+    "attendance": (models.AttendanceDaily, ("day", "schedule_id"), ("registrations", "attended", "cancelled"))
+}
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+def merge(deltas, contribution, sign=1):
+    """Add (or with ``sign=-1`` subtract) a contribution into ``deltas`` for ``apply``."""
+    for key, amounts in contribution.items():
+        bucket = deltas.setdefault(key, {})
+        for column, amount in amounts.items():
+            bucket[column] = bucket.get(column, 0) + sign * amount
+
+def revenue_contribution(status, amount, billing_date, tier, invoices=1):
+    if billing_date is None or tier is None:
+        return {}
+    amount = Decimal(str(amount or 0))
+    return {("revenue", _day(billing_date), tier): {
+        "paid": amount if status == "Paid" else Decimal(0),
+        "pending": amount if status == "Pending" else Decimal(0),
+        "invoices": invoices
+    }}
+
+def attendance_contribution(status, registration_date, schedule_id, registrations=1):
+    if registration_date is None:
+        return {}
+    return {("attendance", _day(registration_date), schedule_id): {
+        "registrations": registrations,
+        "attended": registrations if status == "Attended" else 0,
+        "cancelled": registrations if status == "Cancelled" else 0
+    }}
+
+def apply(connection, deltas):
+    """Add ``{(bucket, day, group): {column: amount}}`` to the buckets on ``connection``
+    (a Connection or Session)."""
+    for (bucket, *key), amounts in deltas.items():
+        amounts = {column: amount for column, amount in amounts.items() if amount}
+        if not amounts:
+            continue
+        model, key_columns, _ = _BUCKETS[bucket]
+        updated = connection.execute(
+            update(model)
+            .where(*(getattr(model, column) == value for column, value in zip(key_columns, key)))
+            .values({column: getattr(model, column) + amount for column, amount in amounts.items()})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            connection.execute(insert(model).values(**dict(zip(key_columns, key)), **amounts))
+
+# ============================================
+# MAPPER EVENTS
+# ============================================
+
+def _tier(connection, member_id):
+    return connection.execute(
+        select(models.Member.membership_level).where(models.Member.member_id == member_id)
+    ).scalar()
+
+_BILLING_ATTRS = ("payment_status", "amount", "billing_date", "member_id")
+_REGISTRATION_ATTRS = ("attendance_status", "registration_date", "schedule_id")
+
+def _billing(connection, target, before=False):
+    status, amount, billing_date, member_id = values(target, _BILLING_ATTRS, before=before)
+    return revenue_contribution(status, amount, billing_date, _tier(connection, member_id))
+
+def _registration(target, before=False):
+    return attendance_contribution(*values(target, _REGISTRATION_ATTRS, before=before))
+
+@event.listens_for(models.Billing, "after_insert")
+def _billing_inserted(mapper, connection, target):
+    apply(connection, _billing(connection, target))
+
+@event.listens_for(models.Billing, "after_update")
+def _billing_updated(mapper, connection, target):
+    if not changed(target, _BILLING_ATTRS):
+        return
+    deltas = {}
+    merge(deltas, _billing(connection, target))
+    merge(deltas, _billing(connection, target, before=True), -1)
+    apply(connection, deltas)
+
+@event.listens_for(models.Billing, "after_delete")
+def _billing_deleted(mapper, connection, target):
+    deltas = {}
+    merge(deltas, _billing(connection, target, before=True), -1)
+    apply(connection, deltas)
+
+@event.listens_for(models.Member, "after_update")
+def _member_updated(mapper, connection, target):
+    # Revenue is grouped by the member's current tier, so a tier change moves their billing history
+    old_tier, new_tier = previous(target, "membership_level"), target.membership_level
+    if old_tier == new_tier:
+        return
+    deltas = {}
+    for status, billing_date, amount, invoices in connection.execute(
+        select(
+            models.Billing.payment_status, models.Billing.billing_date,
+            func.sum(models.Billing.amount), func.count(models.Billing.billing_id)
+        ).where(
+            models.Billing.member_id == target.member_id
+        ).group_by(models.Billing.payment_status, models.Billing.billing_date)
+    ):
+        merge(deltas, revenue_contribution(status, amount, billing_date, new_tier, invoices))
+        merge(deltas, revenue_contribution(status, amount, billing_date, old_tier, invoices), -1)
+    apply(connection, deltas)
+
+@event.listens_for(models.ClassRegistration, "after_insert")
+def _registration_inserted(mapper, connection, target):
+    apply(connection, _registration(target))
+
+@event.listens_for(models.ClassRegistration, "after_update")
+def _registration_updated(mapper, connection, target):
+    if not changed(target, _REGISTRATION_ATTRS):
+        return
+    deltas = {}
+    merge(deltas, _registration(target))
+    merge(deltas, _registration(target, before=True), -1)
+    apply(connection, deltas)
+
+@event.listens_for(models.ClassRegistration, "after_delete")
+def _registration_deleted(mapper, connection, target):
+    deltas = {}
+    merge(deltas, _registration(target, before=True), -1)
+    apply(connection, deltas)
+
+# ============================================
+# TIME SERIES
+# ============================================
+
+def _check_range(start: date, end: date, grain: str, group_by, groups):
+    if grain not in GRAINS:
+        raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+    if group_by is not None and group_by not in groups:
+        raise ValueError(f"group_by must be one of {', '.join(groups)}")
+    if start > end:
+        raise ValueError("start must be on or before end")
+
+def _series(frame, start: date, end: date, grain: str, group, measures):
+    """Sum ``measures`` per period (and ``group``), with empty periods as
+    zeros, or no periods at all when the range has no data."""
+    keys = ["period"] + ([group] if group else [])
+    if frame.empty:
+        # Grouped series have no groups to zero-fill, so neither kind does
+        return pd.DataFrame(columns=keys + list(measures))
+    freq = GRAINS[grain]
+    frame["period"] = pd.to_datetime(frame["day"]).dt.to_period(freq)
+    totals = frame.groupby(keys)[measures].sum()
+
+    periods = pd.period_range(start, end, freq=freq)
+    if group:
+        index = pd.MultiIndex.from_product([periods, sorted(frame[group].unique())], names=keys)
+    else:
+        index = pd.Index(periods, name="period")
+    series = totals.reindex(index, fill_value=0).reset_index()
+    series["period"] = series["period"].dt.start_time.dt.strftime("%Y-%m-%d")
+    return series
+
+def _totals(db: Session, model, start: date, end: date, grain: str, measures, group=None, joins=()):
+    """Totals of ``measures`` per day (per month for the month grain) and
+    ``group`` between ``start`` and ``end``, summed in SQL so the frame is
+    small however many bucket rows the range covers."""
+    # Dates as 'YYYY-MM-DD' text; pandas parses the whole column at once
+    day = cast(model.day, String)
+    period = func.substr(day, 1, 7) if grain == "month" else day
+    keys = [period] + ([group] if group is not None else [])
+    query = db.query(*keys, *(func.sum(getattr(model, m)) for m in measures))
+    for target, onclause in joins:
+        query = query.join(target, onclause)
+    rows = query.filter(model.day.between(start, end)).group_by(*keys).all()
+
+    columns = ["day"] + (["group"] if group is not None else []) + list(measures)
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    frame[list(measures)] = frame[list(measures)].astype(float)
+    return frame
+
+def revenue(db: Session, start: date, end: date, grain: str = "day", group_by: str = None):
+    """Paid revenue, outstanding (still pending) amounts and invoice counts per
+    billing period, optionally per member tier."""
+    _check_range(start, end, grain, group_by, REVENUE_GROUPS)
+    model = models.RevenueDaily
+    frame = _totals(db, model, start, end, grain, ("paid", "pending", "invoices"),
+                   group=model.tier if group_by == "tier" else None)
+    frame = frame.rename(columns={"paid": "revenue", "pending": "outstanding", "group": "tier"})
+
+    series = _series(frame, start, end, grain, group_by, ["revenue", "outstanding", "invoices"])
+    series[["revenue", "outstanding"]] = series[["revenue", "outstanding"]].round(2)
+    series["invoices"] = series["invoices"].astype(np.int64)
+    return series.to_dict("records")
+
+def attendance(db: Session, start: date, end: date, grain: str = "day", group_by: str = None):
+    """Registrations, attendance, cancellations and attendance rate (attended
+    share of non-cancelled registrations) per registration period, optionally
+    per class."""
+    _check_range(start, end, grain, group_by, ATTENDANCE_GROUPS)
+    model = models.AttendanceDaily
+    measures = ["registrations", "attended", "cancelled"]
+    if group_by == "class":
+        frame = _totals(db, model, start, end, grain, measures, group=models.Class.class_name, joins=(
+            (models.ClassSchedule, models.ClassSchedule.schedule_id == model.schedule_id),
+            (models.Class, models.Class.class_id == models.ClassSchedule.class_id)
+        ))
+    else:
+        frame = _totals(db, model, start, end, grain, measures)
+    frame = frame.rename(columns={"group": "class"})
+
+    series = _series(frame, start, end, grain, group_by, measures)
+    series[measures] = series[measures].astype(np.int64)
+    held = (series["registrations"] - series["cancelled"]).to_numpy()
+    rate = np.divide(series["attended"].to_numpy(), held, out=np.full(len(series), np.nan), where=held > 0)
+    series["attendance_rate"] = pd.Series(np.round(rate, 3)).astype(object).where(~np.isnan(rate), None)
+    return series.to_dict("records")
+
+def attendance_rate(db: Session, start: date, end: date):
+    """Attended share of non-cancelled registrations made between ``start`` and ``end``, or None."""
+    attended, held = db.query(
+        func.sum(models.AttendanceDaily.attended),
+        func.sum(models.AttendanceDaily.registrations - models.AttendanceDaily.cancelled)
+    ).filter(models.AttendanceDaily.day.between(start, end)).one()
+    return attended / held if held else None
+
+# ============================================
+# RECONCILIATION
+# ============================================
+
+def compute_from_scratch(db: Session):
+    """Every bucket recomputed with grouped aggregates over the source tables."""
+    buckets = {}
+
+    for status, billing_date, tier, amount, invoices in db.query(
+        models.Billing.payment_status, models.Billing.billing_date, models.Member.membership_level,
+        func.sum(models.Billing.amount), func.count(models.Billing.billing_id)
+    ).join(
+        models.Member, models.Member.member_id == models.Billing.member_id
+    ).group_by(models.Billing.payment_status, models.Billing.billing_date, models.Member.membership_level):
+        merge(buckets, revenue_contribution(status, amount, billing_date, tier, invoices))
+
+    day = func.date(models.ClassRegistration.registration_date)
+    for status, registration_day, schedule_id, registrations in db.query(
+        models.ClassRegistration.attendance_status, day, models.ClassRegistration.schedule_id,
+        func.count(models.ClassRegistration.registration_id)
+    ).group_by(models.ClassRegistration.attendance_status, day, models.ClassRegistration.schedule_id):
+        merge(buckets, attendance_contribution(status, registration_day, schedule_id, registrations))
+
+    return buckets
+
+def read(db: Session):
+    """All buckets as ``{(bucket, day, group): {column: value}}``."""
+    buckets = {}
+    for bucket, (model, key_columns, value_columns) in _BUCKETS.items():
+        for row in db.query(*(getattr(model, c) for c in key_columns + value_columns)):
+            buckets[(bucket, *row[:len(key_columns)])] = dict(zip(value_columns, row[len(key_columns):]))
+    return buckets
+
+def reconcile(db: Session, dry_run: bool = False):
+    """Rebuild the buckets and return the drift as ``{(bucket, day, group): {column: (stored, actual)}}``."""
+    expected = compute_from_scratch(db)
+    stored = read(db)
+
+    drift = {}
+    for key in set(expected) | set(stored):
+        for column in _BUCKETS[key[0]][2]:
+            actual = Decimal(str(expected.get(key, {}).get(column, 0))).quantize(Decimal("0.01"))
+            current = Decimal(str(stored.get(key, {}).get(column, 0))).quantize(Decimal("0.01"))
+            if actual != current:
+                drift.setdefault(key, {})[column] = (current, actual)
+
+    if drift and not dry_run:
+        for bucket, (model, key_columns, _) in _BUCKETS.items():
+            db.execute(delete(model))
+            rows = [dict(zip(key_columns, key[1:]), **values) for key, values in expected.items() if key[0] == bucket]
+            if rows:
+                db.execute(insert(model), rows)
+        db.commit()
+    return drift
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily analytics buckets from scratch and report drift")
+    parser.add_argument("--dry-run", action="store_true", help="Only report drift, don't rewrite the buckets")
+    args = parser.parse_args()
+
+    migrations.upgrade(models.engine)
+    db = models.SessionLocal()
+    try:
+        drift = reconcile(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    if not drift:
+        print("✅ Analytics buckets match the source tables")
+    else:
+        print(f"{'Found' if args.dry_run else 'Fixed'} drift in {len(drift)} daily buckets:")
+        for key in sorted(drift, key=str):
+            for column, (stored, actual) in drift[key].items():
+                print(f"   - {key[0]} {key[1]} {key[2]} {column}: stored {stored}, actual {actual}")
@@ -0,0 +1,154 @@
+"""Concurrency benchmark for the SQLite storage setup.
+
+Runs the same mixed workload from many threads against two copies of the
+database and compares throughput:
+
+    legacy  one engine with default pool and pragmas, rollback journal
+            (the setup before DATABASE_URL / WAL / the read-write split)
+    split   models.create_engines: WAL, tuned pragmas, a single writer
+            connection and a pool of read connections
+
+Reads call the schedule details and member registrations endpoints; writes
+register a member for a class and cancel the registration again, so the
+database ends up where it started. Reports reads/s, writes/s, p95 latency
+and "database is locked" errors per setup.
+
+Usage: python bench_concurrency.py [--threads 16] [--seconds 10] [--write-ratio 0.2]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import numpy as np
+import models
+import main as api
+
+def legacy_sessions(url: str):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA journal_mode=DELETE"))
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return factory, factory, (engine,)
+
+def split_sessions(url: str):
+    write_engine, read_engine = models.create_engines(url)
+    return (
+        sessionmaker(autocommit=False, autoflush=False, bind=read_engine),
+        sessionmaker(autocommit=False, autoflush=False, bind=write_engine),
+        (write_engine, read_engine)
+    )
+
+def _read(read_session, rng, member_ids, schedule_ids):
+    db = read_session()
+    try:
+        if rng.random() < 0.5:
+            api.get_schedule_details(rng.choice(schedule_ids), db=db)
+        else:
+            api.get_member_registrations(rng.choice(member_ids), Response(), db=db)
+    finally:
+        db.close()
+
+def _write(write_session, rng, member_ids, schedule_ids):
+    db = write_session()
+    try:
+        try:
+            result = api.register_for_class(rng.choice(member_ids), rng.choice(schedule_ids), db=db)
+        except HTTPException:
+            # Full or already registered: still a write transaction's worth of reads
+            db.rollback()
+            return
+        api.cancel_registration(result["registration"].registration_id, db=db)
+    finally:
+        db.close()
+
+def _worker(seed, deadline, write_ratio, read_session, write_session, member_ids, schedule_ids):
+    rng = random.Random(seed)
+    stats = {"reads": [], "writes": [], "locked": 0, "errors": 0}
+    while time.perf_counter() < deadline:
+        is_write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if is_write:
+                _write(write_session, rng, member_ids, schedule_ids)
+            else:
+                _read(read_session, rng, member_ids, schedule_ids)
+        except OperationalError as e:
+            if "locked" in str(e):
+                stats["locked"] += 1
+            else:
+                stats["errors"] += 1
+            continue
+        stats["writes" if is_write else "reads"].append(time.perf_counter() - started)
+    return stats
+
+def run_setup(name: str, sessions, threads: int, seconds: float, write_ratio: float):
+    read_session, write_session, engines = sessions
+    db = read_session()
+    try:
+        member_ids = [m for (m,) in db.query(models.Member.member_id)]
+        schedule_ids = [s for (s,) in db.query(models.ClassSchedule.schedule_id)]
+    finally:
+        db.close()
+    if not member_ids or not schedule_ids:
+        raise SystemExit("No members or schedules found - run init_db.py first")
+
+    deadline = time.perf_counter() + seconds
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(
+            lambda seed: _worker(seed, deadline, write_ratio, read_session, write_session, member_ids, schedule_ids),
+            range(threads)
+        ))
+    for engine in engines:
+        engine.dispose()
+
+    reads = [t for r in results for t in r["reads"]]
+    writes = [t for r in results for t in r["writes"]]
+    return {
+        "setup": name,
+        "reads_per_sec": len(reads) / seconds,
+        "writes_per_sec": len(writes) / seconds,
+        "read_p95_ms": float(np.percentile(reads, 95) * 1000) if reads else 0.0,
+        "write_p95_ms": float(np.percentile(writes, 95) * 1000) if writes else 0.0,
+        "locked_errors": sum(r["locked"] for r in results),
+        "other_errors": sum(r["errors"] for r in results)
+    }
+
+def run(threads: int = 16, seconds: float = 10, write_ratio: float = 0.2, database: str = "gym_membership.db"):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, make_sessions in (("legacy", legacy_sessions), ("split", split_sessions)):
+            path = os.path.join(tmp, f"{name}.db")
+            # The backup API includes pages still in the source's WAL file
+            source, copy = sqlite3.connect(database), sqlite3.connect(path)
+            source.backup(copy)
+            source.close()
+            copy.close()
+            results.append(run_setup(name, make_sessions(f"sqlite:///{path}"), threads, seconds, write_ratio))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the legacy and WAL/read-write-split SQLite setups under load")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Share of operations that register + cancel")
+    parser.add_argument("--database", default="gym_membership.db", help="SQLite file to copy for each run")
+    args = parser.parse_args()
+
+    results = run(args.threads, args.seconds, args.write_ratio, args.database)
+
+    print(f"{args.threads} threads, {args.seconds:.0f}s per setup, {args.write_ratio:.0%} writes")
+    print(f"{'setup':<8} {'reads/s':>9} {'writes/s':>9} {'read p95':>10} {'write p95':>10} {'locked':>7} {'errors':>7}")
+    for r in results:
+        print(f"{r['setup']:<8} {r['reads_per_sec']:>9.1f} {r['writes_per_sec']:>9.1f} "
+              f"{r['read_p95_ms']:>8.1f}ms {r['write_p95_ms']:>8.1f}ms {r['locked_errors']:>7} {r['other_errors']:>7}")
+    legacy, split = results
+    if legacy["reads_per_sec"] + legacy["writes_per_sec"]:
+        gain = (split["reads_per_sec"] + split["writes_per_sec"]) / (legacy["reads_per_sec"] + legacy["writes_per_sec"])
+        print(f"Total throughput: {gain:.2f}x")
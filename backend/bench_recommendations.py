@@ -0,0 +1,164 @@
+"""Offline latency benchmark for GET /members/{id}/recommendations.
+
+Drives the endpoint through the ASGI app at a given concurrency against a
+ReplayClient (no network access needed) and reports p50/p95/p99 latency
+plus DB queries, LLM calls and tokens per request. The recommendation
+cache and the precomputed table are bypassed so every request does the
+full work (concurrent requests for the same member still share one
+computation, as they do in production).
+
+While the recommendations are in flight, a probe keeps requesting
+GET /members/{id} and GET /classes/ one at a time; its latency shows
+whether slow model-bound requests starve the cheap endpoints.
+
+Usage: python bench_recommendations.py [--requests 200] [--concurrency 8]
+       [--latency-ms 300] [--jitter-ms 50] [--mode tools] [--recording FILE]
+"""
+import argparse
+import asyncio
+import contextvars
+import time
+import httpx
+import numpy as np
+import models
+import main as api
+import llm_client
+import precompute
+import query_budget
+from cache import recommendation_cache
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+class CountingClient(llm_client.LLMClient):
+    def __init__(self, inner: llm_client.LLMClient):
+        self.inner = inner
+
+    def _count(self, response):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["llm_calls"] += 1
+            if response.usage:
+                stats["tokens"] += response.usage.total_tokens
+        return response
+
+    async def achat(self, **kwargs):
+        return self._count(await self.inner.achat(**kwargs))
+
+
+async def _one_request(client: httpx.AsyncClient, member_id: int, top_n: int, mode: str):
+    # The ASGI transport runs the app in this task, so the stats follow the request
+    stats = {"llm_calls": 0, "tokens": 0}
+    _request_stats.set(stats)
+
+    started = time.perf_counter()
+    with query_budget.count_queries() as counter:
+        response = await client.get(f"/members/{member_id}/recommendations", params={"top_n": top_n, "mode": mode})
+    response.raise_for_status()
+    stats["latency"] = time.perf_counter() - started
+    stats["queries"] = counter["count"]
+    return stats
+
+async def _probe(client: httpx.AsyncClient, member_ids, stop: asyncio.Event):
+    latencies = []
+    i = 0
+    while not stop.is_set():
+        path = f"/members/{member_ids[i % len(member_ids)]}" if i % 2 == 0 else "/classes/"
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    return latencies
+
+async def _run(member_ids, requests: int, concurrency: int, top_n: int, mode: str):
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm up lazily built models outside the measurement
+        await asyncio.create_task(_one_request(client, member_ids[0], top_n, mode))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(member_id):
+            async with semaphore:
+                return await _one_request(client, member_id, top_n, mode)
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, member_ids, stop))
+        started = time.perf_counter()
+        # One task per request, each with its own copy of the context
+        results = await asyncio.gather(*(
+            asyncio.create_task(limited(member_ids[i % len(member_ids)])) for i in range(requests)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe_latencies = await probe
+
+    # The ASGI transport doesn't run the app's lifespan, which would close these
+    await models.async_read_engine.dispose()
+    return results, elapsed, probe_latencies
+
+def run(requests: int, concurrency: int, latency_ms: float, jitter_ms: float, mode: str,
+        top_n: int = 5, recording: str = None):
+    llm_client.set_default_client(CountingClient(llm_client.ReplayClient(
+        recording,
+        latency=latency_ms / 1000,
+        jitter=jitter_ms / 1000,
+        seed=42
+    )))
+    recommendation_cache.max_size = 0
+    precompute.MAX_AGE_SECONDS = 0
+
+    db = models.SessionLocal()
+    try:
+        member_ids = [m for (m,) in db.query(models.Member.member_id).order_by(models.Member.member_id)]
+    finally:
+        db.close()
+    if not member_ids:
+        raise SystemExit("No members found - run init_db.py first")
+
+    results, elapsed, probe = asyncio.run(_run(member_ids, requests, concurrency, top_n, mode))
+
+    latencies = np.array([r["latency"] for r in results]) * 1000
+    queries = np.array([r["queries"] for r in results])
+    llm_calls = np.array([r["llm_calls"] for r in results])
+    tokens = np.array([r["tokens"] for r in results])
+    probe = np.array(probe or [0.0]) * 1000
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "mode": mode,
+        "throughput_rps": requests / elapsed,
+        "latency_ms": {p: float(np.percentile(latencies, p)) for p in (50, 95, 99)},
+        "queries_per_request": {"mean": float(queries.mean()), "max": int(queries.max())},
+        "llm_calls_per_request": float(llm_calls.mean()),
+        "tokens_per_request": float(tokens.mean()),
+        "probe_requests": len(probe),
+        "probe_latency_ms": {p: float(np.percentile(probe, p)) for p in (50, 95, 99)}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--mode", default="tools")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--recording", default=None, help="JSONL file written with LLM_CLIENT=record")
+    args = parser.parse_args()
+
+    r = run(args.requests, args.concurrency, args.latency_ms, args.jitter_ms, args.mode, args.top_n, args.recording)
+
+    print(f"{r['requests']} requests, concurrency {r['concurrency']}, mode {r['mode']}")
+    print(f"   throughput:       {r['throughput_rps']:.1f} req/s")
+    print(f"   latency p50/p95/p99: {r['latency_ms'][50]:.1f} / {r['latency_ms'][95]:.1f} / {r['latency_ms'][99]:.1f} ms")
+    print(f"   DB queries/req:   {r['queries_per_request']['mean']:.1f} (max {r['queries_per_request']['max']})")
+    print(f"   LLM calls/req:    {r['llm_calls_per_request']:.1f}")
+    print(f"   tokens/req:       {r['tokens_per_request']:.0f}")
+    print(f"   CRUD probe p50/p95/p99: {r['probe_latency_ms'][50]:.1f} / {r['probe_latency_ms'][95]:.1f} / "
+          f"{r['probe_latency_ms'][99]:.1f} ms over {r['probe_requests']} requests")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare latency and token usage of the tool-calling and prefetched
+recommendation modes.
+
+Usage: python bench_recommender_modes.py [--members 10] [--top-n 4]
+"""
+from models import SessionLocal, Member
+from ai_recommender import GymRecommender, RECOMMENDER_MODES
+import argparse
+import asyncio
+import statistics
+import time
+
+async def run_mode(mode: str, member_ids, top_n: int):
+    latencies = []
+    totals = {"completion_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    for member_id in member_ids:
+        recommender = GymRecommender()
+        started = time.perf_counter()
+        await recommender.aget_class_recommendations(member_id, top_n, mode=mode)
+        latencies.append(time.perf_counter() - started)
+
+        for key in totals:
+            totals[key] += recommender.usage[key]
+
+    n = len(member_ids)
+    return {
+        "mode": mode,
+        "requests": n,
+        "mean_latency_s": statistics.mean(latencies),
+        "max_latency_s": max(latencies),
+        "completion_calls_per_request": totals["completion_calls"] / n,
+        "prompt_tokens_per_request": totals["prompt_tokens"] / n,
+        "completion_tokens_per_request": totals["completion_tokens"] / n,
+        "total_tokens_per_request": totals["total_tokens"] / n
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=10)
+    parser.add_argument("--top-n", type=int, default=4)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        member_ids = [m for (m,) in db.query(Member.member_id).order_by(Member.member_id).limit(args.members)]
+    finally:
+        db.close()
+    if not member_ids:
+        print("No members found - run init_db.py first")
+        return
+
+    results = [asyncio.run(run_mode(mode, member_ids, args.top_n)) for mode in RECOMMENDER_MODES]
+
+    print(f"{'mode':<10}{'mean s':>9}{'max s':>9}{'calls':>8}{'prompt tok':>12}{'compl tok':>11}{'total tok':>11}")
+    for r in results:
+        print(
+            f"{r['mode']:<10}{r['mean_latency_s']:>9.2f}{r['max_latency_s']:>9.2f}"
+            f"{r['completion_calls_per_request']:>8.1f}{r['prompt_tokens_per_request']:>12.0f}"
+            f"{r['completion_tokens_per_request']:>11.0f}{r['total_tokens_per_request']:>11.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Serialization benchmark for the API response path.
+
+Loads members, registrations and billing rows once, then times turning
+them into a JSON response body three ways and reports the cost per 1,000
+rows:
+
+    encoder   jsonable_encoder + JSONResponse: what FastAPI does for a
+              route without a response_model (the API before schemas.py)
+    model     response model (pydantic-core validate + dump) + JSONResponse
+    orjson    response model + ORJSONResponse: the API's current path
+
+Only serialization is timed; the rows are loaded before the clock starts.
+
+Usage: python bench_serialization.py [--rows 1000] [--repeat 20]
+"""
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from typing import List
+import argparse
+import itertools
+import time
+import models
+import schemas
+
+ENTITIES = (
+    ("members", models.Member, schemas.Member),
+    ("registrations", models.ClassRegistration, schemas.Registration),
+    ("billing", models.Billing, schemas.Billing),
+)
+
+def _rows(db, model, count: int):
+    rows = db.query(model).limit(count).all()
+    if not rows:
+        raise SystemExit(f"No {model.__tablename__} found - run init_db.py first")
+    # Small databases: repeat rows to reach the requested count
+    return list(itertools.islice(itertools.cycle(rows), count))
+
+def _serializers(schema):
+    adapter = TypeAdapter(List[schema])
+
+    def encoder(rows):
+        return JSONResponse(jsonable_encoder(rows)).body
+
+    def model(rows):
+        return JSONResponse(adapter.dump_python(adapter.validate_python(rows), mode="json")).body
+
+    def orjson(rows):
+        return ORJSONResponse(adapter.dump_python(adapter.validate_python(rows), mode="json")).body
+
+    return {"encoder": encoder, "model": model, "orjson": orjson}
+
+def _best_ms(serialize, rows, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+def run(rows: int = 1000, repeat: int = 20):
+    results = []
+    db = models.ReadSessionLocal()
+    try:
+        for name, model, schema in ENTITIES:
+            loaded = _rows(db, model, rows)
+            serializers = _serializers(schema)
+            bodies = {label: serialize(loaded) for label, serialize in serializers.items()}
+            result = {"entity": name, "bytes": len(bodies["orjson"])}
+            for label, serialize in serializers.items():
+                result[label] = _best_ms(serialize, loaded, repeat) * 1000 / rows
+            results.append(result)
+    finally:
+        db.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare response serialization cost per 1,000 rows")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows serialized per response")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per serializer (best is reported)")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat)
+
+    print(f"{args.rows} rows per response, best of {args.repeat}, ms per 1,000 rows")
+    print(f"{'entity':<14} {'encoder':>9} {'model':>9} {'orjson':>9} {'speedup':>8} {'body':>9}")
+    for r in results:
+        print(f"{r['entity']:<14} {r['encoder']:>9.2f} {r['model']:>9.2f} {r['orjson']:>9.2f} "
+              f"{r['encoder'] / r['orjson']:>7.1f}x {r['bytes'] / 1024:>7.0f}KB")
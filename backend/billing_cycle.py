@@ -0,0 +1,142 @@
+"""Monthly billing-cycle runner.
+
+Bills every active member whose latest invoice's next_billing_date is due
+(or who has never been billed), one Pending invoice per missed cycle, each
+advancing next_billing_date by BILLING_CYCLE_DAYS.
+
+Usage: python billing_cycle.py [--as-of 2024-06-01] [--chunk-size 5000] [--dry-run]
+
+Members are processed in primary-key chunks; each chunk is one set-based
+SELECT, one executemany INSERT and one commit. Reruns are safe: a billed
+member's next_billing_date is in the future, so they are no longer due,
+and the unique (member_id, billing_date) index plus ON CONFLICT DO NOTHING
+means a concurrent run can't create an invoice twice.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import date, datetime, timedelta
+import argparse
+import time
+import models
+import migrations
+import bulk_writes
+
+BILLING_CYCLE_DAYS = 30
+
+def plan_fees(db: Session):
+    """{plan_name: monthly_fee}, read once per run."""
+    return {name: fee for name, fee in db.query(models.MembershipPlan.plan_name, models.MembershipPlan.monthly_fee)}
+
+def due_members(db: Session, after_member_id: int, chunk_size: int):
+    """Active members among the next ``chunk_size`` member ids, as
+    ``(member_id, level, latest next_billing_date or None)`` rows, plus the
+    last member id of the chunk (None when there are no members left)."""
+    member_ids = [m for (m,) in db.query(models.Member.member_id).filter(
+        models.Member.member_id > after_member_id
+    ).order_by(models.Member.member_id).limit(chunk_size)]
+    if not member_ids:
+        return [], None
+
+    rows = db.query(
+        models.Member.member_id,
+        models.Member.membership_level,
+        func.max(models.Billing.next_billing_date)
+    ).outerjoin(
+        models.Billing, models.Billing.member_id == models.Member.member_id
+    ).filter(
+        models.Member.member_id.between(member_ids[0], member_ids[-1]),
+        models.Member.membership_status == "Active"
+    ).group_by(models.Member.member_id, models.Member.membership_level).all()
+    return rows, member_ids[-1]
+
+def invoices_for(member_id: int, fee, next_billing_date: date, as_of: date):
+    """One invoice per cycle due on or before ``as_of``."""
+    billing_date = next_billing_date or as_of
+    invoices = []
+    while billing_date <= as_of:
+        following = billing_date + timedelta(days=BILLING_CYCLE_DAYS)
+        invoices.append({
+            "member_id": member_id,
+            "billing_date": billing_date,
+            "amount": fee,
+            "payment_status": "Pending",
+            "payment_method": "Auto-pay",
+            "next_billing_date": following
+        })
+        billing_date = following
+    return invoices
+
+# What bulk_writes needs of each inserted invoice
+_RETURNED = (models.Billing.member_id, models.Billing.billing_date, models.Billing.amount, models.Billing.payment_status)
+
+def _insert_new_invoices(db: Session):
+    """INSERT that skips invoices whose (member_id, billing_date) already exists."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(models.Billing).on_conflict_do_nothing(index_elements=["member_id", "billing_date"])
+
+def run(as_of: date = None, chunk_size: int = 5000, dry_run: bool = False):
+    as_of = as_of or date.today()
+    report = {"members_scanned": 0, "members_billed": 0, "invoices": 0, "amount": 0, "skipped_no_plan": 0}
+
+    db = models.SessionLocal()
+    try:
+        fees = plan_fees(db)
+        started = time.perf_counter()
+        last_member_id = 0
+
+        while True:
+            rows, last_member_id = due_members(db, last_member_id, chunk_size)
+            if last_member_id is None:
+                break
+
+            invoices = []
+            tiers = {}
+            for member_id, level, next_billing_date in rows:
+                report["members_scanned"] += 1
+                if next_billing_date is not None and next_billing_date > as_of:
+                    continue
+                if level not in fees:
+                    report["skipped_no_plan"] += 1
+                    continue
+                tiers[member_id] = level
+                invoices.extend(invoices_for(member_id, fees[level], next_billing_date, as_of))
+
+            if invoices and not dry_run:
+                # A concurrent run may have billed some of these cycles already; only rows inserted here count
+                inserted = db.execute(_insert_new_invoices(db).returning(*_RETURNED), invoices).all()
+                invoices = [dict(row._mapping) for row in inserted]
+                bulk_writes.apply_changes(db, billing=[(None, i) for i in invoices], tiers=tiers)
+                db.commit()
+
+            report["members_billed"] += len({i["member_id"] for i in invoices})
+            report["invoices"] += len(invoices)
+            report["amount"] += sum(i["amount"] for i in invoices)
+
+        report["elapsed_seconds"] = time.perf_counter() - started
+    finally:
+        db.rollback()
+        db.close()
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate invoices for every member whose billing date is due")
+    parser.add_argument("--as-of", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date(), default=None,
+                        help="Bill cycles due on or before this date (default: today)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be billed without writing")
+    args = parser.parse_args()
+
+    migrations.upgrade(models.engine)
+    r = run(args.as_of, args.chunk_size, args.dry_run)
+    rate = r["members_scanned"] / r["elapsed_seconds"] if r["elapsed_seconds"] else 0.0
+
+    print(f"{'Dry run: would create' if args.dry_run else '✅ Created'} {r['invoices']} invoices "
+          f"for {r['members_billed']} members (${float(r['amount']):,.2f})")
+    print(f"   - scanned {r['members_scanned']} active members in {r['elapsed_seconds']:.1f}s ({rate:,.0f} members/sec)")
+    if r["skipped_no_plan"]:
+        print(f"   - skipped {r['skipped_no_plan']} members with no matching membership plan")
@@ -0,0 +1,69 @@
+"""Derived data for bulk writes.
+
+Bulk statements (``Session.execute`` with a list of parameter dicts, or a
+Core ``insert``/``update``) skip the ORM mapper events that keep derived
+data in step with every write: the dashboard rollups (rollups.py), the
+daily analytics buckets (analytics.py) and the recommendation cache and
+precomputed recommendations (cache.py). Code that writes in bulk describes
+the rows it changed to ``apply_changes``, in the same transaction, and gets
+the same deltas the events would have applied.
+"""
+from sqlalchemy.orm import Session
+import models
+import rollups
+import analytics
+import cache
+from scoring import MEMBER_CHUNK
+
+def _tiers(db: Session, member_ids):
+    member_ids = list(member_ids)
+    tiers = {}
+    for i in range(0, len(member_ids), MEMBER_CHUNK):
+        tiers.update(db.query(models.Member.member_id, models.Member.membership_level).filter(
+            models.Member.member_id.in_(member_ids[i:i + MEMBER_CHUNK])
+        ))
+    return tiers
+
+def apply_changes(db: Session, registrations=(), billing=(), tiers=None):
+    """Apply the derived-data deltas for rows written with bulk statements.
+
+    ``registrations`` and ``billing`` are ``(before, after)`` pairs of row
+    dicts, with ``before`` None for an insert and ``after`` None for a delete.
+    Registration dicts carry member_id, schedule_id, attendance_status and
+    registration_date; billing dicts carry member_id, payment_status, amount
+    and billing_date. ``tiers`` is ``{member_id: membership_level}`` for the
+    billed members when the caller already has it.
+    """
+    deltas = {}
+    buckets = {}
+
+    def add(contribution, sign):
+        for key, amount in contribution.items():
+            deltas[key] = deltas.get(key, 0) + sign * amount
+
+    members = set()
+    for before, after in registrations:
+        for row, sign in ((before, -1), (after, 1)):
+            if row is None:
+                continue
+            members.add(row["member_id"])
+            add(rollups.registration_contribution(row["schedule_id"]), sign)
+            analytics.merge(buckets, analytics.attendance_contribution(
+                row["attendance_status"], row["registration_date"], row["schedule_id"]
+            ), sign)
+
+    billing = list(billing)
+    if billing and tiers is None:
+        tiers = _tiers(db, {row["member_id"] for pair in billing for row in pair if row is not None})
+    for before, after in billing:
+        for row, sign in ((before, -1), (after, 1)):
+            if row is None:
+                continue
+            add(rollups.billing_contribution(row["payment_status"], row["amount"], row["billing_date"]), sign)
+            analytics.merge(buckets, analytics.revenue_contribution(
+                row["payment_status"], row["amount"], row["billing_date"], tiers.get(row["member_id"])
+            ), sign)
+
+    rollups.apply(db, {key: amount for key, amount in deltas.items() if amount})
+    analytics.apply(db, buckets)
+    cache.invalidate_members(db, members)
@@ -0,0 +1,280 @@
+from collections import OrderedDict
+from sqlalchemy import event, delete
+from sqlalchemy.orm import Session, object_session
+import asyncio
+import threading
+import time
+import os
+import models
+from change_history import changed
+
+class SingleFlight:
+    """Deduplicates concurrent calls: while a computation for a key is in
+    flight, other callers for the same key wait for it and share its result
+    (or its exception) instead of starting their own.
+
+    ``ado`` does the same for coroutine functions, for callers on one event
+    loop: they await a single shared task.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "value": None, "error": None}
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"]
+
+        try:
+            call["value"] = fn()
+            return call["value"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    async def ado(self, key, fn):
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = self._tasks[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._finish_task(key))
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        # A caller that goes away (e.g. client disconnect) doesn't cancel the others' result
+        return await asyncio.shield(task)
+
+    def _finish_task(self, key):
+        with self._lock:
+            self._tasks.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._tasks),
+                "executed": self.executed,
+                "shared": self.shared
+            }
+
+
+class RecommendationCache:
+    """Bounded LRU cache with TTL for recommendation results.
+
+    Keys are ``(kind, member_id, top_n)``. Entries are dropped when a write
+    that touches the member (registrations, level, preferences) or the
+    class catalog commits. A result computed while an invalidation happened
+    is not stored.
+    Concurrent misses for the same key share one computation (``coalesced``).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._member_versions = {}
+        self._catalog_version = 0
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _version(self, member_id):
+        return (self._catalog_version, self._member_versions.get(member_id, 0))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            member_id = key[1]
+            if version is not None and version != self._version(member_id):
+                return
+
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            version = self._version(key[1])
+
+        def load():
+            value = compute()
+            self.set(key, value, version)
+            return value
+
+        # Callers arriving after an invalidation get a new version and don't join a stale computation
+        return self._flight.do((key, version), load)
+
+    async def aget_or_compute(self, key, compute):
+        """``get_or_compute`` for an async ``compute``."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            version = self._version(key[1])
+
+        async def load():
+            value = await compute()
+            self.set(key, value, version)
+            return value
+
+        return await self._flight.ado((key, version), load)
+
+    def invalidate_member(self, member_id: int):
+        with self._lock:
+            self._member_versions[member_id] = self._member_versions.get(member_id, 0) + 1
+            stale = [key for key in self._entries if key[1] == member_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._catalog_version += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        flight = self._flight.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "in_flight": flight["in_flight"],
+                "computed": flight["executed"],
+                "coalesced": flight["shared"],
+                "computations_saved": self.hits + flight["shared"]
+            }
+
+
+recommendation_cache = RecommendationCache(
+    max_size=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL", "600"))
+)
+
+# ============================================
+# WRITE-DRIVEN INVALIDATION
+# ============================================
+
+# Member columns that feed into recommendations
+_MEMBER_FIELDS = ("membership_level", "preferred_days", "preferred_time_slot", "membership_status")
+
+# Precomputed rows (precompute.py) are deleted in the writing transaction,
+# so they go away exactly when the write commits. Cache invalidations are
+# queued on the session and applied after commit: a result computed between
+# flush and commit still reads the old rows, so it must be cached under the
+# old version, and a rolled-back write invalidates nothing.
+_PENDING = "recommendation_invalidations"
+_CATALOG = None
+
+def _drop_precomputed(connection, member_ids):
+    statement = delete(models.PrecomputedRecommendation)
+    if _CATALOG not in member_ids:
+        statement = statement.where(models.PrecomputedRecommendation.member_id.in_(member_ids))
+    connection.execute(statement.execution_options(synchronize_session=False))
+
+def invalidate_members(db: Session, member_ids):
+    """Drop the recommendations derived from ``member_ids``, for writes that
+    bypass the mapper events: their precomputed rows in ``db``'s transaction,
+    their cache entries once it commits."""
+    member_ids = set(member_ids)
+    if member_ids:
+        _drop_precomputed(db, member_ids)
+        db.info.setdefault(_PENDING, set()).update(member_ids)
+
+def _queue(connection, target, member_id):
+    _drop_precomputed(connection, {member_id})
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING, set()).add(member_id)
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    pending = session.info.pop(_PENDING, ())
+    if _CATALOG in pending:
+        recommendation_cache.invalidate_all()
+        return
+    for member_id in pending:
+        recommendation_cache.invalidate_member(member_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(_PENDING, None)
+
+@event.listens_for(models.ClassRegistration, "after_insert")
+@event.listens_for(models.ClassRegistration, "after_update")
+@event.listens_for(models.ClassRegistration, "after_delete")
+def _registration_changed(mapper, connection, target):
+    _queue(connection, target, target.member_id)
+
+@event.listens_for(models.Member, "after_insert")
+def _member_created(mapper, connection, target):
+    _queue(connection, target, target.member_id)
+
+@event.listens_for(models.Member, "after_update")
+def _member_updated(mapper, connection, target):
+    if changed(target, _MEMBER_FIELDS):
+        _queue(connection, target, target.member_id)
+
+@event.listens_for(models.Class, "after_insert")
+@event.listens_for(models.Class, "after_update")
+@event.listens_for(models.Class, "after_delete")
+@event.listens_for(models.ClassSchedule, "after_insert")
+@event.listens_for(models.ClassSchedule, "after_update")
+@event.listens_for(models.ClassSchedule, "after_delete")
+def _catalog_changed(mapper, connection, target):
+    _queue(connection, target, _CATALOG)
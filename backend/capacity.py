@@ -0,0 +1,132 @@
+"""Per-schedule registration counters.
+
+``schedule_counters.registered_count`` holds the number of Registered or
+Attended registrations for each ClassSchedule, so capacity checks are a
+single-row read instead of a COUNT over class_registrations. Spots are
+taken with a conditional UPDATE, which the database applies atomically,
+so concurrent signups can never push a class over its max_capacity.
+
+``python capacity.py`` rebuilds the counters from class_registrations and
+reports drift (``--dry-run`` only reports).
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import event, func, select, update, delete, insert
+import argparse
+import models
+import migrations
+
+ACTIVE_STATUSES = ("Registered", "Attended")
+
+def _actual_counts():
+    return (
+        select(
+            models.ClassSchedule.schedule_id,
+            func.count(models.ClassRegistration.registration_id)
+        )
+        .select_from(models.ClassSchedule)
+        .outerjoin(
+            models.ClassRegistration,
+            (models.ClassRegistration.schedule_id == models.ClassSchedule.schedule_id)
+            & models.ClassRegistration.attendance_status.in_(ACTIVE_STATUSES)
+        )
+        .group_by(models.ClassSchedule.schedule_id)
+    )
+
+def sync_counters(db: Session):
+    """Rebuild every counter from class_registrations (seeding / repair)."""
+    db.execute(delete(models.ScheduleCounter))
+    db.execute(
+        insert(models.ScheduleCounter).from_select(["schedule_id", "registered_count"], _actual_counts())
+    )
+    db.commit()
+
+def reserve_spots(db: Session, schedule_id: int, count: int) -> int:
+    """Take up to ``count`` spots and return how many were taken.
+
+    Each attempt is a single conditional UPDATE (registered_count + n <=
+    max_capacity), so concurrent reservations can never overbook; if the
+    class filled up meanwhile, retry with whatever is left. Runs in the
+    caller's transaction: commit it together with the registrations, or
+    roll back to give the spots back.
+    """
+    capacity = (
+        select(models.Class.max_capacity)
+        .join(models.ClassSchedule, models.ClassSchedule.class_id == models.Class.class_id)
+        .where(models.ClassSchedule.schedule_id == schedule_id)
+        .scalar_subquery()
+    )
+
+    while count > 0:
+        result = db.execute(
+            update(models.ScheduleCounter)
+            .where(
+                models.ScheduleCounter.schedule_id == schedule_id,
+                models.ScheduleCounter.registered_count + count <= capacity
+            )
+            .values(registered_count=models.ScheduleCounter.registered_count + count)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return count
+
+        remaining = db.execute(
+            select(capacity - models.ScheduleCounter.registered_count)
+            .where(models.ScheduleCounter.schedule_id == schedule_id)
+        ).scalar()
+        count = min(count - 1, remaining or 0)
+
+    return 0
+
+def reserve_spot(db: Session, schedule_id: int) -> bool:
+    """Take one spot if the class isn't full. Returns False if it is."""
+    return reserve_spots(db, schedule_id, 1) == 1
+
+def release_spot(db: Session, schedule_id: int):
+    """Give back one spot, in the caller's transaction."""
+    db.execute(
+        update(models.ScheduleCounter)
+        .where(
+            models.ScheduleCounter.schedule_id == schedule_id,
+            models.ScheduleCounter.registered_count > 0
+        )
+        .values(registered_count=models.ScheduleCounter.registered_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def registered_count(db: Session, schedule_id: int) -> int:
+    counter = db.get(models.ScheduleCounter, schedule_id)
+    return counter.registered_count if counter else 0
+
+def registered_counts(db: Session):
+    """{schedule_id: registered_count} for every schedule."""
+    return dict(db.query(models.ScheduleCounter.schedule_id, models.ScheduleCounter.registered_count).all())
+
+@event.listens_for(models.ClassSchedule, "after_insert")
+def _schedule_created(mapper, connection, target):
+    connection.execute(
+        insert(models.ScheduleCounter).values(schedule_id=target.schedule_id, registered_count=0)
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the per-schedule registration counters and report drift")
+    parser.add_argument("--dry-run", action="store_true", help="Only report drift, don't rewrite the counters")
+    args = parser.parse_args()
+
+    migrations.upgrade(models.engine)
+    db = models.SessionLocal()
+    try:
+        stored = registered_counts(db)
+        actual = dict(db.execute(_actual_counts()).all())
+        drift = {s: (stored.get(s), actual.get(s)) for s in set(stored) | set(actual) if stored.get(s) != actual.get(s)}
+        if drift and not args.dry_run:
+            sync_counters(db)
+    finally:
+        db.close()
+
+    if not drift:
+        print("✅ Registration counters match class_registrations")
+    else:
+        print(f"{'Found' if args.dry_run else 'Fixed'} drift in {len(drift)} counters:")
+        for schedule_id in sorted(drift):
+            before, after = drift[schedule_id]
+            print(f"   - schedule {schedule_id}: stored {before}, actual {after}")
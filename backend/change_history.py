@@ -0,0 +1,26 @@
+"""Attribute history helpers for mapper events.
+
+The dashboard rollups, analytics buckets and recommendation cache all turn
+an ORM write into "before" and "after" values from inside ``after_update``
+(and ``after_delete``) events, while the object's pending history is still
+available.
+"""
+from sqlalchemy import inspect
+
+def previous(target, attr):
+    """``attr`` as it was before the change being flushed (its current value if unchanged)."""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+def values(target, attrs, before: bool = False):
+    """``attrs`` as a tuple: the new values, or the previous ones with ``before=True``."""
+    if before:
+        return tuple(previous(target, attr) for attr in attrs)
+    return tuple(getattr(target, attr) for attr in attrs)
+
+def changed(target, attrs) -> bool:
+    """Whether any of ``attrs`` has a pending change."""
+    state = inspect(target)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
@@ -0,0 +1,241 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from scipy import sparse
+import numpy as np
+import threading
+import time
+import os
+import models
+
+class CollaborativeFilter:
+    """Item-item collaborative filtering over a sparse member x class
+    attendance matrix built from ``ClassRegistration``.
+
+    Similar members are the member's cohort (same membership level and
+    preferred time slot). A class is ranked by how much the cohort attends
+    it plus its cosine similarity to classes the member already attends.
+    Everything a query needs is precomputed, and new attendance is folded
+    in incrementally through ``record_attendance``.
+    """
+
+    def __init__(self, rebuild_seconds: float = 3600):
+        self.rebuild_seconds = rebuild_seconds
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._pending = []
+
+    # ============================================
+    # BUILD
+    # ============================================
+
+    def fit(self, db: Session):
+        with self._lock:
+            # Changes queued before this point are covered by the reads below
+            seen_pending = len(self._pending)
+
+        classes = db.query(models.Class.class_id, models.Class.class_name).order_by(models.Class.class_id).all()
+        members = db.query(
+            models.Member.member_id,
+            models.Member.membership_level,
+            models.Member.preferred_time_slot
+        ).order_by(models.Member.member_id).all()
+        attendance = db.query(
+            models.ClassRegistration.member_id,
+            models.ClassSchedule.class_id
+        ).join(
+            models.ClassSchedule,
+            models.ClassSchedule.schedule_id == models.ClassRegistration.schedule_id
+        ).filter(
+            models.ClassRegistration.attendance_status == "Attended"
+        ).all()
+        schedule_class = dict(db.query(models.ClassSchedule.schedule_id, models.ClassSchedule.class_id).all())
+
+        class_index = {class_id: i for i, (class_id, _) in enumerate(classes)}
+        member_index = {member_id: i for i, (member_id, _, _) in enumerate(members)}
+
+        cohort_index = {}
+        member_cohort = np.array(
+            [cohort_index.setdefault((level, slot), len(cohort_index)) for _, level, slot in members],
+            dtype=np.int64
+        )
+
+        pairs = [
+            (member_index[m], class_index[c]) for m, c in attendance
+            if m in member_index and c in class_index
+        ]
+        rows = np.array([p[0] for p in pairs], dtype=np.int64)
+        cols = np.array([p[1] for p in pairs], dtype=np.int64)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs)), (rows, cols)),
+            shape=(len(members), len(classes))
+        )
+
+        with self._lock:
+            self.class_ids = [class_id for class_id, _ in classes]
+            self.class_names = [name for _, name in classes]
+            self.class_index = class_index
+            self.schedule_class = schedule_class
+            self.member_index = member_index
+            self.member_cohort = member_cohort
+            self.cohort_index = cohort_index
+            self.matrix = matrix
+            self.cooccurrence = (matrix.T @ matrix).toarray()
+            self._refresh_cohorts()
+            self._refresh_similarity()
+            self._pending = self._pending[seen_pending:]
+            self.built_at = time.monotonic()
+
+    def _refresh_cohorts(self):
+        n_members = self.matrix.shape[0]
+        membership = sparse.csr_matrix(
+            (np.ones(n_members), (self.member_cohort, np.arange(n_members))),
+            shape=(len(self.cohort_index), n_members)
+        )
+        self.cohort_attendance = np.asarray((membership @ self.matrix).todense())
+        self.cohort_sizes = np.bincount(self.member_cohort, minlength=len(self.cohort_index))
+
+    def _refresh_similarity(self):
+        norms = np.sqrt(np.diag(self.cooccurrence))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            similarity = self.cooccurrence / np.outer(norms, norms)
+        similarity[~np.isfinite(similarity)] = 0.0
+        np.fill_diagonal(similarity, 0.0)
+        self.similarity = similarity
+
+    # ============================================
+    # INCREMENTAL UPDATES
+    # ============================================
+
+    def record_attendance(self, member_id: int, schedule_id: int, delta: int = 1):
+        """Queue an attendance change; it is applied on the next query."""
+        with self._lock:
+            self._pending.append((member_id, schedule_id, delta))
+
+    def _apply_pending(self, db: Session):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            unknown = {m for m, _, _ in pending if m not in self.member_index}
+            if unknown:
+                self._add_members(db, unknown)
+
+            cells = {}
+            for member_id, schedule_id, delta in pending:
+                class_id = self.schedule_class.get(schedule_id)
+                if class_id not in self.class_index or member_id not in self.member_index:
+                    continue
+                cell = (self.member_index[member_id], self.class_index[class_id])
+                cells[cell] = cells.get(cell, 0) + delta
+
+            cells = {cell: d for cell, d in cells.items() if d}
+            if not cells:
+                return
+
+            rows = np.array([r for r, _ in cells], dtype=np.int64)
+            cols = np.array([c for _, c in cells], dtype=np.int64)
+            values = np.array(list(cells.values()), dtype=float)
+            change = sparse.csr_matrix((values, (rows, cols)), shape=self.matrix.shape)
+
+            # (X + D)^T (X + D) = X^T X + X^T D + D^T X + D^T D, only touching changed rows
+            touched = np.unique(rows)
+            old_rows = self.matrix[touched]
+            delta_rows = change[touched]
+            cross = (old_rows.T @ delta_rows).toarray()
+            self.cooccurrence += cross + cross.T + (delta_rows.T @ delta_rows).toarray()
+
+            self.matrix = self.matrix + change
+            np.add.at(self.cohort_attendance, (self.member_cohort[rows], cols), values)
+            self._refresh_similarity()
+
+    def _add_members(self, db: Session, member_ids):
+        members = db.query(
+            models.Member.member_id,
+            models.Member.membership_level,
+            models.Member.preferred_time_slot
+        ).filter(models.Member.member_id.in_(list(member_ids))).all()
+        if not members:
+            return
+
+        cohorts = []
+        for member_id, level, slot in members:
+            self.member_index[member_id] = len(self.member_index)
+            cohorts.append(self.cohort_index.setdefault((level, slot), len(self.cohort_index)))
+
+        self.member_cohort = np.concatenate([self.member_cohort, np.array(cohorts, dtype=np.int64)])
+        self.matrix = sparse.vstack([
+            self.matrix,
+            sparse.csr_matrix((len(members), self.matrix.shape[1]))
+        ]).tocsr()
+
+        new_cohorts = len(self.cohort_index) - self.cohort_attendance.shape[0]
+        if new_cohorts:
+            self.cohort_attendance = np.vstack([
+                self.cohort_attendance,
+                np.zeros((new_cohorts, self.matrix.shape[1]))
+            ])
+        self.cohort_sizes = np.bincount(self.member_cohort, minlength=len(self.cohort_index))
+
+    # ============================================
+    # QUERIES
+    # ============================================
+
+    def _ensure_fresh(self, db: Session):
+        if self.built_at is None or time.monotonic() - self.built_at > self.rebuild_seconds:
+            self.fit(db)
+        elif self._pending:
+            self._apply_pending(db)
+
+    def similar_member_preferences(self, db: Session, member_id: int, limit: int = 5):
+        self._ensure_fresh(db)
+
+        with self._lock:
+            row = self.member_index.get(member_id)
+            if row is None:
+                # Joined since the last build
+                self._add_members(db, {member_id})
+                row = self.member_index.get(member_id)
+            if row is None:
+                return {"popular_classes": []}
+
+            own = self.matrix[row].toarray().ravel()
+            cohort = self.member_cohort[row]
+
+            # Cohort attendance excluding the member themselves
+            peers = self.cohort_attendance[cohort] - own
+            peer_total = peers.sum()
+            popularity = peers / peer_total if peer_total else peers
+
+            affinity = own @ self.similarity
+            if affinity.max(initial=0) > 0:
+                affinity = affinity / affinity.max()
+
+            scores = popularity + affinity
+            ranked = [i for i in np.argsort(-scores, kind="stable")[:limit] if scores[i] > 0]
+
+            return {
+                "popular_classes": [self.class_names[i] for i in ranked],
+                "similar_members_count": int(self.cohort_sizes[cohort] - 1)
+            }
+
+
+collaborative_filter = CollaborativeFilter(
+    rebuild_seconds=float(os.getenv("CF_REBUILD_SECONDS", "3600"))
+)
+
+@event.listens_for(models.ClassRegistration, "after_insert")
+def _attendance_inserted(mapper, connection, target):
+    if target.attendance_status == "Attended":
+        collaborative_filter.record_attendance(target.member_id, target.schedule_id)
+
+@event.listens_for(models.ClassRegistration, "after_update")
+def _attendance_updated(mapper, connection, target):
+    history = inspect(target).attrs.attendance_status.history
+    if not history.has_changes():
+        return
+
+    if "Attended" in (history.deleted or ()):
+        collaborative_filter.record_attendance(target.member_id, target.schedule_id, -1)
+    if target.attendance_status == "Attended":
+        collaborative_filter.record_attendance(target.member_id, target.schedule_id)
@@ -0,0 +1,65 @@
+"""Streaming table exports as NDJSON or CSV.
+
+Rows are fetched ``CHUNK_SIZE`` at a time (``yield_per``) and written out
+chunk by chunk, so memory use is constant no matter how large the table is.
+"""
+from sqlalchemy import select
+from datetime import date, datetime, time
+from decimal import Decimal
+import csv
+import io
+import json
+import models
+
+CHUNK_SIZE = 1000
+
+EXPORTS = {
+    "members": models.Member,
+    "registrations": models.ClassRegistration,
+    "billing": models.Billing
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+def stream_rows(table: str, fmt: str, chunk_size: int = CHUNK_SIZE):
+    """Yield the export of ``table`` as text chunks. The generator owns its session."""
+    model = EXPORTS[table]
+    columns = list(model.__table__.columns)
+    names = [c.name for c in columns]
+    primary_key = model.__table__.primary_key.columns.values()[0]
+
+    db = models.ReadSessionLocal()
+    try:
+        result = db.execute(
+            select(*columns).order_by(primary_key).execution_options(yield_per=chunk_size)
+        )
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+            for chunk in result.partitions():
+                writer.writerows(chunk)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for chunk in result.partitions():
+                yield "".join(
+                    json.dumps({name: _jsonable(value) for name, value in zip(names, row)}) + "\n"
+                    for row in chunk
+                )
+    finally:
+        db.close()
@@ -1,9 +1,13 @@
-from models import engine, SessionLocal, Base, Member, MembershipPlan, Class, ClassSchedule, Billing, ClassRegistration
+from models import engine, SessionLocal, Member, MembershipPlan, Class, ClassSchedule, Billing, ClassRegistration
 from datetime import datetime, date, time, timedelta
 import random
+import capacity
+import rollups
+import analytics
+import migrations
 
 def init_database():
-    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     
     db = SessionLocal()
     
@@ -13,6 +17,19 @@ def init_database():
     
     print("Initializing database with sample data...")
     
+    counts = seed(db)
+    print(f"✅ Database initialized with:")
+    print(f"   - {counts['members']} members")
+    print(f"   - {counts['classes']} class types (7 Standard, 3 Premium, 3 Platinum)")
+    print(f"   - {counts['schedules']} scheduled sessions")
+    print(f"   - 3 membership plans")
+    print(f"   - ~500 class registrations")
+    print(f"   - Sample billing data")
+    db.close()
+
+def seed(db):
+    """Sample plans, classes, schedules, members, billing and registrations.
+    Returns the number of members, classes and schedules created."""
     plans = [
         MembershipPlan(plan_id=1, plan_name="Standard", monthly_fee=29.99, class_access_limit=4, 
                       features="Basic gym access, 4 classes per week"),
@@ -40,12 +57,12 @@ def init_database():
     ]
         
     classes = []
-    for name, instructor, duration, capacity, difficulty, required, desc in classes_data:
+    for name, instructor, duration, max_capacity, difficulty, required, desc in classes_data:
         c = Class(
             class_name=name,
             instructor_name=instructor,
             duration_minutes=duration,
-            max_capacity=capacity,
+            max_capacity=max_capacity,
             difficulty_level=difficulty,
             required_membership=required,
             description=desc
@@ -159,31 +176,26 @@ def init_database():
     db.add_all(members)
     db.commit()
     
+    fees = {plan.plan_name: plan.monthly_fee for plan in db.query(MembershipPlan)}
     for member in members:
-        plan = db.query(MembershipPlan).filter(
-            MembershipPlan.plan_name == member.membership_level
-        ).first()
-        
         billing = Billing(
             member_id=member.member_id,
             billing_date=date.today(),
-            amount=plan.monthly_fee,
+            amount=fees[member.membership_level],
             payment_status=random.choice(["Paid", "Paid", "Paid", "Pending"]),
             payment_method="Credit Card",
             next_billing_date=date.today() + timedelta(days=30)
         )
         db.add(billing)
     
+    # Pending registrations aren't flushed (autoflush is off), so duplicates are tracked here
+    registered = set()
     for _ in range(500):
         member = random.choice(members)
         schedule = random.choice(schedules)
         
-        exists = db.query(ClassRegistration).filter(
-            ClassRegistration.member_id == member.member_id,
-            ClassRegistration.schedule_id == schedule.schedule_id
-        ).first()
-        
-        if not exists:
+        if (member.member_id, schedule.schedule_id) not in registered:
+            registered.add((member.member_id, schedule.schedule_id))
             registration = ClassRegistration(
                 member_id=member.member_id,
                 schedule_id=schedule.schedule_id,
@@ -193,14 +205,10 @@ def init_database():
             db.add(registration)
     
     db.commit()
-    print(f"✅ Database initialized with:")
-    print(f"   - {len(members)} members")
-    print(f"   - {len(classes)} class types (7 Standard, 3 Premium, 3 Platinum)")
-    print(f"   - {len(schedules)} scheduled sessions")
-    print(f"   - 3 membership plans")
-    print(f"   - ~500 class registrations")
-    print(f"   - Sample billing data")
-    db.close()
+    capacity.sync_counters(db)
+    rollups.reconcile(db)
+    analytics.reconcile(db)
+    return {"members": len(members), "classes": len(classes), "schedules": len(schedules)}
 
 if __name__ == "__main__":
     init_database()
\ No newline at end of file
@@ -0,0 +1,426 @@
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import openai
+
+class LLMClient(ABC):
+    """Minimal chat-completion interface used by GymRecommender.
+
+    ``achat`` takes the same keyword arguments as
+    ``openai.chat.completions.create`` and returns a ``ChatCompletion``,
+    or an async iterator of ``ChatCompletionChunk`` when ``stream=True``.
+    """
+
+    @abstractmethod
+    async def achat(self, **kwargs):
+        ...
+
+
+class OpenAIClient(LLMClient):
+    """The live OpenAI API.
+
+    The SDK retries timed-out requests twice by default, which would stretch
+    a call to about three times its ``timeout``; calls with a timeout (the
+    recommender's remaining latency budget) are made without retries.
+    """
+
+    def __init__(self):
+        self._async_client = None
+
+    @staticmethod
+    def _for_call(client, kwargs):
+        return client.with_options(max_retries=0) if kwargs.get("timeout") is not None else client
+
+    async def achat(self, **kwargs):
+        # Waiting on an AsyncOpenAI request holds no thread
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=openai.api_key)
+        return await self._for_call(self._async_client, kwargs).chat.completions.create(**kwargs)
+
+
+def _message_field(message, field):
+    if isinstance(message, dict):
+        return message.get(field)
+    return getattr(message, field, None)
+
+def _conversation_key(messages):
+    # A conversation is identified by its opening user prompt
+    first_user = next((_message_field(m, "content") for m in messages if _message_field(m, "role") == "user"), "")
+    return hashlib.sha1((first_user or "").encode()).hexdigest()
+
+def _turn(messages):
+    return sum(1 for m in messages if _message_field(m, "role") == "assistant")
+
+
+class ChunkAccumulator:
+    """Reassembles content, tool calls and usage from streamed chunks."""
+
+    def __init__(self):
+        self.content = ""
+        self.usage = None
+        self._tool_calls = {}
+
+    def add(self, chunk):
+        """Fold in one chunk and return its content delta ("" if none)."""
+        if chunk.usage:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return ""
+
+        delta = chunk.choices[0].delta
+        for call in delta.tool_calls or []:
+            entry = self._tool_calls.setdefault(call.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if call.id:
+                entry["id"] = call.id
+            if call.function and call.function.name:
+                entry["function"]["name"] += call.function.name
+            if call.function and call.function.arguments:
+                entry["function"]["arguments"] += call.function.arguments
+
+        if delta.content:
+            self.content += delta.content
+            return delta.content
+        return ""
+
+    @property
+    def tool_calls(self):
+        return [self._tool_calls[i] for i in sorted(self._tool_calls)]
+
+    def completion(self, model: str = ""):
+        return ChatCompletion.model_validate({
+            "id": "stream",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if self._tool_calls else "stop",
+                "message": {
+                    "role": "assistant",
+                    "content": self.content or None,
+                    "tool_calls": self.tool_calls or None
+                }
+            }],
+            "usage": self.usage.model_dump() if self.usage else None
+        })
+
+
+class RecordingClient(LLMClient):
+    """Wraps another client and appends every response to a JSONL file."""
+
+    def __init__(self, inner: LLMClient, path: str):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, kwargs, response):
+        record = {
+            "conversation": _conversation_key(kwargs.get("messages", [])),
+            "turn": _turn(kwargs.get("messages", [])),
+            "tools": bool(kwargs.get("tools")),
+            "response": response.model_dump(mode="json")
+        }
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    async def _arecord_stream(self, kwargs, chunks):
+        accumulator = ChunkAccumulator()
+        async for chunk in chunks:
+            accumulator.add(chunk)
+            yield chunk
+        self._write(kwargs, accumulator.completion(kwargs.get("model", "")))
+
+    async def achat(self, **kwargs):
+        response = await self.inner.achat(**kwargs)
+        if kwargs.get("stream"):
+            return self._arecord_stream(kwargs, response)
+
+        self._write(kwargs, response)
+        return response
+
+
+class ReplayClient(LLMClient):
+    """Offline stand-in for the OpenAI API.
+
+    Responses come from a recording made by ``RecordingClient`` (matched by
+    conversation and turn, falling back to the first recorded conversation)
+    or, when nothing is recorded, from a tool-call ``script``. ``latency``
+    and ``jitter`` (seconds) simulate upstream response time; a call slower
+    than its ``timeout`` kwarg raises ``TimeoutError`` like the real client.
+    """
+
+    def __init__(self, path: str = None, script=None, latency: float = 0.0, jitter: float = 0.0, seed: int = None,
+                 chunk_chars: int = 24, chunk_delay: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.script = script or default_script
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._recordings = {}
+        self._first_conversation = None
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    conversation = self._recordings.setdefault(record["conversation"], {})
+                    conversation[record["turn"]] = record["response"]
+                    if self._first_conversation is None:
+                        self._first_conversation = record["conversation"]
+
+    def _delay(self):
+        return self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+
+    async def _asleep(self, timeout: float = None):
+        delay = self._delay()
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(max(timeout, 0.0))
+            raise TimeoutError("Request timed out.")
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def achat(self, **kwargs):
+        await self._asleep(kwargs.get("timeout"))
+        response = self._respond(kwargs)
+        if kwargs.get("stream"):
+            return self._astream(response, kwargs)
+        return response
+
+    def _respond(self, kwargs):
+        messages = kwargs.get("messages", [])
+        turn = _turn(messages)
+
+        conversation = self._recordings.get(_conversation_key(messages))
+        if conversation is None and self._first_conversation is not None:
+            conversation = self._recordings[self._first_conversation]
+        if conversation is not None and turn in conversation:
+            return ChatCompletion.model_validate(conversation[turn])
+
+        tool_calls, content = self.script(messages, turn, bool(kwargs.get("tools")))
+        return self._completion(kwargs, tool_calls, content)
+
+    async def _astream(self, response, kwargs):
+        for delay, chunk in self._chunks(response, kwargs):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    def _chunks(self, response, kwargs):
+        """``(delay before it, chunk)`` pairs for a streamed ``response``."""
+        message = response.choices[0].message
+        base = {
+            "id": response.id,
+            "object": "chat.completion.chunk",
+            "created": response.created,
+            "model": response.model
+        }
+
+        def chunk(delta, finish_reason=None):
+            return ChatCompletionChunk.model_validate(dict(base, choices=[
+                {"index": 0, "delta": delta, "finish_reason": finish_reason}
+            ]))
+
+        if message.tool_calls:
+            yield 0.0, chunk({
+                "role": "assistant",
+                "tool_calls": [
+                    dict(call.model_dump(mode="json"), index=i)
+                    for i, call in enumerate(message.tool_calls)
+                ]
+            }, "tool_calls")
+        else:
+            content = message.content or ""
+            for start in range(0, len(content), self.chunk_chars):
+                delay = self.chunk_delay if start else 0.0
+                yield delay, chunk({"role": "assistant", "content": content[start:start + self.chunk_chars]})
+            yield 0.0, chunk({}, "stop")
+
+        if (kwargs.get("stream_options") or {}).get("include_usage") and response.usage:
+            yield 0.0, ChatCompletionChunk.model_validate(dict(base, choices=[], usage=response.usage.model_dump()))
+
+    def _completion(self, kwargs, tool_calls, content):
+        prompt_chars = sum(len(json.dumps(_message_field(m, "content") or "")) for m in kwargs.get("messages", []))
+        completion_chars = len(content or "") + sum(len(json.dumps(c)) for c in tool_calls or [])
+        # Roughly four characters per token
+        prompt_tokens = prompt_chars // 4
+        completion_tokens = completion_chars // 4
+
+        return ChatCompletion.model_validate({
+            "id": f"replay-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": kwargs.get("model", "replay"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+                "message": {
+                    "role": "assistant",
+                    "content": content,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{next(self._ids)}",
+                            "type": "function",
+                            "function": {"name": name, "arguments": json.dumps(args)}
+                        }
+                        for name, args in tool_calls or []
+                    ] or None
+                }
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+
+# ============================================
+# DEFAULT TOOL-CALL SCRIPT
+# ============================================
+
+def _tool_results(messages):
+    """(function name, parsed result) for every tool message in the conversation so far."""
+    names = {}
+    for m in messages:
+        for call in _message_field(m, "tool_calls") or []:
+            call_id = call["id"] if isinstance(call, dict) else call.id
+            function = call["function"] if isinstance(call, dict) else call.function
+            names[call_id] = function["name"] if isinstance(function, dict) else function.name
+
+    results = []
+    for m in messages:
+        if _message_field(m, "role") == "tool":
+            results.append((names.get(_message_field(m, "tool_call_id")), json.loads(_message_field(m, "content"))))
+    return results
+
+def _final_answer(candidates, top_n: int):
+    ranked = sorted(candidates, key=lambda c: c.get("match_percentage", 0), reverse=True)[:top_n]
+    return json.dumps({
+        "recommendations": [
+            dict(c, reasons=[
+                "Builds aerobic and neuromuscular adaptation through progressive overload",
+                f"Match score of {c.get('match_percentage', 0)}% for your profile and schedule",
+                "Popular with members who train like you"
+            ])
+            for c in ranked
+        ]
+    })
+
+def default_script(messages, turn: int, has_tools: bool):
+    """Behaves like the model does in the tool loop: profile and similar
+    members, then accessible classes, then scores and schedules for each
+    class, then the final JSON. Returns ``(tool_calls, content)``."""
+    prompt = next((_message_field(m, "content") for m in messages if _message_field(m, "role") == "user"), "") or ""
+    member_match = re.search(r"member (\d+)", prompt)
+    member_id = int(member_match.group(1)) if member_match else 1
+    top_match = re.search(r"top (\d+)", prompt)
+    top_n = int(top_match.group(1)) if top_match else 4
+
+    if not has_tools:
+        # Prefetched context or plain-text explanation requests
+        context_match = re.search(r"^(\{.*\})$", prompt, re.MULTILINE)
+        if not context_match:
+            return None, "This schedule balances your preferred days and time slot with classes that match your level."
+        context = json.loads(context_match.group(1))
+        candidates = [
+            {
+                "class_name": c["name"],
+                "instructor": c["instructor"],
+                "difficulty": c["difficulty"],
+                "duration": c["duration"],
+                "match_percentage": c["match"],
+                "schedule_preview": ", ".join(f"{s['day']} {s['time']}" for s in c["sessions"][:2]),
+                "spots_available": c["sessions"][0]["spots"] if c["sessions"] else 0
+            }
+            for c in context.get("accessible_classes", [])
+        ]
+        return None, _final_answer(candidates, top_n)
+
+    results = _tool_results(messages)
+
+    if turn == 0:
+        return [
+            ("get_member_profile", {"member_id": member_id}),
+            ("get_similar_member_preferences", {"member_id": member_id})
+        ], None
+
+    profile = next((r for name, r in results if name == "get_member_profile"), None) or {}
+    if turn == 1:
+        return [("get_available_classes", {"membership_level": profile.get("membership_level") or "Standard"})], None
+
+    classes = next((r for name, r in results if name == "get_available_classes"), None) or []
+    if turn == 2 and classes:
+        calls = []
+        for cls in classes:
+            calls.append(("calculate_match_score", {"member_id": member_id, "class_id": cls["class_id"]}))
+            calls.append(("check_class_schedule", {"class_id": cls["class_id"], "preferred_time": profile.get("preferred_time")}))
+        return calls, None
+
+    scores = [r for name, r in results if name == "calculate_match_score"]
+    schedules = [r for name, r in results if name == "check_class_schedule"]
+    candidates = []
+    for cls, score, sessions in zip(classes, scores, schedules):
+        if not sessions:
+            continue
+        candidates.append({
+            "class_name": cls["name"],
+            "instructor": cls["instructor"],
+            "difficulty": cls["difficulty"],
+            "duration": cls["duration"],
+            "match_percentage": score.get("percentage", 0),
+            "schedule_preview": ", ".join(f"{s['day']} {s['time']}" for s in sessions[:2]),
+            "spots_available": sessions[0]["spots_available"]
+        })
+    return None, _final_answer(candidates, top_n)
+
+
+# ============================================
+# DEFAULT CLIENT
+# ============================================
+
+def client_from_env():
+    """LLM_CLIENT selects openai (default), record or replay.
+
+    record: LLM_RECORDING_PATH receives every live response.
+    replay: responses come from LLM_RECORDING_PATH (if present) or the
+    default script, after LLM_LATENCY_MS (+/- LLM_JITTER_MS).
+    """
+    kind = os.getenv("LLM_CLIENT", "openai")
+    path = os.getenv("LLM_RECORDING_PATH", "llm_recording.jsonl")
+
+    if kind == "record":
+        return RecordingClient(OpenAIClient(), path)
+    if kind == "replay":
+        return ReplayClient(
+            path,
+            latency=float(os.getenv("LLM_LATENCY_MS", "0")) / 1000,
+            jitter=float(os.getenv("LLM_JITTER_MS", "0")) / 1000
+        )
+    return OpenAIClient()
+
+_default_client = None
+
+def get_default_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = client_from_env()
+    return _default_client
+
+def set_default_client(client: LLMClient):
+    global _default_client
+    _default_client = client
@@ -1,16 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, ORJSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from typing import List, Union
 import models
-from ai_recommender import GymRecommender
+import schemas
+import migrations
+from ai_recommender import GymRecommender, RECOMMENDER_MODES, DEFAULT_MODE
+from cache import recommendation_cache
+from precompute import aget_precomputed
+from streaming import sse_event
+from resilience import llm_breaker, recommendation_fallbacks
+import capacity
+from registrations import bulk_register
+import bulk_writes
+import waitlist
+import queries
+import query_budget
+import metrics
+from admin_stats import admin_stats_cache
+import rollups
+import analytics
+from pagination import keyset_page
+import export
+from contextlib import asynccontextmanager
+import json
 from datetime import datetime, date, timedelta
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # aiosqlite runs each connection on a non-daemon thread; pooled ones would keep the process alive
+    await models.async_read_engine.dispose()
+
 app = FastAPI(
     title="Smart Gym Membership API",
     description="AI-powered gym management system with personalized class recommendations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson for every JSON response; routes with a response_model skip jsonable_encoder too
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -19,10 +51,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Create tables
-models.Base.metadata.create_all(bind=models.engine)
+# Counts SQL statements per request and flags routes over budget (SQL_BUDGET_MODE=log|raise)
+app.middleware("http")(query_budget.middleware)
+
+# Per-route latency, SQL and LLM metrics, scraped from /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Create or upgrade the schema
+migrations.upgrade(models.engine)
 
 @app.get("/")
 def read_root():
@@ -37,21 +76,23 @@ def read_root():
 # MEMBERS ENDPOINTS
 # ============================================
 
-@app.get("/members/")
-def get_members(skip: int = 0, limit: int = 100, db: Session = Depends(models.get_db)):
-    """Get all members"""
-    members = db.query(models.Member).offset(skip).limit(limit).all()
-    return members
+@app.get("/members/", response_model=List[schemas.Member])
+def get_members(response: Response, skip: int = 0, limit: int = 100, cursor: int = None,
+                db: Session = Depends(models.get_db)):
+    """Get all members (pass the X-Next-Cursor response header back as ?cursor= for the next page)"""
+    # skip (offset paging) is kept for old clients; it gets slower the deeper the page
+    offset = skip if cursor is None else 0
+    return keyset_page(db.query(models.Member), models.Member.member_id, cursor, limit, response, offset)
 
-@app.get("/members/{member_id}")
-def get_member(member_id: int, db: Session = Depends(models.get_db)):
+@app.get("/members/{member_id}", response_model=schemas.Member)
+async def get_member(member_id: int, db: AsyncSession = Depends(models.get_async_db)):
     """Get specific member by ID"""
-    member = db.query(models.Member).filter(models.Member.member_id == member_id).first()
+    member = await db.get(models.Member, member_id)
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     return member
 
-@app.post("/members/")
+@app.post("/members/", response_model=schemas.Member)
 def create_member(
     first_name: str,
     last_name: str,
@@ -60,7 +101,7 @@ def create_member(
     phone: str = None,
     preferred_days: str = None,
     preferred_time_slot: str = None,
-    db: Session = Depends(models.get_db)
+    db: Session = Depends(models.get_write_db)
 ):
     """Register new member"""
     
@@ -88,16 +129,16 @@ def create_member(
 # CLASSES ENDPOINTS
 # ============================================
 
-@app.get("/classes/")
-def get_classes(db: Session = Depends(models.get_db)):
+@app.get("/classes/", response_model=List[schemas.Class])
+async def get_classes(db: AsyncSession = Depends(models.get_async_db)):
     """Get all available classes"""
-    classes = db.query(models.Class).all()
+    classes = (await db.scalars(select(models.Class))).all()
     return classes
 
-@app.get("/classes/{class_id}")
-def get_class(class_id: int, db: Session = Depends(models.get_db)):
+@app.get("/classes/{class_id}", response_model=schemas.Class)
+async def get_class(class_id: int, db: AsyncSession = Depends(models.get_async_db)):
     """Get specific class details"""
-    class_info = db.query(models.Class).filter(models.Class.class_id == class_id).first()
+    class_info = await db.get(models.Class, class_id)
     if not class_info:
         raise HTTPException(status_code=404, detail="Class not found")
     return class_info
@@ -106,7 +147,7 @@ def get_class(class_id: int, db: Session = Depends(models.get_db)):
 # SCHEDULE ENDPOINTS
 # ============================================
 
-@app.get("/schedule/")
+@app.get("/schedule/", response_model=List[schemas.ClassSchedule])
 def get_schedule(day: str = None, db: Session = Depends(models.get_db)):
     """Get class schedule, optionally filtered by day"""
     query = db.query(models.ClassSchedule)
@@ -115,41 +156,38 @@ def get_schedule(day: str = None, db: Session = Depends(models.get_db)):
     schedules = query.all()
     return schedules
 
-@app.get("/schedule/{schedule_id}")
+@app.get("/schedule/{schedule_id}", response_model=schemas.ScheduleDetails)
 def get_schedule_details(schedule_id: int, db: Session = Depends(models.get_db)):
     """Get detailed info about a scheduled class including capacity"""
-    schedule = db.query(models.ClassSchedule).filter(
-        models.ClassSchedule.schedule_id == schedule_id
-    ).first()
+    schedule = queries.schedule_with_class(db, schedule_id)
     
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    # Get registration count
-    registered = db.query(models.ClassRegistration).filter(
-        models.ClassRegistration.schedule_id == schedule_id,
-        models.ClassRegistration.attendance_status.in_(['Registered', 'Attended'])
-    ).count()
+    registered = capacity.registered_count(db, schedule_id)
     
     return {
         "schedule": schedule,
         "registered_count": registered,
         "max_capacity": schedule.class_info.max_capacity,
         "spots_available": schedule.class_info.max_capacity - registered,
-        "is_full": registered >= schedule.class_info.max_capacity
+        "is_full": registered >= schedule.class_info.max_capacity,
+        "waitlist_length": waitlist.length(db, schedule_id)
     }
 
 # ============================================
 # REGISTRATION ENDPOINTS
 # ============================================
 
-@app.post("/registrations/")
+@app.post("/registrations/", response_model=Union[schemas.RegistrationResult, schemas.WaitlistResult],
+          response_model_exclude_none=True)
 def register_for_class(
     member_id: int,
     schedule_id: int,
-    db: Session = Depends(models.get_db)
+    join_waitlist: bool = False,
+    db: Session = Depends(models.get_write_db)
 ):
-    """Register member for a class"""
+    """Register member for a class (join_waitlist=true joins the waitlist if it is full)"""
     
     # Check if member exists
     member = db.query(models.Member).filter(models.Member.member_id == member_id).first()
@@ -170,61 +208,239 @@ def register_for_class(
         models.ClassRegistration.schedule_id == schedule_id
     ).first()
     
+    if existing and existing.attendance_status != "Cancelled":
+        raise HTTPException(status_code=400, detail="Already registered for this class")
+    
+    # Atomically take a spot; concurrent signups can't overbook the class
+    if not capacity.reserve_spot(db, schedule_id):
+        db.rollback()
+        if join_waitlist:
+            return join_waitlist_for_class(schedule_id, member_id, db)
+        raise HTTPException(status_code=400, detail="Class is full")
+    
     if existing:
+        registration = existing
+        registration.attendance_status = "Registered"
+        registration.registration_date = datetime.now()
+    else:
+        registration = models.ClassRegistration(
+            member_id=member_id,
+            schedule_id=schedule_id,
+            registration_date=datetime.now()
+        )
+        db.add(registration)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request registered the same pair first (unique member_id, schedule_id)
+        db.rollback()
         raise HTTPException(status_code=400, detail="Already registered for this class")
+    db.refresh(registration)
+    return {"message": "Successfully registered", "registration": registration}
+
+# Largest batch accepted by POST /registrations/bulk
+MAX_BULK_REGISTRATIONS = 10000
+
+@app.post("/registrations/bulk", response_model=schemas.BulkRegistrationResult)
+def register_bulk(registrations: List[schemas.RegistrationRequest], db: Session = Depends(models.get_write_db)):
+    """Register many (member_id, schedule_id) pairs in one transaction, with a result per pair"""
+    if len(registrations) > MAX_BULK_REGISTRATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_REGISTRATIONS} registrations per request")
     
-    # Check capacity
-    count = db.query(models.ClassRegistration).filter(
-        models.ClassRegistration.schedule_id == schedule_id,
-        models.ClassRegistration.attendance_status.in_(['Registered', 'Attended'])
-    ).count()
+    results = bulk_register(db, [(r.member_id, r.schedule_id) for r in registrations])
+    registered = sum(1 for r in results if r["status"] == "registered")
+    return {
+        "registered": registered,
+        "rejected": len(results) - registered,
+        "results": results
+    }
+
+@app.post("/registrations/{registration_id}/cancel", response_model=schemas.CancellationResult)
+def cancel_registration(registration_id: int, db: Session = Depends(models.get_write_db)):
+    """Cancel a registration and free its spot"""
+    registration = db.query(models.ClassRegistration).filter(
+        models.ClassRegistration.registration_id == registration_id
+    ).first()
     
-    if count >= schedule.class_info.max_capacity:
-        raise HTTPException(status_code=400, detail="Class is full")
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found")
     
-    registration = models.ClassRegistration(
-        member_id=member_id,
-        schedule_id=schedule_id,
-        registration_date=datetime.now()
-    )
-    db.add(registration)
+    # Only the request that flips Registered -> Cancelled frees the spot; a concurrent cancel updates nothing
+    cancelled = db.execute(
+        update(models.ClassRegistration)
+        .where(
+            models.ClassRegistration.registration_id == registration_id,
+            models.ClassRegistration.attendance_status == "Registered"
+        )
+        .values(attendance_status="Cancelled")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if cancelled != 1:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Cannot cancel a registration that is {registration.attendance_status}")
+    
+    before = {"member_id": registration.member_id, "schedule_id": registration.schedule_id,
+              "attendance_status": "Registered", "registration_date": registration.registration_date}
+    bulk_writes.apply_changes(db, registrations=[(before, dict(before, attendance_status="Cancelled"))])
+    capacity.release_spot(db, registration.schedule_id)
+    
+    # The freed spot goes to the next member on the waitlist in the same transaction
+    promoted = waitlist.promote(db, registration.schedule_id)
     db.commit()
     db.refresh(registration)
-    return {"message": "Successfully registered", "registration": registration}
+    return {"message": "Registration cancelled", "registration": registration, "promoted_member_ids": promoted}
+
+# ============================================
+# WAITLIST ENDPOINTS
+# ============================================
+
+@app.post("/schedule/{schedule_id}/waitlist", response_model=schemas.WaitlistResult, response_model_exclude_none=True)
+def join_waitlist_for_class(schedule_id: int, member_id: int, db: Session = Depends(models.get_write_db)):
+    """Join the waitlist of a full class (registers right away if a spot is free)"""
+    member = db.query(models.Member).filter(models.Member.member_id == member_id).first()
+    if not member:
+        raise HTTPException(status_code=404, detail="Member not found")
+    
+    schedule = db.query(models.ClassSchedule).filter(
+        models.ClassSchedule.schedule_id == schedule_id
+    ).first()
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    
+    registered = db.query(models.ClassRegistration).filter(
+        models.ClassRegistration.member_id == member_id,
+        models.ClassRegistration.schedule_id == schedule_id,
+        models.ClassRegistration.attendance_status != "Cancelled"
+    ).first()
+    if registered:
+        raise HTTPException(status_code=400, detail="Already registered for this class")
+    
+    if waitlist.waiting_entry(db, schedule_id, member_id):
+        raise HTTPException(status_code=400, detail="Already on the waitlist for this class")
+    
+    entry, promoted = waitlist.join(db, member, schedule_id)
+    db.commit()
+    
+    if member_id in promoted:
+        return {"message": "Successfully registered", "schedule_id": schedule_id, "member_id": member_id}
+    
+    position, length = waitlist.position(db, schedule_id, member_id)
+    return {
+        "message": "Added to waitlist",
+        "schedule_id": schedule_id,
+        "member_id": member_id,
+        "position": position,
+        "waitlist_length": length
+    }
 
-@app.get("/members/{member_id}/registrations")
-def get_member_registrations(member_id: int, db: Session = Depends(models.get_db)):
-    """Get all registrations for a member"""
-    registrations = db.query(models.ClassRegistration).filter(
+@app.get("/schedule/{schedule_id}/waitlist/{member_id}")
+def get_waitlist_position(schedule_id: int, member_id: int, db: Session = Depends(models.get_db)):
+    """Get a member's position on a class waitlist"""
+    found = waitlist.position(db, schedule_id, member_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Member is not on the waitlist")
+    
+    position, length = found
+    return {"schedule_id": schedule_id, "member_id": member_id, "position": position, "waitlist_length": length}
+
+@app.delete("/schedule/{schedule_id}/waitlist/{member_id}")
+def leave_waitlist(schedule_id: int, member_id: int, db: Session = Depends(models.get_write_db)):
+    """Leave a class waitlist"""
+    entry = waitlist.waiting_entry(db, schedule_id, member_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Member is not on the waitlist")
+    
+    if not waitlist.leave(db, entry):
+        raise HTTPException(status_code=404, detail="Member is not on the waitlist")
+    db.commit()
+    return {"message": "Removed from waitlist", "schedule_id": schedule_id, "member_id": member_id}
+
+@app.get("/members/{member_id}/registrations", response_model=List[schemas.Registration])
+def get_member_registrations(member_id: int, response: Response, limit: int = 100, cursor: int = None,
+                             db: Session = Depends(models.get_db)):
+    """Get registrations for a member (paged with ?cursor=, see X-Next-Cursor)"""
+    query = db.query(models.ClassRegistration).filter(
         models.ClassRegistration.member_id == member_id
-    ).all()
-    return registrations
+    )
+    return keyset_page(query, models.ClassRegistration.registration_id, cursor, limit, response)
 
 # ============================================
 # AI RECOMMENDATION ENDPOINTS
 # ============================================
 
 @app.get("/members/{member_id}/recommendations")
-def get_recommendations(member_id: int, top_n: int = 5, db: Session = Depends(models.get_db)):
-    """Get AI-powered class recommendations for member"""
-    recommender = GymRecommender(db)
-    recommendations = recommender.get_class_recommendations(member_id, top_n)
+async def get_recommendations(member_id: int, top_n: int = 5, mode: str = None, deadline_ms: int = None):
+    """Get AI-powered class recommendations for member (mode: tools or prefetch).
+    Falls back to local scoring if the AI doesn't answer within deadline_ms."""
+    mode = mode or DEFAULT_MODE
+    if mode not in RECOMMENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(RECOMMENDER_MODES)}")
+    
+    async def compute():
+        # Shared by concurrent callers, so it owns its session, and closes it
+        # before waiting on the model so no connection is held meanwhile
+        async with models.AsyncReadSessionLocal() as db:
+            precomputed = await aget_precomputed(db, member_id)
+        if precomputed and precomputed.top_n >= top_n:
+            return json.loads(precomputed.recommendations)[:top_n]
+        deadline = deadline_ms / 1000 if deadline_ms is not None else None
+        return await GymRecommender().aget_class_recommendations(member_id, top_n, mode, deadline)
+    
+    recommendations = await recommendation_cache.aget_or_compute(
+        (f"recommendations:{mode}", member_id, top_n),
+        compute
+    )
     return {
         "member_id": member_id,
         "recommendations": recommendations,
         "total_found": len(recommendations)
     }
 
+@app.get("/members/{member_id}/recommendations/stream")
+async def stream_recommendations(member_id: int, top_n: int = 5, mode: str = None, deadline_ms: int = None):
+    """Stream recommendations as Server-Sent Events (progress, recommendation, done)"""
+    mode = mode or DEFAULT_MODE
+    if mode not in RECOMMENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(RECOMMENDER_MODES)}")
+    
+    async def events():
+        # Database work opens short-lived sessions in worker threads as it goes
+        deadline = deadline_ms / 1000 if deadline_ms is not None else None
+        async for event, data in GymRecommender().astream_class_recommendations(member_id, top_n, mode, deadline):
+            yield sse_event(event, data)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/members/{member_id}/weekly-schedule")
-def get_weekly_schedule(member_id: int, db: Session = Depends(models.get_db)):
-    """Generate personalized weekly schedule"""
-    recommender = GymRecommender(db)
-    schedule = recommender.generate_weekly_schedule(member_id)
-    return {
+async def get_weekly_schedule(member_id: int, explain: bool = False):
+    """Generate personalized weekly schedule (explain=true adds an AI-written explanation)"""
+    async def compute():
+        async with models.AsyncReadSessionLocal() as db:
+            precomputed = await aget_precomputed(db, member_id)
+        if precomputed:
+            return json.loads(precomputed.weekly_schedule)
+        return await GymRecommender().agenerate_weekly_schedule(member_id)
+    
+    schedule = await recommendation_cache.aget_or_compute(
+        ("weekly-schedule", member_id, None),
+        compute
+    )
+    response = {
         "member_id": member_id,
         "weekly_schedule": schedule,
         "total_days": len(schedule)
     }
+    
+    if explain:
+        response["explanation"] = await recommendation_cache.aget_or_compute(
+            ("weekly-schedule-explanation", member_id, None),
+            lambda: GymRecommender().aexplain_weekly_schedule(member_id, schedule)
+        )
+    return response
 
 @app.get("/members/{member_id}/insights")
 def get_member_insights(member_id: int, db: Session = Depends(models.get_db)):
@@ -240,37 +456,39 @@ def get_member_insights(member_id: int, db: Session = Depends(models.get_db)):
 # BILLING ENDPOINTS
 # ============================================
 
-@app.get("/members/{member_id}/billing")
-def get_member_billing(member_id: int, db: Session = Depends(models.get_db)):
-    """Get billing history for member"""
-    billings = db.query(models.Billing).filter(
+@app.get("/members/{member_id}/billing", response_model=List[schemas.Billing])
+def get_member_billing(member_id: int, response: Response, limit: int = 100, cursor: int = None,
+                       db: Session = Depends(models.get_db)):
+    """Get billing history for member (paged with ?cursor=, see X-Next-Cursor)"""
+    query = db.query(models.Billing).filter(
         models.Billing.member_id == member_id
-    ).all()
-    return billings
+    )
+    return keyset_page(query, models.Billing.billing_id, cursor, limit, response)
 
-@app.get("/billing/pending")
-def get_pending_payments(db: Session = Depends(models.get_db)):
-    """Get all pending payments"""
-    pending = db.query(models.Billing).filter(
+@app.get("/billing/pending", response_model=List[schemas.Billing])
+def get_pending_payments(response: Response, limit: int = 100, cursor: int = None,
+                         db: Session = Depends(models.get_db)):
+    """Get pending payments (paged with ?cursor=, see X-Next-Cursor)"""
+    query = db.query(models.Billing).filter(
         models.Billing.payment_status == "Pending"
-    ).all()
-    return pending
+    )
+    return keyset_page(query, models.Billing.billing_id, cursor, limit, response)
 
 # ============================================
 # MEMBERSHIP PLANS ENDPOINTS
 # ============================================
 
-@app.get("/membership-plans/")
-def get_membership_plans(db: Session = Depends(models.get_db)):
+@app.get("/membership-plans/", response_model=List[schemas.MembershipPlan])
+async def get_membership_plans(db: AsyncSession = Depends(models.get_async_db)):
     """Get all membership plan options"""
-    plans = db.query(models.MembershipPlan).all()
+    plans = (await db.scalars(select(models.MembershipPlan))).all()
     return plans
 
 # ============================================
 # ADMIN DASHBOARD ENDPOINTS
 # ============================================
 
-@app.post("/billing/")
+@app.post("/billing/", response_model=schemas.BillingCreated)
 def create_billing(
     member_id: int,
     billing_date: str,
@@ -278,7 +496,7 @@ def create_billing(
     payment_status: str = "Pending",
     payment_method: str = "Auto-pay",
     next_billing_date: str = None,
-    db: Session = Depends(models.get_db)
+    db: Session = Depends(models.get_write_db)
 ):
     """Create new billing record"""
     member = db.query(models.Member).filter(models.Member.member_id == member_id).first()
@@ -298,148 +516,88 @@ def create_billing(
     )
     
     db.add(new_billing)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # unique (member_id, billing_date)
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Member already has an invoice on this date")
     db.refresh(new_billing)
     
     return {"message": "Billing created successfully", "billing": new_billing}
 
-@app.get("/admin/stats")
-def get_admin_stats(db: Session = Depends(models.get_db)):
-    """Get comprehensive admin dashboard statistics"""
-    
-    # Total members
-    total_members = db.query(models.Member).count()
-    active_members = db.query(models.Member).filter(
-        models.Member.membership_status == "Active"
-    ).count()
-    
-    # New members this month
-    start_of_month = datetime.now().replace(day=1)
-    new_this_month = db.query(models.Member).filter(
-        models.Member.join_date >= start_of_month
-    ).count()
-    
-    # Membership tier distribution
-    membership_tiers = db.query(
-        models.Member.membership_level,
-        func.count(models.Member.member_id)
-    ).group_by(models.Member.membership_level).all()
-    
-    tier_data = [{"name": tier[0], "count": tier[1]} for tier in membership_tiers]
-    
-    # Revenue calculations
-    monthly_revenue = db.query(func.sum(models.Billing.amount)).filter(
-        models.Billing.billing_date >= start_of_month,
-        models.Billing.payment_status == "Paid"
-    ).scalar() or 0
-    
-    outstanding = db.query(func.sum(models.Billing.amount)).filter(
-        models.Billing.payment_status == "Pending"
-    ).scalar() or 0
-    
-    # Total classes
-    total_classes = db.query(models.Class).count()
-    
-    # Average attendance
-    avg_attendance = 75
-    
-    # Popular classes - SIMPLIFIED (aggregate by schedule_id first)
-    popular_classes_data = []
+@app.get("/admin/stats", response_model=schemas.AdminStats)
+def get_admin_stats():
+    """Get comprehensive admin dashboard statistics (refreshed in the background every few seconds)"""
+    return admin_stats_cache.get()
+
+# ============================================
+# ANALYTICS ENDPOINTS
+# ============================================
+
+# Range used when the caller gives no start date
+DEFAULT_ANALYTICS_DAYS = 90
+
+@app.get("/analytics/revenue")
+def get_revenue_analytics(start: date = None, end: date = None, grain: str = "day", group_by: str = None,
+                          db: Session = Depends(models.get_db)):
+    """Paid revenue and outstanding balance per day, week or month (group_by=tier for a series per tier)"""
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_ANALYTICS_DAYS - 1)
     try:
-        # Get registration counts by schedule_id
-        popular_schedules = db.query(
-            models.ClassRegistration.schedule_id,
-            func.count(models.ClassRegistration.registration_id).label('count')
-        ).group_by(
-            models.ClassRegistration.schedule_id
-        ).order_by(
-            func.count(models.ClassRegistration.registration_id).desc()
-        ).limit(10).all()
-        
-        # For each popular schedule, get the class name
-        class_bookings = {}
-        for sched_id, count in popular_schedules:
-            schedule = db.query(models.ClassSchedule).filter(
-                models.ClassSchedule.schedule_id == sched_id
-            ).first()
-            
-            if schedule:
-                class_obj = db.query(models.Class).filter(
-                    models.Class.class_id == schedule.class_id
-                ).first()
-                
-                if class_obj:
-                    class_name = class_obj.class_name
-                    if class_name in class_bookings:
-                        class_bookings[class_name] += count
-                    else:
-                        class_bookings[class_name] = count
-        
-        # Convert to list and sort
-        popular_classes_data = [
-            {"name": name, "bookings": bookings} 
-            for name, bookings in sorted(class_bookings.items(), key=lambda x: x[1], reverse=True)[:5]
-        ]
-        
-    except Exception as e:
-        print(f"Error in popular_classes: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        popular_classes_data = []
-    
-    # Recent activity - SIMPLIFIED
-    recent_activity = []
+        series = analytics.revenue(db, start, end, grain, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"start": start, "end": end, "grain": grain, "group_by": group_by, "series": series}
+
+@app.get("/analytics/attendance")
+def get_attendance_analytics(start: date = None, end: date = None, grain: str = "day", group_by: str = None,
+                             db: Session = Depends(models.get_db)):
+    """Registrations and attendance rate per day, week or month (group_by=class for a series per class)"""
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_ANALYTICS_DAYS - 1)
     try:
-        # Get recent registrations
-        recent_regs = db.query(models.ClassRegistration).order_by(
-            models.ClassRegistration.registration_date.desc()
-        ).limit(10).all()
-        
-        for reg in recent_regs:
-            # Get member info
-            member = db.query(models.Member).filter(
-                models.Member.member_id == reg.member_id
-            ).first()
-            
-            # Get schedule info
-            schedule = db.query(models.ClassSchedule).filter(
-                models.ClassSchedule.schedule_id == reg.schedule_id
-            ).first()
-            
-            # Get class info
-            class_obj = None
-            if schedule:
-                class_obj = db.query(models.Class).filter(
-                    models.Class.class_id == schedule.class_id
-                ).first()
-            
-            if member:
-                activity = {
-                    "icon": "🆕",
-                    "title": f"{member.first_name} {member.last_name} registered",
-                    "description": f"Registered for {class_obj.class_name}" if class_obj else "New class registration",
-                    "time": reg.registration_date.strftime("%b %d, %Y") if reg.registration_date else "Recently"
-                }
-                recent_activity.append(activity)
-        
-    except Exception as e:
-        print(f"Error in recent_activity: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        recent_activity = []
+        series = analytics.attendance(db, start, end, grain, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"start": start, "end": end, "grain": grain, "group_by": group_by, "series": series}
+
+@app.get("/admin/recommendation-cache")
+def get_recommendation_cache_stats():
+    """Hit/miss/eviction counters for the recommendation cache"""
+    return recommendation_cache.stats()
+
+# ============================================
+# EXPORTS
+# ============================================
+
+@app.get("/export/{table}")
+def export_table(table: str, format: str = "ndjson"):
+    """Stream a full table (members, registrations, billing) as NDJSON or CSV"""
+    if table not in export.EXPORTS:
+        raise HTTPException(status_code=404, detail=f"table must be one of {', '.join(export.EXPORTS)}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(export.FORMATS)}")
     
+    return StreamingResponse(
+        export.stream_rows(table, format),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/recommender-health")
+def get_recommender_health():
+    """LLM circuit breaker state and how often recommendations fell back to local scoring"""
     return {
-        "total_members": total_members,
-        "active_members": active_members,
-        "new_this_month": new_this_month,
-        "monthly_revenue": float(monthly_revenue),
-        "outstanding": float(outstanding),
-        "total_classes": total_classes,
-        "avg_attendance": avg_attendance,
-        "membership_tiers": tier_data,
-        "popular_classes": popular_classes_data,
-        "recent_activity": recent_activity
+        "circuit_breaker": llm_breaker.stats(),
+        **recommendation_fallbacks.stats()
     }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
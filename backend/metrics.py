@@ -0,0 +1,241 @@
+"""In-process metrics exposed at /metrics in the Prometheus text format.
+
+- per route template: request latency, SQL statements and DB time per
+  request (histograms)
+- SQL statements and DB time overall (query_budget's engine listener),
+  connections in use per pool
+- LLM calls by outcome, call latency and tokens (from GymRecommender)
+- recommendation cache, circuit breaker and fallback state (read at scrape)
+
+Recording is a dict lookup, a bisect and a short lock per observation.
+"""
+from bisect import bisect_left
+import threading
+import time
+import models
+import query_budget
+from cache import recommendation_cache
+from resilience import llm_breaker, recommendation_fallbacks
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last slot is +Inf), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += n
+                    lines.append(
+                        f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (bound,))} {cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Collected:
+    """Values read at scrape time from ``collect() -> {labels: value}``, for
+    state that is already tracked elsewhere."""
+
+    def __init__(self, name: str, help: str, labelnames, collect, type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+        self.type = type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"Error rendering metric {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+http_request_duration = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+))
+http_request_statements = register(Histogram(
+    "http_request_sql_statements", "SQL statements executed per request", ("method", "route"), STATEMENT_BUCKETS
+))
+http_request_db_time = register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request", ("method", "route")
+))
+register(Collected(
+    "db_statements_total", "SQL statements executed", (),
+    lambda: {(): query_budget.totals()["statements"]}, "counter"
+))
+register(Collected(
+    "db_time_seconds_total", "Time spent executing SQL statements", (),
+    lambda: {(): query_budget.totals()["db_time"]}, "counter"
+))
+llm_calls = register(Counter("llm_calls_total", "LLM completion calls by outcome", ("outcome",)))
+llm_call_duration = register(Histogram("llm_call_duration_seconds", "LLM completion call latency", ("outcome",)))
+llm_tokens = register(Counter("llm_tokens_total", "LLM tokens used", ("type",)))
+
+_CACHE_EVENTS = ("hits", "misses", "evictions", "expirations", "invalidations", "coalesced")
+_BREAKER_STATES = ("closed", "open", "half_open")
+
+register(Collected(
+    "recommendation_cache_entries", "Entries in the recommendation cache", (),
+    lambda: {(): recommendation_cache.stats()["size"]}
+))
+register(Collected(
+    "recommendation_cache_events_total", "Recommendation cache lookups and evictions by event", ("event",),
+    lambda: {(e,): v for e, v in recommendation_cache.stats().items() if e in _CACHE_EVENTS}, "counter"
+))
+register(Collected(
+    "llm_circuit_breaker_state", "1 for the current LLM circuit breaker state", ("state",),
+    lambda: {(s,): int(llm_breaker.state == s) for s in _BREAKER_STATES}
+))
+register(Collected(
+    "llm_circuit_breaker_window_rate", "Error and slow-call rates in the breaker window", ("kind",),
+    lambda: {("error",): llm_breaker.stats()["error_rate"], ("slow",): llm_breaker.stats()["slow_call_rate"]}
+))
+register(Collected(
+    "llm_circuit_breaker_rejected_total", "LLM calls skipped because the breaker was open", (),
+    lambda: {(): llm_breaker.stats()["rejected_calls"]}, "counter"
+))
+register(Collected(
+    "recommendation_requests_total", "LLM-backed recommendation requests", (),
+    lambda: {(): recommendation_fallbacks.stats()["requests"]}, "counter"
+))
+register(Collected(
+    "recommendation_fallbacks_total", "Recommendations served by local scoring, by reason", ("reason",),
+    lambda: {(r,): n for r, n in recommendation_fallbacks.stats()["fallbacks_by_reason"].items()}, "counter"
+))
+
+_POOLS = {"write": models.engine, "read": models.read_engine, "async_read": models.async_read_engine.sync_engine}
+_POOLS = {name: engine for name, engine in _POOLS.items() if name == "write" or engine is not models.engine}
+
+register(Collected(
+    "db_pool_checked_out", "Database connections in use, by pool", ("pool",),
+    lambda: {(name,): engine.pool.checkedout() for name, engine in _POOLS.items()}
+))
+
+def observe_llm_call(duration: float, outcome: str):
+    llm_calls.inc((outcome,))
+    llm_call_duration.observe((outcome,), duration)
+
+def observe_llm_tokens(prompt_tokens: int, completion_tokens: int):
+    llm_tokens.inc(("prompt",), prompt_tokens)
+    llm_tokens.inc(("completion",), completion_tokens)
+
+# ============================================
+# HTTP MIDDLEWARE
+# ============================================
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and SQL usage.
+
+    Latency covers the whole response, including streamed bodies. Routes
+    are labelled by their path template (``/members/{member_id}``), so the
+    number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._routes.get(endpoint, endpoint.__name__)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with query_budget.count_queries() as counter:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                elapsed = time.perf_counter() - started
+                route = self._route(scope)
+                method = scope["method"]
+                http_request_duration.observe((method, route, str(status["code"])), elapsed)
+                http_request_statements.observe((method, route), counter["count"])
+                http_request_db_time.observe((method, route), counter["db_time"])
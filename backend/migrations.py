@@ -0,0 +1,345 @@
+"""Versioned schema migrations.
+
+Each migration is a numbered step applied once per database and recorded
+in the schema_version table. ``upgrade`` runs the pending steps in order,
+each in its own transaction, and is called at startup by the API and the
+command line jobs instead of ``create_all``.
+
+Steps describe a fixed schema history: each one spells out its own DDL
+against the tables as they were when it shipped (``_baseline_tables``),
+never against the live ``models``, so editing a model never changes what
+an old step does. Add a step for every schema change; never edit one that
+has shipped. Steps use ``checkfirst`` so they can run over tables an older
+``create_all`` already built. Steps that rebuild derived data (rollups,
+analytics buckets) call the owning module's reconcile, which reads and
+writes only tables whose columns haven't changed since they shipped.
+
+Usage: python migrations.py [upgrade|status] [--to VERSION]
+"""
+from sqlalchemy import (
+    MetaData, Table, Column, Index, ForeignKey, Integer, String, Date, DateTime, DECIMAL, Text, Time,
+    case, delete, func, insert, inspect, select
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import argparse
+import models
+
+def _baseline_tables():
+    """The schema of version 1, frozen: do not change it when a model changes."""
+    metadata = MetaData()
+    Table(
+        "members", metadata,
+        Column("member_id", Integer, primary_key=True, autoincrement=True),
+        Column("first_name", String(50), nullable=False),
+        Column("last_name", String(50), nullable=False),
+        Column("email", String(100), unique=True, nullable=False),
+        Column("phone", String(15)),
+        Column("date_of_birth", Date),
+        Column("membership_level", String(20), nullable=False),
+        Column("join_date", DateTime, nullable=False),
+        Column("membership_status", String(20)),
+        Column("preferred_days", String(100)),
+        Column("preferred_time_slot", String(50)),
+        Column("height_cm", Integer),
+        Column("weight_kg", Integer),
+        Column("age", Integer),
+        Column("gender", String(10))
+    )
+    Table(
+        "membership_plans", metadata,
+        Column("plan_id", Integer, primary_key=True),
+        Column("plan_name", String(50), nullable=False),
+        Column("monthly_fee", DECIMAL(10, 2), nullable=False),
+        Column("class_access_limit", Integer),
+        Column("features", Text)
+    )
+    Table(
+        "classes", metadata,
+        Column("class_id", Integer, primary_key=True, autoincrement=True),
+        Column("class_name", String(100), nullable=False),
+        Column("instructor_name", String(100)),
+        Column("duration_minutes", Integer),
+        Column("max_capacity", Integer),
+        Column("difficulty_level", String(20)),
+        Column("required_membership", String(20)),
+        Column("description", Text)
+    )
+    Table(
+        "class_schedule", metadata,
+        Column("schedule_id", Integer, primary_key=True, autoincrement=True),
+        Column("class_id", Integer, ForeignKey("classes.class_id"), nullable=False),
+        Column("day_of_week", String(10), nullable=False),
+        Column("start_time", Time, nullable=False),
+        Column("end_time", Time, nullable=False),
+        Column("room_location", String(50))
+    )
+    Table(
+        "class_registrations", metadata,
+        Column("registration_id", Integer, primary_key=True, autoincrement=True),
+        Column("member_id", Integer, ForeignKey("members.member_id"), nullable=False),
+        Column("schedule_id", Integer, ForeignKey("class_schedule.schedule_id"), nullable=False),
+        Column("registration_date", DateTime, nullable=False),
+        Column("attendance_status", String(20))
+    )
+    Table(
+        "schedule_counters", metadata,
+        Column("schedule_id", Integer, ForeignKey("class_schedule.schedule_id"), primary_key=True),
+        Column("registered_count", Integer, nullable=False)
+    )
+    Table(
+        "waitlist_entries", metadata,
+        Column("entry_id", Integer, primary_key=True, autoincrement=True),
+        Column("member_id", Integer, ForeignKey("members.member_id"), nullable=False),
+        Column("schedule_id", Integer, ForeignKey("class_schedule.schedule_id"), nullable=False),
+        Column("priority", Integer, nullable=False),
+        Column("joined_at", DateTime, nullable=False),
+        Column("status", String(20), nullable=False)
+    )
+    Table(
+        "kpi_rollups", metadata,
+        Column("key", String(100), primary_key=True),
+        Column("value", DECIMAL(14, 2), nullable=False)
+    )
+    Table(
+        "revenue_daily", metadata,
+        Column("day", Date, primary_key=True),
+        Column("tier", String(20), primary_key=True),
+        Column("paid", DECIMAL(14, 2), nullable=False),
+        Column("pending", DECIMAL(14, 2), nullable=False),
+        Column("invoices", Integer, nullable=False)
+    )
+    Table(
+        "attendance_daily", metadata,
+        Column("day", Date, primary_key=True),
+        Column("schedule_id", Integer, ForeignKey("class_schedule.schedule_id"), primary_key=True),
+        Column("registrations", Integer, nullable=False),
+        Column("attended", Integer, nullable=False),
+        Column("cancelled", Integer, nullable=False)
+    )
+    Table(
+        "billing", metadata,
+        Column("billing_id", Integer, primary_key=True, autoincrement=True),
+        Column("member_id", Integer, ForeignKey("members.member_id"), nullable=False),
+        Column("billing_date", Date, nullable=False),
+        Column("amount", DECIMAL(10, 2), nullable=False),
+        Column("payment_status", String(20)),
+        Column("payment_method", String(50)),
+        Column("next_billing_date", Date)
+    )
+    Table(
+        "precomputed_recommendations", metadata,
+        Column("member_id", Integer, ForeignKey("members.member_id"), primary_key=True),
+        Column("top_n", Integer, nullable=False),
+        Column("recommendations", Text, nullable=False),
+        Column("weekly_schedule", Text, nullable=False),
+        Column("generated_at", DateTime, nullable=False)
+    )
+    return metadata.tables
+
+BASELINE = _baseline_tables()
+
+def _baseline(connection):
+    for table in BASELINE.values():
+        table.create(bind=connection, checkfirst=True)
+
+def _dedupe_registrations(connection):
+    """Keep one registration per (member_id, schedule_id): the attended one,
+    else the active one, else the latest. Returns the number deleted."""
+    registration = BASELINE["class_registrations"].c
+    status_rank = case(
+        (registration.attendance_status == "Attended", 0),
+        (registration.attendance_status == "Registered", 1),
+        else_=2
+    )
+    ranked = select(
+        registration.registration_id,
+        func.row_number().over(
+            partition_by=(registration.member_id, registration.schedule_id),
+            order_by=(status_rank, registration.registration_date.desc(), registration.registration_id.desc())
+        ).label("rank")
+    ).subquery()
+
+    duplicates = select(ranked.c.registration_id).where(ranked.c.rank > 1)
+    deleted = connection.execute(
+        delete(BASELINE["class_registrations"]).where(registration.registration_id.in_(duplicates))
+    ).rowcount
+    if deleted:
+        # Deleted with a bulk statement, so no mapper events: recount the spots here
+        _recount_schedules(connection)
+    return deleted
+
+def _recount_schedules(connection):
+    """Rebuild schedule_counters from the Registered and Attended registrations."""
+    registration = BASELINE["class_registrations"].c
+    schedule = BASELINE["class_schedule"].c
+    counters = BASELINE["schedule_counters"]
+    counts = select(
+        schedule.schedule_id, func.count(registration.registration_id)
+    ).select_from(BASELINE["class_schedule"]).outerjoin(
+        BASELINE["class_registrations"],
+        (registration.schedule_id == schedule.schedule_id)
+        & registration.attendance_status.in_(("Registered", "Attended"))
+    ).group_by(schedule.schedule_id)
+    connection.execute(delete(counters))
+    connection.execute(insert(counters).from_select(["schedule_id", "registered_count"], counts))
+
+# (name, table, columns, unique)
+HOT_PATH_INDEXES = (
+    ("uq_class_registrations_member_schedule", "class_registrations", ("member_id", "schedule_id"), True),
+    ("ix_class_registrations_member_date", "class_registrations", ("member_id", "registration_date"), False),
+    ("ix_class_registrations_schedule_status", "class_registrations", ("schedule_id", "attendance_status"), False),
+    ("ix_class_registrations_status_member", "class_registrations", ("attendance_status", "member_id", "schedule_id"), False),
+    ("ix_class_registrations_date", "class_registrations", ("registration_date",), False),
+    ("ix_billing_member_date", "billing", ("member_id", "billing_date"), False),
+    ("ix_billing_status", "billing", ("payment_status",), False),
+    ("ix_billing_date", "billing", ("billing_date",), False),
+    ("ix_members_status_level", "members", ("membership_status", "membership_level"), False),
+    ("ix_members_level_time_slot", "members", ("membership_level", "preferred_time_slot"), False),
+    ("ix_members_join_date", "members", ("join_date",), False),
+    ("ix_class_schedule_class_id", "class_schedule", ("class_id",), False),
+    ("ix_class_schedule_day_start", "class_schedule", ("day_of_week", "start_time"), False),
+    ("ix_waitlist_entries_queue", "waitlist_entries", ("schedule_id", "status", "priority", "joined_at"), False),
+)
+
+def _create_index(connection, name: str, table: str, columns, unique: bool = False):
+    # Built on a detached copy of the table, so the frozen metadata isn't modified
+    table = BASELINE[table].to_metadata(MetaData())
+    Index(name, *(table.c[column] for column in columns), unique=unique).create(bind=connection, checkfirst=True)
+
+def _hot_path_indexes(connection):
+    deleted = _dedupe_registrations(connection)
+    if deleted:
+        print(f"   - removed {deleted} duplicate class registrations")
+    for name, table, columns, unique in HOT_PATH_INDEXES:
+        _create_index(connection, name, table, columns, unique)
+    if connection.dialect.name == "sqlite":
+        # Table statistics, so the planner can choose between the new indexes
+        connection.exec_driver_sql("ANALYZE")
+
+def _drop_index(connection, name: str, table: str, columns):
+    table = BASELINE[table].to_metadata(MetaData())
+    Index(name, *(table.c[column] for column in columns)).drop(bind=connection, checkfirst=True)
+
+def _dedupe_billing(connection):
+    """Delete invoices identical to an earlier one (what two racing billing
+    runs left behind). Returns the number deleted; raises if different
+    invoices share a (member_id, billing_date), since picking one would
+    lose money."""
+    billing = BASELINE["billing"].c
+    ranked = select(
+        billing.billing_id,
+        func.row_number().over(
+            partition_by=(billing.member_id, billing.billing_date, billing.amount, billing.payment_status,
+                          billing.payment_method, billing.next_billing_date),
+            order_by=billing.billing_id
+        ).label("rank")
+    ).subquery()
+
+    deleted = connection.execute(
+        delete(BASELINE["billing"]).where(
+            billing.billing_id.in_(select(ranked.c.billing_id).where(ranked.c.rank > 1))
+        )
+    ).rowcount
+
+    clashes = connection.execute(select(func.count()).select_from(
+        select(billing.member_id).group_by(billing.member_id, billing.billing_date).having(func.count() > 1).subquery()
+    )).scalar()
+    if clashes:
+        raise RuntimeError(
+            f"{clashes} (member_id, billing_date) pairs have more than one distinct invoice; "
+            "merge or re-date them, then run the migration again"
+        )
+    return deleted
+
+def _unique_billing(connection):
+    deleted = _dedupe_billing(connection)
+    if deleted:
+        print(f"   - removed {deleted} duplicate invoices")
+    _create_index(connection, "uq_billing_member_date", "billing", ("member_id", "billing_date"), unique=True)
+    # The unique index serves every lookup the plain one did
+    _drop_index(connection, "ix_billing_member_date", "billing", ("member_id", "billing_date"))
+
+def _rebuild_rollups(connection):
+    # Mapper events only apply deltas, so the rollups must start from the full totals
+    import rollups
+    drift = rollups.reconcile(Session(bind=connection))
+    if drift:
+        print(f"   - rebuilt {len(drift)} dashboard rollups")
+
+def _rebuild_analytics(connection):
+    # Same for the daily revenue and attendance buckets
+    import analytics
+    drift = analytics.reconcile(Session(bind=connection))
+    if drift:
+        print(f"   - rebuilt {len(drift)} daily analytics buckets")
+
+# (version, name, step): append only
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "hot path indexes and unique registrations", _hot_path_indexes),
+    (3, "one invoice per member and billing date", _unique_billing),
+    # Capacity checks read the counters; a schedule without one is always full
+    (4, "registration counters", _recount_schedules),
+    (5, "dashboard rollups", _rebuild_rollups),
+    (6, "daily analytics buckets", _rebuild_analytics),
+]
+
+def _claim(connection, version: int, name: str) -> bool:
+    # Recording the version first takes the write lock, so a second process
+    # migrating at the same time waits here, then finds the version taken
+    # and skips the step instead of running it twice
+    try:
+        connection.execute(models.SchemaVersion.__table__.insert().values(version=version, name=name))
+    except IntegrityError:
+        return False
+    return True
+
+def current_version(engine) -> int:
+    if not inspect(engine).has_table(models.SchemaVersion.__tablename__):
+        return 0
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(models.SchemaVersion.version))).scalar() or 0
+
+def upgrade(engine=None, to_version: int = None):
+    """Apply pending migrations up to ``to_version`` (default: all). Returns
+    the versions applied by this call."""
+    engine = engine or models.engine
+    models.SchemaVersion.__table__.create(bind=engine, checkfirst=True)
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if to_version is not None and version > to_version:
+            break
+        if version <= current_version(engine):
+            continue
+        with engine.begin() as connection:
+            if not _claim(connection, version, name):
+                continue
+            step(connection)
+        print(f"✅ Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
+
+def status(engine=None):
+    """``[(version, name, applied_at or None), ...]`` for every migration."""
+    engine = engine or models.engine
+    applied = {}
+    if inspect(engine).has_table(models.SchemaVersion.__tablename__):
+        with engine.connect() as connection:
+            applied = dict(connection.execute(
+                select(models.SchemaVersion.version, models.SchemaVersion.applied_at)
+            ).all())
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations")
+    parser.add_argument("command", nargs="?", choices=("upgrade", "status"), default="upgrade")
+    parser.add_argument("--to", type=int, default=None, help="Stop after this version")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for version, name, applied_at in status():
+            print(f"{version:>4}  {'applied ' + applied_at.strftime('%Y-%m-%d %H:%M') if applied_at else 'pending':<24} {name}")
+    elif not upgrade(to_version=args.to):
+        print(f"✅ Schema is up to date (version {current_version(models.engine)})")
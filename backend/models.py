@@ -1,12 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, DECIMAL, ForeignKey, Text, Time
+from sqlalchemy import create_engine, event, Index, Column, Integer, String, Date, DateTime, DECIMAL, ForeignKey, Text, Time
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
+import os
 
 Base = declarative_base()
 
 class Member(Base):
     __tablename__ = 'members'
+    __table_args__ = (
+        Index('ix_members_status_level', 'membership_status', 'membership_level'),
+        Index('ix_members_level_time_slot', 'membership_level', 'preferred_time_slot'),
+        Index('ix_members_join_date', 'join_date'),
+    )
     
     member_id = Column(Integer, primary_key=True, autoincrement=True)
     first_name = Column(String(50), nullable=False)
@@ -52,6 +61,10 @@ class Class(Base):
 
 class ClassSchedule(Base):
     __tablename__ = 'class_schedule'
+    __table_args__ = (
+        Index('ix_class_schedule_class_id', 'class_id'),
+        Index('ix_class_schedule_day_start', 'day_of_week', 'start_time'),
+    )
     
     schedule_id = Column(Integer, primary_key=True, autoincrement=True)
     class_id = Column(Integer, ForeignKey('classes.class_id'), nullable=False)
@@ -65,6 +78,14 @@ class ClassSchedule(Base):
 
 class ClassRegistration(Base):
     __tablename__ = 'class_registrations'
+    __table_args__ = (
+        # A member has one registration per schedule; cancelling and signing up again reuses it
+        Index('uq_class_registrations_member_schedule', 'member_id', 'schedule_id', unique=True),
+        Index('ix_class_registrations_member_date', 'member_id', 'registration_date'),
+        Index('ix_class_registrations_schedule_status', 'schedule_id', 'attendance_status'),
+        Index('ix_class_registrations_status_member', 'attendance_status', 'member_id', 'schedule_id'),
+        Index('ix_class_registrations_date', 'registration_date'),
+    )
     
     registration_id = Column(Integer, primary_key=True, autoincrement=True)
     member_id = Column(Integer, ForeignKey('members.member_id'), nullable=False)
@@ -75,8 +96,61 @@ class ClassRegistration(Base):
     member = relationship("Member", back_populates="registrations")
     schedule = relationship("ClassSchedule", back_populates="registrations")
 
+class ScheduleCounter(Base):
+    __tablename__ = 'schedule_counters'
+    
+    # Registered + Attended registrations, maintained by capacity.reserve_spot / release_spot
+    schedule_id = Column(Integer, ForeignKey('class_schedule.schedule_id'), primary_key=True)
+    registered_count = Column(Integer, nullable=False, default=0)
+
+class WaitlistEntry(Base):
+    __tablename__ = 'waitlist_entries'
+    __table_args__ = (
+        Index('ix_waitlist_entries_queue', 'schedule_id', 'status', 'priority', 'joined_at'),
+    )
+    
+    entry_id = Column(Integer, primary_key=True, autoincrement=True)
+    member_id = Column(Integer, ForeignKey('members.member_id'), nullable=False)
+    schedule_id = Column(Integer, ForeignKey('class_schedule.schedule_id'), nullable=False)
+    priority = Column(Integer, nullable=False, default=0)
+    joined_at = Column(DateTime, nullable=False, default=datetime.now)
+    status = Column(String(20), nullable=False, default='Waiting')
+
+class KpiRollup(Base):
+    __tablename__ = 'kpi_rollups'
+    
+    # Dashboard aggregates kept up to date by rollups.py, e.g. "members_active", "billing_paid:2024-05"
+    key = Column(String(100), primary_key=True)
+    value = Column(DECIMAL(14, 2), nullable=False, default=0)
+
+class RevenueDaily(Base):
+    __tablename__ = 'revenue_daily'
+    
+    # Billing summed per billing day and member tier, maintained by analytics.py
+    day = Column(Date, primary_key=True)
+    tier = Column(String(20), primary_key=True)
+    paid = Column(DECIMAL(14, 2), nullable=False, default=0)
+    pending = Column(DECIMAL(14, 2), nullable=False, default=0)
+    invoices = Column(Integer, nullable=False, default=0)
+
+class AttendanceDaily(Base):
+    __tablename__ = 'attendance_daily'
+    
+    # Registrations counted per registration day and schedule, maintained by analytics.py
+    day = Column(Date, primary_key=True)
+    schedule_id = Column(Integer, ForeignKey('class_schedule.schedule_id'), primary_key=True)
+    registrations = Column(Integer, nullable=False, default=0)
+    attended = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+
 class Billing(Base):
     __tablename__ = 'billing'
+    __table_args__ = (
+        # One invoice per member and day, so concurrent billing runs can't bill a cycle twice
+        Index('uq_billing_member_date', 'member_id', 'billing_date', unique=True),
+        Index('ix_billing_status', 'payment_status'),
+        Index('ix_billing_date', 'billing_date'),
+    )
     
     billing_id = Column(Integer, primary_key=True, autoincrement=True)
     member_id = Column(Integer, ForeignKey('members.member_id'), nullable=False)
@@ -88,12 +162,127 @@ class Billing(Base):
     
     member = relationship("Member", back_populates="billings")
 
+class PrecomputedRecommendation(Base):
+    __tablename__ = 'precomputed_recommendations'
+    
+    member_id = Column(Integer, ForeignKey('members.member_id'), primary_key=True)
+    top_n = Column(Integer, nullable=False)
+    recommendations = Column(Text, nullable=False)
+    weekly_schedule = Column(Text, nullable=False)
+    generated_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+    
+    # One row per migration applied by migrations.upgrade
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.now)
+
 # Database setup
-DATABASE_URL = "sqlite:///./gym_membership.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./gym_membership.db")
+# Same database through an asyncio driver, for async endpoints
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def _async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# Read connections kept per process (SQLite files only; other databases use one engine)
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+# Seconds a write waits for the writer connection before failing
+WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "30"))
+
+# Set on every SQLite connection. In WAL mode readers don't block the writer
+# (or each other) and synchronous=NORMAL only syncs at checkpoints, which is
+# still safe against application crashes. busy_timeout makes a statement
+# that hits a lock held by another process wait instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # in KiB, ~64 MB per connection
+    "mmap_size": 268435456,
+    "busy_timeout": 5000
+}
+
+def _sqlite_file(url: str):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def _set_pragmas(engine, read_only: bool):
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # Persistent, stored in the database file
+            cursor.execute("PRAGMA journal_mode=WAL")
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+def create_engines(url: str = DATABASE_URL):
+    """``(write_engine, read_engine)`` for ``url``.
+
+    For a SQLite file, writes go through a single pooled connection, so
+    concurrent writers queue in the pool instead of fighting over the
+    database lock, and reads use a pool of query_only connections. Other
+    URLs get one engine for both.
+    """
+    if not _sqlite_file(url):
+        connect_args = {"check_same_thread": False} if make_url(url).get_backend_name() == "sqlite" else {}
+        engine = create_engine(url, connect_args=connect_args)
+        return engine, engine
+
+    write_engine = create_engine(
+        url, connect_args={"check_same_thread": False},
+        pool_size=1, max_overflow=0, pool_timeout=WRITE_TIMEOUT
+    )
+    read_engine = create_engine(
+        url, connect_args={"check_same_thread": False},
+        pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_SIZE
+    )
+    _set_pragmas(write_engine, read_only=False)
+    _set_pragmas(read_engine, read_only=True)
+    return write_engine, read_engine
+
+def create_async_read_engine(url: str = ASYNC_DATABASE_URL):
+    """Async engine for reads. Writes stay on the sync writer connection, so
+    there is still a single writer per process."""
+    if not _sqlite_file(url):
+        return create_async_engine(url)
+
+    async_engine = create_async_engine(
+        url, poolclass=AsyncAdaptedQueuePool, pool_size=READ_POOL_SIZE, max_overflow=READ_POOL_SIZE
+    )
+    _set_pragmas(async_engine.sync_engine, read_only=True)
+    return async_engine
+
+engine, read_engine = create_engines()
+async_read_engine = create_async_read_engine()
+ENGINES = tuple(dict.fromkeys((engine, read_engine, async_read_engine.sync_engine)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 def get_db():
+    """Session on the read pool, for endpoints that only read."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """AsyncSession on the async read pool, for ``async def`` endpoints."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+def get_write_db():
+    """Session on the writer connection, for endpoints that write."""
     db = SessionLocal()
     try:
         yield db
@@ -0,0 +1,31 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+List endpoints keep returning a plain JSON array so existing clients are
+unaffected. When more rows follow, the response carries an
+``X-Next-Cursor`` header; pass it back as ``?cursor=`` to get the next page.
+A page is an index range scan on the primary key, so deep pages cost the
+same as the first one.
+"""
+from fastapi import HTTPException, Response
+
+MAX_PAGE_SIZE = 1000
+
+def keyset_page(query, key_column, cursor: int, limit: int, response: Response, offset: int = 0):
+    """Rows of ``query`` with ``key_column > cursor``, ordered by it, at most ``limit``.
+
+    ``offset`` is only for endpoints that still accept legacy offset paging.
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    if cursor is not None:
+        query = query.filter(key_column > cursor)
+    query = query.order_by(key_column)
+    if offset:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(getattr(rows[-1], key_column.key))
+    return rows
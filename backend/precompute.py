@@ -0,0 +1,133 @@
+"""Offline job that precomputes recommendations and weekly schedules for
+every active member into the precomputed_recommendations table.
+
+Usage: python precompute.py [--top-n 5] [--workers 4] [--shard-size 200] [--restart]
+
+Shards are committed as they finish, so a crashed run can be resumed by
+running the command again: members with a fresh entry are skipped.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from multiprocessing import Pool
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import time
+import models
+import migrations
+from ai_recommender import GymRecommender
+
+# Entries older than this are ignored by the API and recomputed by the job
+MAX_AGE_SECONDS = float(os.getenv("PRECOMPUTED_MAX_AGE", "86400"))
+
+def get_precomputed(db: Session, member_id: int, max_age_seconds: float = None):
+    """Fresh precomputed entry for a member, or None.
+
+    An entry is fresh if it is younger than ``max_age_seconds``. Writes that
+    change a member's recommendations (registrations, level, preferences,
+    the class catalog) delete the entry in the same transaction; see the
+    mapper events in cache.py.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = MAX_AGE_SECONDS
+
+    entry = db.get(models.PrecomputedRecommendation, member_id)
+    if not entry or entry.generated_at < datetime.now() - timedelta(seconds=max_age_seconds):
+        return None
+    return entry
+
+async def aget_precomputed(db: AsyncSession, member_id: int, max_age_seconds: float = None):
+    """get_precomputed on an AsyncSession."""
+    if max_age_seconds is None:
+        max_age_seconds = MAX_AGE_SECONDS
+
+    entry = await db.get(models.PrecomputedRecommendation, member_id)
+    if not entry or entry.generated_at < datetime.now() - timedelta(seconds=max_age_seconds):
+        return None
+    return entry
+
+def compute_shard(member_ids, top_n: int):
+    db = models.SessionLocal()
+    try:
+        recommender = GymRecommender(db)
+        generated_at = datetime.now()
+
+        for member_id in member_ids:
+            recommendations = recommender._fallback_recommendations(member_id, top_n)
+            weekly_schedule = recommender.generate_weekly_schedule(member_id)
+
+            db.merge(models.PrecomputedRecommendation(
+                member_id=member_id,
+                top_n=top_n,
+                recommendations=json.dumps(recommendations),
+                weekly_schedule=json.dumps(weekly_schedule),
+                generated_at=generated_at
+            ))
+
+        db.commit()
+        return len(member_ids)
+    finally:
+        db.close()
+
+def _worker_init():
+    # Connections inherited from the parent process must not be reused after fork
+    for engine in models.ENGINES:
+        engine.dispose(close=False)
+
+def _run_shard(args):
+    return compute_shard(*args)
+
+def pending_members(db: Session, top_n: int, restart: bool):
+    query = db.query(models.Member.member_id).filter(
+        models.Member.membership_status == "Active"
+    )
+
+    if not restart:
+        cutoff = datetime.now() - timedelta(seconds=MAX_AGE_SECONDS)
+        done = db.query(models.PrecomputedRecommendation.member_id).filter(
+            models.PrecomputedRecommendation.generated_at >= cutoff,
+            models.PrecomputedRecommendation.top_n >= top_n
+        )
+        query = query.filter(models.Member.member_id.not_in(done))
+
+    return [member_id for (member_id,) in query.order_by(models.Member.member_id)]
+
+def run(top_n: int = 5, workers: int = None, shard_size: int = 200, restart: bool = False):
+    migrations.upgrade(models.engine)
+
+    db = models.SessionLocal()
+    try:
+        member_ids = pending_members(db, top_n, restart)
+    finally:
+        db.close()
+
+    total = len(member_ids)
+    if not total:
+        print("All active members have fresh recommendations")
+        return
+
+    shards = [(member_ids[i:i + shard_size], top_n) for i in range(0, total, shard_size)]
+    workers = workers or os.cpu_count()
+    print(f"Precomputing recommendations for {total} members in {len(shards)} shards on {workers} workers...")
+
+    started = time.perf_counter()
+    done = 0
+    with Pool(processes=workers, initializer=_worker_init) as pool:
+        for count in pool.imap_unordered(_run_shard, shards):
+            done += count
+            elapsed = time.perf_counter() - started
+            print(f"   - {done}/{total} members ({done / total:.0%}), {done / elapsed:.1f} members/sec")
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Precomputed {done} members in {elapsed:.1f}s ({done / elapsed:.1f} members/sec)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute member recommendations")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=200)
+    parser.add_argument("--restart", action="store_true", help="Recompute every member, ignoring fresh entries")
+    args = parser.parse_args()
+
+    run(args.top_n, args.workers, args.shard_size, args.restart)
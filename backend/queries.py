@@ -0,0 +1,55 @@
+"""Read queries that would otherwise walk lazy relationships row by row.
+
+Each function loads what its caller needs in a fixed number of statements
+(explicit joins or joinedload), independent of the number of rows.
+"""
+from sqlalchemy.orm import Session, joinedload
+import models
+
+def schedule_with_class(db: Session, schedule_id: int):
+    """ClassSchedule with ``class_info`` loaded in the same statement."""
+    return db.query(models.ClassSchedule).options(
+        joinedload(models.ClassSchedule.class_info)
+    ).filter(
+        models.ClassSchedule.schedule_id == schedule_id
+    ).first()
+
+def attended_class_names(db: Session, member_id: int):
+    """Class names of a member's attended registrations."""
+    rows = db.query(models.Class.class_name).join(
+        models.ClassSchedule, models.ClassSchedule.class_id == models.Class.class_id
+    ).join(
+        models.ClassRegistration, models.ClassRegistration.schedule_id == models.ClassSchedule.schedule_id
+    ).filter(
+        models.ClassRegistration.member_id == member_id,
+        models.ClassRegistration.attendance_status == "Attended"
+    ).order_by(models.ClassRegistration.registration_id).all()
+    return [name for (name,) in rows]
+
+def class_bookings(db: Session, schedule_counts, limit: int = 5):
+    """``[(schedule_id, count), ...]`` summed per class name, most booked first."""
+    class_names = dict(db.query(models.ClassSchedule.schedule_id, models.Class.class_name).join(
+        models.Class, models.Class.class_id == models.ClassSchedule.class_id
+    ).filter(
+        models.ClassSchedule.schedule_id.in_([schedule_id for schedule_id, _ in schedule_counts])
+    ).all())
+
+    bookings = {}
+    for schedule_id, count in schedule_counts:
+        name = class_names.get(schedule_id)
+        if name is not None:
+            bookings[name] = bookings.get(name, 0) + count
+
+    return [
+        {"name": name, "bookings": count}
+        for name, count in sorted(bookings.items(), key=lambda x: x[1], reverse=True)[:limit]
+    ]
+
+def recent_registrations(db: Session, limit: int = 10):
+    """Latest registrations with member, schedule and class loaded."""
+    return db.query(models.ClassRegistration).options(
+        joinedload(models.ClassRegistration.member),
+        joinedload(models.ClassRegistration.schedule).joinedload(models.ClassSchedule.class_info)
+    ).order_by(
+        models.ClassRegistration.registration_date.desc()
+    ).limit(limit).all()
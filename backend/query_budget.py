@@ -0,0 +1,128 @@
+"""Per-request SQL statement counting, to catch N+1 query regressions.
+
+This module owns the engine listener that counts and times every statement
+executed on ``models.ENGINES``; /metrics (metrics.py) reads the same
+counters. Statements run while a request is being handled (including from
+tool threads that copy the request's context) are added to every
+``count_queries`` block that is open, so nested blocks roll up into the
+outer one. When a route goes over its budget the detector either logs a
+warning or raises ``QueryBudgetExceeded``, depending on SQL_BUDGET_MODE:
+
+    off    - no budget check (default)
+    log    - print a warning and add an X-SQL-Queries response header
+    raise  - raise, so the request (and any test driving it) fails
+
+Statements issued while a streaming response body is being sent happen
+after the route returns and are not counted against its budget.
+"""
+from contextlib import contextmanager
+from sqlalchemy import event
+import contextvars
+import os
+import threading
+import time
+import models
+
+MODES = ("off", "log", "raise")
+MODE = os.getenv("SQL_BUDGET_MODE", "off")
+DEFAULT_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "20"))
+if MODE not in MODES:
+    raise ValueError(f"SQL_BUDGET_MODE must be one of {', '.join(MODES)}")
+
+# Routes that legitimately run more statements, by endpoint function name
+ROUTE_BUDGETS = {
+    "get_recommendations": 30
+}
+
+# The count_queries blocks open in the current context, outermost first
+_counters = contextvars.ContextVar("sql_statement_counters", default=())
+
+_totals_lock = threading.Lock()
+_totals = {"statements": 0, "db_time": 0.0}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statements_started", []).append(time.perf_counter())
+    for counter in _counters.get():
+        counter["count"] += 1
+        if MODE != "off":
+            # Only the budget warning reads the text
+            counter["statements"].append(statement)
+
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("statements_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+
+    with _totals_lock:
+        _totals["statements"] += 1
+        _totals["db_time"] += elapsed
+    for counter in _counters.get():
+        counter["db_time"] += elapsed
+
+def _statement_failed(context):
+    started = context.connection.info.get("statements_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+for _engine in models.ENGINES:
+    event.listen(_engine, "before_cursor_execute", _statement_started)
+    event.listen(_engine, "after_cursor_execute", _statement_finished)
+    event.listen(_engine, "handle_error", _statement_failed)
+
+@contextmanager
+def count_queries():
+    """Count and time statements executed inside the block:
+    ``with count_queries() as c: ...; c["count"], c["db_time"]``.
+    ``c["statements"]`` holds their text only when SQL_BUDGET_MODE isn't off."""
+    counter = {"count": 0, "statements": [], "db_time": 0.0}
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+def totals():
+    """Statements completed and seconds spent in them since the process started."""
+    with _totals_lock:
+        return dict(_totals)
+
+def budget_for(endpoint_name: str) -> int:
+    return ROUTE_BUDGETS.get(endpoint_name, DEFAULT_BUDGET)
+
+def check(endpoint_name: str, counter, mode: str = None):
+    """Log or raise if ``counter`` is over the endpoint's budget."""
+    mode = mode or MODE
+    budget = budget_for(endpoint_name)
+    if mode == "off" or counter["count"] <= budget:
+        return
+
+    message = f"{endpoint_name} ran {counter['count']} SQL statements (budget {budget})"
+    if mode == "raise":
+        raise QueryBudgetExceeded(message)
+
+    if not counter["statements"]:
+        print(f"SQL budget warning: {message}")
+        return
+    # Repeated statements are the usual sign of an N+1 loop
+    repeated = max(set(counter["statements"]), key=counter["statements"].count)
+    print(f"SQL budget warning: {message}; most repeated ({counter['statements'].count(repeated)}x): {repeated[:200]}")
+
+async def middleware(request, call_next):
+    """HTTP middleware for ``app.middleware("http")``."""
+    if MODE == "off":
+        return await call_next(request)
+
+    with count_queries() as counter:
+        response = await call_next(request)
+
+    endpoint = request.scope.get("endpoint")
+    if endpoint is not None:
+        check(endpoint.__name__, counter)
+    response.headers["X-SQL-Queries"] = str(counter["count"])
+    return response
@@ -0,0 +1,128 @@
+"""Set-based bulk class registration.
+
+Validates a whole batch of (member_id, schedule_id) pairs with a handful of
+IN queries, reserves capacity per schedule with capacity.reserve_spots and
+writes every accepted registration in one executemany INSERT, all in a
+single transaction. Derived data is updated through bulk_writes.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update
+from datetime import datetime
+import models
+import capacity
+import bulk_writes
+from scoring import MEMBER_CHUNK
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), MEMBER_CHUNK):
+        yield values[i:i + MEMBER_CHUNK]
+
+def bulk_register(db: Session, pairs):
+    """Register each ``(member_id, schedule_id)`` pair.
+
+    Returns one result per pair, in order: ``{"member_id", "schedule_id",
+    "status": "registered" | "rejected", "reason", "registration_id"}``.
+    Within a schedule, spots go to pairs in request order.
+    """
+    pairs = [(int(member_id), int(schedule_id)) for member_id, schedule_id in pairs]
+    member_ids = {member_id for member_id, _ in pairs}
+    schedule_ids = {schedule_id for _, schedule_id in pairs}
+
+    known_members = set()
+    for chunk in _chunks(member_ids):
+        known_members.update(
+            m for (m,) in db.query(models.Member.member_id).filter(models.Member.member_id.in_(chunk))
+        )
+
+    known_schedules = set()
+    for chunk in _chunks(schedule_ids):
+        known_schedules.update(
+            s for (s,) in db.query(models.ClassSchedule.schedule_id).filter(models.ClassSchedule.schedule_id.in_(chunk))
+        )
+
+    # (member_id, schedule_id) -> (registration_id, attendance_status, registration_date)
+    existing = {}
+    for chunk in _chunks(known_members):
+        rows = db.query(
+            models.ClassRegistration.member_id,
+            models.ClassRegistration.schedule_id,
+            models.ClassRegistration.registration_id,
+            models.ClassRegistration.attendance_status,
+            models.ClassRegistration.registration_date
+        ).filter(
+            models.ClassRegistration.member_id.in_(chunk),
+            models.ClassRegistration.schedule_id.in_(known_schedules)
+        )
+        for member_id, schedule_id, registration_id, status, registration_date in rows:
+            existing[(member_id, schedule_id)] = (registration_id, status, registration_date)
+
+    results = []
+    wanted = {}
+    seen = set()
+    for member_id, schedule_id in pairs:
+        previous = existing.get((member_id, schedule_id))
+        result = {"member_id": member_id, "schedule_id": schedule_id, "status": "rejected",
+                  "reason": None, "registration_id": None}
+        results.append(result)
+
+        if member_id not in known_members:
+            result["reason"] = "Member not found"
+        elif schedule_id not in known_schedules:
+            result["reason"] = "Schedule not found"
+        elif (member_id, schedule_id) in seen:
+            result["reason"] = "Duplicate in request"
+        elif previous and previous[1] != "Cancelled":
+            result["reason"] = "Already registered for this class"
+        else:
+            wanted.setdefault(schedule_id, []).append(result)
+        seen.add((member_id, schedule_id))
+
+    now = datetime.now()
+    new_rows = []
+    reactivated = []
+    changes = []
+    for schedule_id, requests in wanted.items():
+        granted = capacity.reserve_spots(db, schedule_id, len(requests))
+        for i, result in enumerate(requests):
+            if i >= granted:
+                result["reason"] = "Class is full"
+                continue
+
+            result["status"] = "registered"
+            previous = existing.get((result["member_id"], schedule_id))
+            if previous:
+                result["registration_id"] = previous[0]
+                reactivated.append({"registration_id": previous[0], "attendance_status": "Registered",
+                                    "registration_date": now})
+                before = {"member_id": result["member_id"], "schedule_id": schedule_id,
+                          "attendance_status": previous[1], "registration_date": previous[2]}
+            else:
+                new_rows.append(result)
+                before = None
+            changes.append((before, {"member_id": result["member_id"], "schedule_id": schedule_id,
+                                     "attendance_status": "Registered", "registration_date": now}))
+
+    if reactivated:
+        db.execute(update(models.ClassRegistration), reactivated)
+
+    if new_rows:
+        inserted = db.execute(
+            insert(models.ClassRegistration).returning(
+                models.ClassRegistration.registration_id,
+                models.ClassRegistration.member_id,
+                models.ClassRegistration.schedule_id
+            ),
+            [
+                {"member_id": r["member_id"], "schedule_id": r["schedule_id"],
+                 "registration_date": now, "attendance_status": "Registered"}
+                for r in new_rows
+            ]
+        )
+        ids = {(member_id, schedule_id): registration_id for registration_id, member_id, schedule_id in inserted}
+        for r in new_rows:
+            r["registration_id"] = ids[(r["member_id"], r["schedule_id"])]
+
+    bulk_writes.apply_changes(db, registrations=changes)
+    db.commit()
+    return results
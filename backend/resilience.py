@@ -0,0 +1,153 @@
+from collections import deque
+import threading
+import time
+import os
+import openai
+
+class DeadlineExceeded(Exception):
+    pass
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Tracks upstream error and slow-call rates over a sliding window of
+    recent calls and stops sending traffic while they are too high.
+
+    closed -> open when, with at least ``min_calls`` in the window, the error
+    rate or the slow-call rate reaches its threshold. After ``open_seconds``
+    one trial call is let through (half-open); its outcome closes or
+    re-opens the breaker; a cancelled trial (``release``) lets the next
+    call try instead.
+    """
+
+    def __init__(self, window: int = 20, min_calls: int = 5, error_rate: float = 0.5,
+                 slow_call_seconds: float = 10.0, slow_rate: float = 0.5, open_seconds: float = 30.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._calls = deque(maxlen=window)
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                self._trial_in_flight = False
+
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+
+            return True
+
+    def record(self, duration: float, ok: bool):
+        with self._lock:
+            slow = duration >= self.slow_call_seconds
+            if self.state == "half_open":
+                if ok and not slow:
+                    self.state = "closed"
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+
+            self._calls.append((ok, slow))
+            if self.state == "closed" and len(self._calls) >= self.min_calls:
+                errors, slows = self._rates()
+                if errors >= self.error_rate_threshold or slows >= self.slow_rate_threshold:
+                    self._open()
+
+    def release(self):
+        """End a call that has no outcome (the caller was cancelled or stopped
+        reading): a half-open trial is given back so another call can try."""
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_in_flight = False
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self.times_opened += 1
+
+    def _rates(self):
+        n = len(self._calls)
+        if not n:
+            return 0.0, 0.0
+        errors = sum(1 for ok, _ in self._calls if not ok)
+        slows = sum(1 for _, slow in self._calls if slow)
+        return errors / n, slows / n
+
+    def stats(self):
+        with self._lock:
+            errors, slows = self._rates()
+            return {
+                "state": self.state,
+                "window_calls": len(self._calls),
+                "error_rate": round(errors, 4),
+                "slow_call_rate": round(slows, 4),
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected
+            }
+
+
+class FallbackStats:
+    """Counts recommendation requests and why they fell back to local results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fallbacks = {}
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_fallback(self, reason: str):
+        with self._lock:
+            self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.fallbacks.values())
+            return {
+                "requests": self.requests,
+                "fallbacks": total,
+                "fallback_rate": round(total / self.requests, 4) if self.requests else 0.0,
+                "fallbacks_by_reason": dict(self.fallbacks)
+            }
+
+
+def fallback_reason(error: Exception) -> str:
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, (DeadlineExceeded, TimeoutError, openai.APITimeoutError)):
+        return "deadline"
+    return "error"
+
+
+llm_breaker = CircuitBreaker(
+    window=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+    min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+    error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "10")),
+    slow_rate=float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.5")),
+    open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+)
+
+recommendation_fallbacks = FallbackStats()
@@ -0,0 +1,262 @@
+"""Incrementally maintained dashboard aggregates.
+
+``kpi_rollups`` holds one row per aggregate. Mapper events on Member,
+Billing, ClassRegistration and WaitlistEntry turn every insert, update and delete into
+deltas that are applied in the same transaction, so the admin dashboard
+reads a few small rows instead of scanning members and billing.
+
+Keys:
+    members_total, members_active, members_tier:<level>
+    members_joined:<YYYY-MM>          members by join month
+    billing_paid:<YYYY-MM>            paid amount by billing month
+    billing_pending                   outstanding amount
+    registrations_schedule:<id>       registrations per schedule (any status)
+    waitlist_schedule:<id>            Waiting waitlist entries per schedule
+
+Bulk statements skip mapper events and go through bulk_writes.py.
+``python rollups.py`` rebuilds everything from scratch and reports drift
+(``--dry-run`` only reports).
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import event, func, update, insert, delete
+from datetime import datetime
+from decimal import Decimal
+import argparse
+import models
+import migrations
+from change_history import previous, values
+
+def _month(value):
+    return value.strftime("%Y-%m") if value else None
+
+def _add(deltas, key, amount):
+    if key is not None and amount:
+        deltas[key] = deltas.get(key, 0) + amount
+
+def member_contribution(status, level, join_date):
+    deltas = {}
+    _add(deltas, "members_total", 1)
+    _add(deltas, "members_active", 1 if status == "Active" else 0)
+    _add(deltas, f"members_tier:{level}", 1)
+    _add(deltas, f"members_joined:{_month(join_date)}" if join_date else None, 1)
+    return deltas
+
+def billing_contribution(status, amount, billing_date):
+    deltas = {}
+    amount = Decimal(str(amount or 0))
+    if status == "Paid":
+        _add(deltas, f"billing_paid:{_month(billing_date)}" if billing_date else None, amount)
+    elif status == "Pending":
+        _add(deltas, "billing_pending", amount)
+    return deltas
+
+def registration_contribution(schedule_id):
+    return {f"registrations_schedule:{schedule_id}": 1}
+
+def waitlist_contribution(schedule_id, status):
+    return {f"waitlist_schedule:{schedule_id}": 1} if status == "Waiting" else {}
+
+def _difference(new, old):
+    deltas = dict(new)
+    for key, amount in old.items():
+        _add(deltas, key, -amount)
+    return {key: amount for key, amount in deltas.items() if amount}
+
+def apply(connection, deltas):
+    """Add ``{key: amount}`` to the rollups on ``connection`` (a Connection or Session)."""
+    for key, amount in deltas.items():
+        updated = connection.execute(
+            update(models.KpiRollup)
+            .where(models.KpiRollup.key == key)
+            .values(value=models.KpiRollup.value + amount)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            connection.execute(insert(models.KpiRollup).values(key=key, value=amount))
+
+def read(db: Session):
+    """All rollups as ``{key: Decimal}``."""
+    return {key: value for key, value in db.query(models.KpiRollup.key, models.KpiRollup.value)}
+
+def dashboard_kpis(db: Session, now: datetime = None):
+    """Admin dashboard KPIs from the rollups, in one small read."""
+    current_month = _month(now or datetime.now())
+    values = read(db)
+
+    def months_from_current(prefix):
+        # Everything dated this month or later, like ``date >= start_of_month``
+        return sum(
+            (v for k, v in values.items() if k.startswith(prefix) and k[len(prefix):] >= current_month),
+            Decimal(0)
+        )
+
+    top_schedules = sorted(
+        ((int(k.split(":", 1)[1]), int(v)) for k, v in values.items() if k.startswith("registrations_schedule:") and v),
+        key=lambda item: (-item[1], item[0])
+    )[:10]
+
+    return {
+        "total_members": int(values.get("members_total", 0)),
+        "active_members": int(values.get("members_active", 0)),
+        "new_this_month": int(months_from_current("members_joined:")),
+        "membership_tiers": [
+            {"name": k.split(":", 1)[1], "count": int(v)}
+            for k, v in sorted(values.items()) if k.startswith("members_tier:") and v
+        ],
+        "monthly_revenue": float(months_from_current("billing_paid:")),
+        "outstanding": float(values.get("billing_pending", 0)),
+        "top_schedules": top_schedules
+    }
+
+# ============================================
+# MAPPER EVENTS
+# ============================================
+
+_MEMBER_ATTRS = ("membership_status", "membership_level", "join_date")
+_BILLING_ATTRS = ("payment_status", "amount", "billing_date")
+_WAITLIST_ATTRS = ("schedule_id", "status")
+
+@event.listens_for(models.Member, "after_insert")
+def _member_inserted(mapper, connection, target):
+    apply(connection, member_contribution(*values(target, _MEMBER_ATTRS)))
+
+@event.listens_for(models.Member, "after_update")
+def _member_updated(mapper, connection, target):
+    apply(connection, _difference(
+        member_contribution(*values(target, _MEMBER_ATTRS)),
+        member_contribution(*values(target, _MEMBER_ATTRS, before=True))
+    ))
+
+@event.listens_for(models.Member, "after_delete")
+def _member_deleted(mapper, connection, target):
+    apply(connection, _difference({}, member_contribution(*values(target, _MEMBER_ATTRS, before=True))))
+
+@event.listens_for(models.Billing, "after_insert")
+def _billing_inserted(mapper, connection, target):
+    apply(connection, billing_contribution(*values(target, _BILLING_ATTRS)))
+
+@event.listens_for(models.Billing, "after_update")
+def _billing_updated(mapper, connection, target):
+    apply(connection, _difference(
+        billing_contribution(*values(target, _BILLING_ATTRS)),
+        billing_contribution(*values(target, _BILLING_ATTRS, before=True))
+    ))
+
+@event.listens_for(models.Billing, "after_delete")
+def _billing_deleted(mapper, connection, target):
+    apply(connection, _difference({}, billing_contribution(*values(target, _BILLING_ATTRS, before=True))))
+
+@event.listens_for(models.ClassRegistration, "after_insert")
+def _registration_inserted(mapper, connection, target):
+    apply(connection, registration_contribution(target.schedule_id))
+
+@event.listens_for(models.ClassRegistration, "after_update")
+def _registration_updated(mapper, connection, target):
+    apply(connection, _difference(
+        registration_contribution(target.schedule_id),
+        registration_contribution(previous(target, "schedule_id"))
+    ))
+
+@event.listens_for(models.ClassRegistration, "after_delete")
+def _registration_deleted(mapper, connection, target):
+    apply(connection, _difference({}, registration_contribution(previous(target, "schedule_id"))))
+
+@event.listens_for(models.WaitlistEntry, "after_insert")
+def _waitlist_inserted(mapper, connection, target):
+    apply(connection, waitlist_contribution(*values(target, _WAITLIST_ATTRS)))
+
+@event.listens_for(models.WaitlistEntry, "after_update")
+def _waitlist_updated(mapper, connection, target):
+    apply(connection, _difference(
+        waitlist_contribution(*values(target, _WAITLIST_ATTRS)),
+        waitlist_contribution(*values(target, _WAITLIST_ATTRS, before=True))
+    ))
+
+@event.listens_for(models.WaitlistEntry, "after_delete")
+def _waitlist_deleted(mapper, connection, target):
+    apply(connection, _difference({}, waitlist_contribution(*values(target, _WAITLIST_ATTRS, before=True))))
+
+# ============================================
+# RECONCILIATION
+# ============================================
+
+def _month_sql(db: Session, column):
+    """``column`` as 'YYYY-MM' in SQL, like ``_month``."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+def compute_from_scratch(db: Session):
+    """Every rollup recomputed with full aggregates over the source tables."""
+    values = {}
+
+    for status, level, count in db.query(
+        models.Member.membership_status, models.Member.membership_level, func.count(models.Member.member_id)
+    ).group_by(models.Member.membership_status, models.Member.membership_level):
+        _add(values, "members_total", count)
+        _add(values, "members_active", count if status == "Active" else 0)
+        _add(values, f"members_tier:{level}", count)
+
+    join_month = _month_sql(db, models.Member.join_date)
+    for month, count in db.query(join_month, func.count(models.Member.member_id)).filter(
+        models.Member.join_date.isnot(None)
+    ).group_by(join_month):
+        _add(values, f"members_joined:{month}", count)
+
+    billing_month = _month_sql(db, models.Billing.billing_date)
+    for status, month, amount in db.query(
+        models.Billing.payment_status, billing_month, func.sum(models.Billing.amount)
+    ).filter(models.Billing.payment_status.in_(["Paid", "Pending"])).group_by(models.Billing.payment_status, billing_month):
+        amount = Decimal(str(amount or 0))
+        _add(values, f"billing_paid:{month}" if status == "Paid" else "billing_pending", amount)
+
+    for schedule_id, count in db.query(
+        models.ClassRegistration.schedule_id, func.count(models.ClassRegistration.registration_id)
+    ).group_by(models.ClassRegistration.schedule_id):
+        _add(values, f"registrations_schedule:{schedule_id}", count)
+
+    for schedule_id, count in db.query(
+        models.WaitlistEntry.schedule_id, func.count(models.WaitlistEntry.entry_id)
+    ).filter(models.WaitlistEntry.status == "Waiting").group_by(models.WaitlistEntry.schedule_id):
+        _add(values, f"waitlist_schedule:{schedule_id}", count)
+
+    return values
+
+def reconcile(db: Session, dry_run: bool = False):
+    """Rebuild the rollups and return the drift as ``{key: (stored, actual)}``."""
+    expected = compute_from_scratch(db)
+    stored = read(db)
+
+    drift = {}
+    for key in set(expected) | set(stored):
+        actual = Decimal(str(expected.get(key, 0))).quantize(Decimal("0.01"))
+        current = Decimal(stored.get(key, 0)).quantize(Decimal("0.01"))
+        if actual != current:
+            drift[key] = (current, actual)
+
+    if drift and not dry_run:
+        db.execute(delete(models.KpiRollup))
+        if expected:
+            db.execute(insert(models.KpiRollup), [{"key": k, "value": v} for k, v in expected.items()])
+        db.commit()
+    return drift
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild dashboard rollups from scratch and report drift")
+    parser.add_argument("--dry-run", action="store_true", help="Only report drift, don't rewrite the rollups")
+    args = parser.parse_args()
+
+    migrations.upgrade(models.engine)
+    db = models.SessionLocal()
+    try:
+        drift = reconcile(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    if not drift:
+        print("✅ Rollups match the source tables")
+    else:
+        print(f"{'Found' if args.dry_run else 'Fixed'} drift in {len(drift)} rollups:")
+        for key in sorted(drift):
+            stored, actual = drift[key]
+            print(f"   - {key}: stored {stored}, actual {actual}")
@@ -0,0 +1,128 @@
+import numpy as np
+from scoring import MatchScoringEngine, time_slot_for
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Same per-day cap the LLM-driven schedule used
+MAX_CLASSES_PER_DAY = 3
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+def _best_day_plans(sessions, max_per_day: int):
+    """Weighted interval scheduling with a cap on the number of sessions.
+
+    ``sessions`` are dicts with ``start``, ``end`` (minutes) and ``weight``.
+    Returns ``plans[k] = (total_weight, [session indexes])`` for the best
+    non-overlapping selection of exactly k sessions (None if impossible).
+    """
+    order = sorted(range(len(sessions)), key=lambda i: (sessions[i]["end"], sessions[i]["start"]))
+    ends = [sessions[i]["end"] for i in order]
+
+    # previous[j] = number of sessions (in end order) that finish before session j starts
+    previous = [int(np.searchsorted(ends, sessions[i]["start"], side="right")) for i in order]
+
+    n = len(order)
+    best = [[None] * (max_per_day + 1) for _ in range(n + 1)]
+    for j in range(n + 1):
+        best[j][0] = (0, [])
+
+    for j in range(1, n + 1):
+        session = sessions[order[j - 1]]
+        for k in range(1, max_per_day + 1):
+            skip = best[j - 1][k]
+            take = None
+            before = best[previous[j - 1]][k - 1]
+            if before is not None:
+                take = (before[0] + session["weight"], before[1] + [order[j - 1]])
+
+            if take is not None and (skip is None or take[0] > skip[0]):
+                best[j][k] = take
+            else:
+                best[j][k] = skip
+
+    return best[n]
+
+def build_weekly_schedule(engine: MatchScoringEngine, member, class_access_limit: int = None,
+                          max_per_day: int = MAX_CLASSES_PER_DAY):
+    """Pick non-overlapping sessions on the member's preferred days and time
+    slot, maximizing the total match score subject to open spots and the
+    plan's weekly class limit. Returns the ``generate_weekly_schedule`` format.
+    """
+    batch = engine.score_members([member.member_id])
+    if len(batch["member_ids"]) == 0:
+        return {}
+
+    preferred_days = [d.strip() for d in member.preferred_days.split(',')] if member.preferred_days else []
+    preferred_time = member.preferred_time_slot
+
+    candidates_by_day = {}
+    for i, schedule in enumerate(engine.schedules):
+        col = int(engine.schedule_class[i])
+        capacity = int(engine.class_capacity[col])
+        registered = int(engine.schedule_registered[i])
+        score = int(batch["percentage"][0, col])
+
+        if preferred_days and schedule["day"] not in preferred_days:
+            continue
+        if preferred_time and time_slot_for(schedule["start_time"]) != preferred_time:
+            continue
+        if not batch["can_access"][0, col] or score <= 0 or registered >= capacity:
+            continue
+
+        candidates_by_day.setdefault(schedule["day"], []).append({
+            "index": i,
+            "col": col,
+            "start": _minutes(schedule["start_time"]),
+            "end": _minutes(schedule["end_time"]),
+            "weight": score,
+            "registered": registered,
+            "capacity": capacity
+        })
+
+    days = sorted(candidates_by_day, key=lambda d: DAYS.index(d) if d in DAYS else len(DAYS))
+    day_plans = [_best_day_plans(candidates_by_day[day], max_per_day) for day in days]
+
+    # Spread the weekly limit across days: total[j] = best score using j sessions so far
+    limit = class_access_limit if class_access_limit is not None else max_per_day * len(days)
+    total = {0: (0, [])}
+    for d, plans in enumerate(day_plans):
+        merged = {}
+        for used, (score, picks) in total.items():
+            for k, plan in enumerate(plans):
+                if plan is None or used + k > limit:
+                    continue
+                candidate = (score + plan[0], picks + [(d, k)])
+                if used + k not in merged or candidate[0] > merged[used + k][0]:
+                    merged[used + k] = candidate
+        total = merged
+
+    # Highest score wins; on ties prefer fewer sessions
+    _, picks = max(total.values(), key=lambda x: (x[0], -sum(k for _, k in x[1])))
+
+    weekly_schedule = {}
+    for d, k in picks:
+        if k == 0:
+            continue
+        day = days[d]
+        sessions = candidates_by_day[day]
+        entries = []
+        for s in sorted(day_plans[d][k][1], key=lambda s: sessions[s]["start"]):
+            session = sessions[s]
+            schedule = engine.schedules[session["index"]]
+            cls = engine.classes[session["col"]]
+            entries.append({
+                "schedule_id": schedule["schedule_id"],
+                "class_name": cls["name"],
+                "time": schedule["time"],
+                "room": schedule["room"],
+                "instructor": cls["instructor"],
+                "difficulty": cls["difficulty"],
+                "duration": cls["duration"],
+                "capacity": f"{session['registered']}/{session['capacity']}",
+                "spots_left": session["capacity"] - session["registered"],
+                "match_score": session["weight"]
+            })
+        weekly_schedule[day] = entries
+
+    return weekly_schedule
@@ -0,0 +1,185 @@
+"""Request and response models for the API.
+
+Response models are built straight from ORM rows (``from_attributes``) and
+declare column attributes only, so building one never triggers a lazy
+load; the one nested relationship, ``ClassScheduleDetail.class_info``, is
+loaded up front by ``queries.schedule_with_class``. FastAPI validates the
+return value against them and serializes with pydantic-core instead of
+walking the objects with ``jsonable_encoder``.
+"""
+from pydantic import BaseModel, ConfigDict
+from datetime import date, datetime, time
+from typing import List, Optional
+
+
+class RegistrationRequest(BaseModel):
+    member_id: int
+    schedule_id: int
+
+
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+
+# ============================================
+# MEMBERS / CLASSES / PLANS
+# ============================================
+
+class Member(ORMModel):
+    member_id: int
+    first_name: str
+    last_name: str
+    email: str
+    phone: Optional[str] = None
+    date_of_birth: Optional[date] = None
+    membership_level: str
+    join_date: datetime
+    membership_status: Optional[str] = None
+    preferred_days: Optional[str] = None
+    preferred_time_slot: Optional[str] = None
+    height_cm: Optional[int] = None
+    weight_kg: Optional[int] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+
+
+class Class(ORMModel):
+    class_id: int
+    class_name: str
+    instructor_name: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    max_capacity: Optional[int] = None
+    difficulty_level: Optional[str] = None
+    required_membership: Optional[str] = None
+    description: Optional[str] = None
+
+
+class MembershipPlan(ORMModel):
+    plan_id: int
+    plan_name: str
+    monthly_fee: float
+    class_access_limit: Optional[int] = None
+    features: Optional[str] = None
+
+
+# ============================================
+# SCHEDULE
+# ============================================
+
+class ClassSchedule(ORMModel):
+    schedule_id: int
+    class_id: int
+    day_of_week: str
+    start_time: time
+    end_time: time
+    room_location: Optional[str] = None
+
+
+class ClassScheduleDetail(ClassSchedule):
+    class_info: Class
+
+
+class ScheduleDetails(BaseModel):
+    schedule: ClassScheduleDetail
+    registered_count: int
+    max_capacity: int
+    spots_available: int
+    is_full: bool
+    waitlist_length: int
+
+
+# ============================================
+# REGISTRATIONS
+# ============================================
+
+class Registration(ORMModel):
+    registration_id: int
+    member_id: int
+    schedule_id: int
+    registration_date: datetime
+    attendance_status: Optional[str] = None
+
+
+class RegistrationResult(BaseModel):
+    message: str
+    registration: Registration
+
+
+class CancellationResult(RegistrationResult):
+    promoted_member_ids: List[int]
+
+
+class WaitlistResult(BaseModel):
+    message: str
+    schedule_id: int
+    member_id: int
+    # Only while the member is still waiting (not when promoted straight away)
+    position: Optional[int] = None
+    waitlist_length: Optional[int] = None
+
+
+class BulkRegistrationItem(BaseModel):
+    member_id: int
+    schedule_id: int
+    status: str
+    reason: Optional[str] = None
+    registration_id: Optional[int] = None
+
+
+class BulkRegistrationResult(BaseModel):
+    registered: int
+    rejected: int
+    results: List[BulkRegistrationItem]
+
+
+# ============================================
+# BILLING
+# ============================================
+
+class Billing(ORMModel):
+    billing_id: int
+    member_id: int
+    billing_date: date
+    amount: float
+    payment_status: Optional[str] = None
+    payment_method: Optional[str] = None
+    next_billing_date: Optional[date] = None
+
+
+class BillingCreated(BaseModel):
+    message: str
+    billing: Billing
+
+
+# ============================================
+# ADMIN STATS
+# ============================================
+
+class TierCount(BaseModel):
+    name: str
+    count: int
+
+
+class PopularClass(BaseModel):
+    name: str
+    bookings: int
+
+
+class Activity(BaseModel):
+    icon: str
+    title: str
+    description: str
+    time: str
+
+
+class AdminStats(BaseModel):
+    total_members: int
+    active_members: int
+    new_this_month: int
+    monthly_revenue: float
+    outstanding: float
+    total_classes: int
+    avg_attendance: int
+    membership_tiers: List[TierCount]
+    popular_classes: List[PopularClass]
+    recent_activity: List[Activity]
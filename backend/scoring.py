@@ -0,0 +1,243 @@
+from sqlalchemy.orm import Session
+import numpy as np
+import copy
+import models
+import capacity
+
+LEVELS = ["Standard", "Premium", "Platinum"]
+DIFFICULTIES = ["Beginner", "Intermediate", "Advanced", "All Levels"]
+TIME_SLOTS = ["Morning", "Afternoon", "Evening"]
+
+_NO_SLOT = -1
+
+# Chunk size for member id IN (...) lookups, kept under SQLite's variable limit
+MEMBER_CHUNK = 900
+
+def _code(value, labels):
+    # Unknown / missing values map to the extra last row/column of each lookup table
+    try:
+        return labels.index(value)
+    except ValueError:
+        return len(labels)
+
+def _build_difficulty_table():
+    table = np.zeros((len(LEVELS) + 1, len(DIFFICULTIES) + 1), dtype=np.int32)
+    table[LEVELS.index("Standard"), DIFFICULTIES.index("Beginner")] = 30
+    table[LEVELS.index("Premium"), DIFFICULTIES.index("Beginner")] = 30
+    table[LEVELS.index("Premium"), DIFFICULTIES.index("Intermediate")] = 30
+    table[LEVELS.index("Platinum"), :] = 25
+    return table
+
+def _build_access_table():
+    table = np.zeros((len(LEVELS) + 1, len(LEVELS) + 1), dtype=np.int32)
+    table[:, LEVELS.index("Standard")] = 25
+    table[LEVELS.index("Premium"), LEVELS.index("Premium")] = 25
+    table[LEVELS.index("Platinum"), LEVELS.index("Premium")] = 25
+    return table
+
+def _build_can_access_table():
+    # Mirrors GymRecommender._get_available_classes
+    table = np.zeros((len(LEVELS) + 1, len(LEVELS) + 1), dtype=bool)
+    table[LEVELS.index("Platinum"), :] = True
+    table[LEVELS.index("Premium"), LEVELS.index("Standard")] = True
+    table[LEVELS.index("Premium"), LEVELS.index("Premium")] = True
+    table[LEVELS.index("Standard"), LEVELS.index("Standard")] = True
+    return table
+
+DIFFICULTY_SCORES = _build_difficulty_table()
+ACCESS_SCORES = _build_access_table()
+CAN_ACCESS = _build_can_access_table()
+TIME_SCORE = 35
+
+def time_slot_for(start_time):
+    hour = start_time.hour
+    return "Morning" if hour < 12 else "Afternoon" if hour < 17 else "Evening"
+
+
+class MatchScoringEngine:
+    """Loads the class catalog, schedules and registration counts once and
+    scores members against every class with array operations.
+
+    Factors are identical to ``GymRecommender._calculate_match_score``.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._load_catalog()
+
+    def bind(self, db: Session):
+        """Share the loaded catalog arrays with another session (e.g. a worker thread)."""
+        engine = copy.copy(self)
+        engine.db = db
+        return engine
+
+    def _load_catalog(self):
+        classes = self.db.query(models.Class).order_by(models.Class.class_id).all()
+
+        self.class_ids = np.array([c.class_id for c in classes], dtype=np.int64)
+        self.class_index = {class_id: i for i, class_id in enumerate(self.class_ids.tolist())}
+        self.class_names = [c.class_name for c in classes]
+        self.class_capacity = np.array([c.max_capacity or 0 for c in classes], dtype=np.int64)
+        self.class_difficulty = np.array([_code(c.difficulty_level, DIFFICULTIES) for c in classes], dtype=np.int64)
+        self.class_required = np.array([_code(c.required_membership, LEVELS) for c in classes], dtype=np.int64)
+        self.classes = [
+            {
+                "class_id": c.class_id,
+                "name": c.class_name,
+                "instructor": c.instructor_name,
+                "difficulty": c.difficulty_level,
+                "duration": c.duration_minutes,
+                "required_membership": c.required_membership,
+                "description": c.description,
+                "max_capacity": c.max_capacity
+            }
+            for c in classes
+        ]
+
+        counts = capacity.registered_counts(self.db)
+
+        schedules = self.db.query(models.ClassSchedule).order_by(
+            models.ClassSchedule.class_id, models.ClassSchedule.schedule_id
+        ).all()
+        schedules = [s for s in schedules if s.class_id in self.class_index]
+
+        self.schedule_ids = np.array([s.schedule_id for s in schedules], dtype=np.int64)
+        self.schedule_class = np.array([self.class_index[s.class_id] for s in schedules], dtype=np.int64)
+        self.schedule_slot = np.array([TIME_SLOTS.index(time_slot_for(s.start_time)) for s in schedules], dtype=np.int64)
+        self.schedule_registered = np.array([counts.get(s.schedule_id, 0) for s in schedules], dtype=np.int64)
+        self.schedules = [
+            {
+                "schedule_id": s.schedule_id,
+                "class_id": s.class_id,
+                "day": s.day_of_week,
+                "start_time": s.start_time,
+                "end_time": s.end_time,
+                "time": f"{s.start_time.strftime('%H:%M')}-{s.end_time.strftime('%H:%M')}",
+                "time_slot": time_slot_for(s.start_time),
+                "room": s.room_location
+            }
+            for s in schedules
+        ]
+
+        # has_slot[class, slot] -> class has at least one session in that slot
+        n_classes = len(self.class_ids)
+        self.has_slot = np.zeros((n_classes, len(TIME_SLOTS)), dtype=bool)
+        self.has_slot[self.schedule_class, self.schedule_slot] = True
+        self.has_any = self.has_slot.any(axis=1)
+
+    def _load_members(self, member_ids=None):
+        query = self.db.query(
+            models.Member.member_id,
+            models.Member.membership_level,
+            models.Member.preferred_time_slot
+        )
+
+        if member_ids is None:
+            rows = query.order_by(models.Member.member_id).all()
+        else:
+            member_ids = [int(m) for m in member_ids]
+            rows = []
+            for start in range(0, len(member_ids), MEMBER_CHUNK):
+                chunk = member_ids[start:start + MEMBER_CHUNK]
+                rows.extend(query.filter(models.Member.member_id.in_(chunk)).all())
+            # Keep the caller's order and drop unknown ids
+            by_id = {row[0]: row for row in rows}
+            rows = [by_id[m] for m in member_ids if m in by_id]
+
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        levels = np.array([_code(r[1], LEVELS) for r in rows], dtype=np.int64)
+        slots = np.array(
+            [TIME_SLOTS.index(r[2]) if r[2] in TIME_SLOTS else _NO_SLOT for r in rows],
+            dtype=np.int64
+        )
+        # A preferred slot that isn't one of ours behaves like a filter that matches nothing
+        unknown = np.array([bool(r[2]) and r[2] not in TIME_SLOTS for r in rows], dtype=bool)
+        return ids, levels, slots, unknown
+
+    def score_arrays(self, levels, slots, unknown_slot=None):
+        """Score members given as level / time-slot codes against all classes.
+
+        Returns ``(difficulty, access, time)`` int arrays of shape (members, classes).
+        """
+        levels = np.asarray(levels, dtype=np.int64)
+        slots = np.asarray(slots, dtype=np.int64)
+
+        difficulty = DIFFICULTY_SCORES[levels[:, None], self.class_difficulty[None, :]]
+        access = ACCESS_SCORES[levels[:, None], self.class_required[None, :]]
+
+        if self.has_slot.shape[0] == 0:
+            available = np.zeros((len(levels), 0), dtype=bool)
+        else:
+            in_slot = self.has_slot[:, np.clip(slots, 0, None)].T
+            available = np.where((slots == _NO_SLOT)[:, None], self.has_any[None, :], in_slot)
+            if unknown_slot is not None:
+                available &= ~np.asarray(unknown_slot, dtype=bool)[:, None]
+        time = available.astype(np.int32) * TIME_SCORE
+
+        return difficulty, access, time
+
+    def score_members(self, member_ids=None):
+        """Score a batch of members (all members if ``member_ids`` is None)
+        against every class in one pass."""
+        ids, levels, slots, unknown = self._load_members(member_ids)
+        difficulty, access, time = self.score_arrays(levels, slots, unknown)
+        score = difficulty + access + time
+
+        return {
+            "member_ids": ids,
+            "class_ids": self.class_ids,
+            "difficulty_match": difficulty,
+            "membership_access": access,
+            "time_availability": time,
+            "score": score,
+            "percentage": np.minimum(100, score),
+            "can_access": CAN_ACCESS[levels[:, None], self.class_required[None, :]]
+        }
+
+    def match_score(self, member_id: int, class_id: int):
+        """Single (member, class) score in the ``_calculate_match_score`` format."""
+        col = self.class_index.get(class_id)
+        ids, levels, slots, unknown = self._load_members([member_id])
+        if col is None or len(ids) == 0:
+            return {"score": 0, "factors": {}}
+
+        difficulty, access, time = self.score_arrays(levels, slots, unknown)
+        return self.factors_at(difficulty, access, time, 0, col)
+
+    @staticmethod
+    def factors_at(difficulty, access, time, row: int, col: int):
+        factors = {
+            "difficulty_match": int(difficulty[row, col]),
+            "membership_access": int(access[row, col]),
+            "time_availability": int(time[row, col])
+        }
+        total_score = sum(factors.values())
+        return {
+            "score": total_score,
+            "factors": factors,
+            "percentage": min(100, total_score)
+        }
+
+    def class_schedules(self, class_id: int, preferred_time: str = None):
+        """Schedules for a class in the ``_check_class_schedule`` format."""
+        col = self.class_index.get(class_id)
+        if col is None:
+            return []
+
+        capacity = int(self.class_capacity[col])
+        result = []
+        for i in np.flatnonzero(self.schedule_class == col):
+            schedule = self.schedules[i]
+            if preferred_time and schedule["time_slot"] != preferred_time:
+                continue
+
+            result.append({
+                "day": schedule["day"],
+                "time": schedule["time"],
+                "time_slot": schedule["time_slot"],
+                "room": schedule["room"],
+                "spots_available": capacity - int(self.schedule_registered[i]),
+                "capacity": capacity
+            })
+
+        return result
@@ -0,0 +1,67 @@
+import json
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class RecommendationStreamParser:
+    """Pulls complete objects out of a streamed ``{"recommendations": [...]}``
+    document as soon as each one closes.
+
+    Tolerates a leading markdown fence and anything before the array.
+    """
+
+    def __init__(self, key: str = "recommendations"):
+        self.key = key
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+
+    def feed(self, text: str):
+        """Add streamed text and return the recommendations completed by it."""
+        self._buffer += text
+        completed = []
+
+        if not self._in_array:
+            key_at = self._buffer.find(f'"{self.key}"')
+            if key_at < 0:
+                return completed
+            bracket = self._buffer.find("[", key_at)
+            if bracket < 0:
+                return completed
+            self._in_array = True
+            self._pos = bracket + 1
+
+        while self._pos < len(self._buffer) and not self._done:
+            ch = self._buffer[self._pos]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    completed.append(json.loads(self._buffer[self._object_start:self._pos + 1]))
+                    self._object_start = None
+            elif ch == "]" and self._depth == 0:
+                self._done = True
+
+            self._pos += 1
+
+        return completed
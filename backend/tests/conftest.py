@@ -0,0 +1,90 @@
+"""Shared fixtures: a small seeded SQLite database and an API client.
+
+``models`` reads DATABASE_URL at import, so it is pointed at a temporary
+file here, before any test imports the app. The LLM is the offline replay
+client.
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="gym-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'gym_membership.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["LLM_CLIENT"] = "replay"
+os.environ["LLM_RECORDING_PATH"] = os.path.join(_tmp, "llm_recording.jsonl")
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The ``models`` module, on a database seeded at the baseline schema and
+    then upgraded, so the later migrations run over existing rows."""
+    import models
+    import migrations
+    import init_db
+
+    migrations.upgrade(models.engine, to_version=1)
+    random.seed(42)
+    with models.SessionLocal() as db:
+        init_db.seed(db)
+    migrations.upgrade(models.engine)
+
+    yield models
+
+    for engine in models.ENGINES:
+        engine.dispose()
+    shutil.rmtree(_tmp, ignore_errors=True)
+
+
+@pytest.fixture
+def scratch_database(database, tmp_path, monkeypatch):
+    """``models`` with ``SessionLocal`` on a copy of the seeded database, for
+    tests whose writes (including those of jobs that open their own
+    sessions) must not reach the shared one."""
+    from sqlalchemy.orm import sessionmaker
+    models = database
+
+    path = tmp_path / "scratch.db"
+    copy = sqlite3.connect(path)
+    with models.engine.connect() as connection:
+        connection.connection.driver_connection.backup(copy)
+    copy.close()
+
+    engine, _ = models.create_engines(f"sqlite:///{path}")
+    monkeypatch.setattr(models, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    yield models
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    from fastapi.testclient import TestClient
+    import main
+
+    # The lifespan disposes the async engine, whose connection threads would keep the process alive
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def ids(database):
+    """Ids of seeded rows for the endpoint tests: a member with registrations,
+    a schedule, a class, and a Platinum member not registered for that schedule."""
+    models = database
+    with models.SessionLocal() as db:
+        member_id = db.query(models.ClassRegistration.member_id).first()[0]
+        schedule_id = db.query(models.ClassSchedule.schedule_id).first()[0]
+        class_id = db.query(models.Class.class_id).first()[0]
+        registered = db.query(models.ClassRegistration.member_id).filter(
+            models.ClassRegistration.schedule_id == schedule_id
+        )
+        free_member_id = db.query(models.Member.member_id).filter(
+            models.Member.membership_level == "Platinum",
+            models.Member.member_id.not_in(registered)
+        ).first()[0]
+    return {"member_id": member_id, "schedule_id": schedule_id, "class_id": class_id, "free_member_id": free_member_id}
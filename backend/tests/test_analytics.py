@@ -0,0 +1,14 @@
+"""Time series over the daily analytics buckets."""
+from datetime import date
+import pytest
+import analytics
+
+
+@pytest.mark.parametrize("series, group_by", [
+    (analytics.revenue, None), (analytics.revenue, "tier"),
+    (analytics.attendance, None), (analytics.attendance, "class"),
+])
+def test_empty_range_has_no_periods(database, series, group_by):
+    models = database
+    with models.SessionLocal() as db:
+        assert series(db, date(1990, 1, 1), date(1990, 3, 31), grain="month", group_by=group_by) == []
@@ -0,0 +1,26 @@
+"""Billing never creates a second invoice for a member and day."""
+import billing_cycle
+
+
+def test_already_billed_cycles_are_skipped(database, client, ids):
+    models = database
+    member_id = ids["member_id"]
+    with models.SessionLocal() as db:
+        latest = db.query(models.Billing).filter(models.Billing.member_id == member_id).order_by(
+            models.Billing.billing_date.desc()
+        ).first()
+        billing_id, billed_on, next_billing_date = latest.billing_id, latest.billing_date, latest.next_billing_date
+        invoices = db.query(models.Billing).filter(models.Billing.member_id == member_id).count()
+        # As if a concurrent run billed this cycle after the due-members SELECT
+        latest.next_billing_date = billed_on
+        db.commit()
+
+    billing_cycle.run(billed_on)
+    with models.SessionLocal() as db:
+        assert db.query(models.Billing).filter(models.Billing.member_id == member_id).count() == invoices
+        db.get(models.Billing, billing_id).next_billing_date = next_billing_date
+        db.commit()
+
+    response = client.post("/billing/", params={"member_id": member_id, "amount": 10,
+                                                "billing_date": billed_on.isoformat()})
+    assert response.status_code == 400
@@ -0,0 +1,27 @@
+"""Bulk writes keep the derived data the mapper events would have kept."""
+from datetime import date, timedelta
+import analytics
+import billing_cycle
+import precompute
+import rollups
+from registrations import bulk_register
+
+
+def test_bulk_writes_leave_no_drift(scratch_database, ids):
+    models = scratch_database
+    with models.SessionLocal() as db:
+        rollups.reconcile(db)
+        analytics.reconcile(db)
+        db.merge(models.PrecomputedRecommendation(member_id=ids["free_member_id"], top_n=5,
+                                                  recommendations="[]", weekly_schedule="{}"))
+        db.commit()
+
+        results = bulk_register(db, [(ids["free_member_id"], ids["schedule_id"]), (ids["member_id"], ids["schedule_id"])])
+        assert any(r["status"] == "registered" for r in results)
+        assert precompute.get_precomputed(db, ids["free_member_id"]) is None
+
+    assert billing_cycle.run(date.today() + timedelta(days=billing_cycle.BILLING_CYCLE_DAYS))["invoices"]
+
+    with models.SessionLocal() as db:
+        assert rollups.reconcile(db, dry_run=True) == {}
+        assert analytics.reconcile(db, dry_run=True) == {}
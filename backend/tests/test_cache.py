@@ -0,0 +1,64 @@
+"""Write-driven invalidation of the recommendation cache."""
+from cache import recommendation_cache
+
+
+def _change_time_slot(db, models, member_id):
+    member = db.get(models.Member, member_id)
+    member.preferred_time_slot = "Evening" if member.preferred_time_slot != "Evening" else "Morning"
+    db.flush()
+
+
+def test_invalidates_on_commit_not_on_flush_or_rollback(database, ids):
+    models = database
+    key = ("recommendations", ids["member_id"], 5)
+    recommendation_cache.set(key, ["cached"])
+
+    with models.SessionLocal() as db:
+        _change_time_slot(db, models, ids["member_id"])
+        assert recommendation_cache.get(key) == ["cached"]
+        db.rollback()
+    assert recommendation_cache.get(key) == ["cached"]
+
+    with models.SessionLocal() as db:
+        _change_time_slot(db, models, ids["member_id"])
+        db.commit()
+    assert recommendation_cache.get(key) is None
+
+
+def test_result_computed_before_commit_is_not_stored(database, ids):
+    models = database
+    key = ("recommendations", ids["member_id"], 7)
+
+    def compute():
+        # A concurrent write commits while the recommendation is computed
+        with models.SessionLocal() as db:
+            _change_time_slot(db, models, ids["member_id"])
+            db.commit()
+        return ["stale"]
+
+    assert recommendation_cache.get_or_compute(key, compute) == ["stale"]
+    assert recommendation_cache.get(key) is None
+
+
+def test_write_deletes_precomputed_entry(database, ids):
+    import precompute
+    models = database
+    member_id = ids["member_id"]
+
+    def store():
+        with models.SessionLocal() as db:
+            db.merge(models.PrecomputedRecommendation(member_id=member_id, top_n=5, recommendations="[]", weekly_schedule="{}"))
+            db.commit()
+
+    store()
+    with models.SessionLocal() as db:
+        _change_time_slot(db, models, member_id)
+        db.rollback()
+    with models.SessionLocal() as db:
+        assert precompute.get_precomputed(db, member_id) is not None
+
+    with models.SessionLocal() as db:
+        _change_time_slot(db, models, member_id)
+        db.commit()
+    with models.SessionLocal() as db:
+        assert precompute.get_precomputed(db, member_id) is None
@@ -0,0 +1,26 @@
+"""SQL counts in /metrics and the query budget come from one listener."""
+import re
+import query_budget
+
+
+def test_nested_counters_roll_up(database, ids):
+    models = database
+    with query_budget.count_queries() as outer:
+        with models.SessionLocal() as db:
+            db.get(models.Member, ids["member_id"])
+            with query_budget.count_queries() as inner:
+                db.get(models.ClassSchedule, ids["schedule_id"])
+    assert inner["count"] == 1
+    assert outer["count"] == 2
+    assert outer["db_time"] >= inner["db_time"] > 0
+
+
+def test_metrics_report_request_statements(client, ids):
+    before = query_budget.totals()["statements"]
+    client.get(f"/members/{ids['member_id']}/registrations").raise_for_status()
+    body = client.get("/metrics").text
+
+    total = float(re.search(r"^db_statements_total (\S+)$", body, re.M).group(1))
+    assert total > before
+    count = re.search(r'^http_request_sql_statements_count\{method="GET",route="/members/\{member_id\}/registrations"\} (\S+)$', body, re.M)
+    assert count and float(count.group(1)) >= 1
@@ -0,0 +1,97 @@
+"""Migrations build the schema the models describe."""
+from datetime import date, datetime, time
+from decimal import Decimal
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+import analytics
+import migrations
+import models
+import rollups
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted((index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                   for index in inspector.get_indexes(table))
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+def test_upgrade_matches_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    reference = create_engine(f"sqlite:///{tmp_path / 'create_all.db'}")
+    try:
+        assert migrations.upgrade(engine) == [version for version, _, _ in migrations.MIGRATIONS]
+        models.Base.metadata.create_all(bind=reference)
+
+        assert _schema(engine) == _schema(reference)
+        assert migrations.upgrade(engine) == []
+    finally:
+        engine.dispose()
+        reference.dispose()
+
+
+def _populated_baseline(tmp_path):
+    """An engine at schema version 1 holding one member, class, schedule,
+    registration and invoice, written without any mapper events."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    migrations.upgrade(engine, to_version=1)
+    tables = migrations.BASELINE
+    with engine.begin() as connection:
+        connection.execute(tables["members"].insert().values(
+            member_id=1, first_name="Ada", last_name="Lovelace", email="ada@example.com",
+            membership_level="Premium", membership_status="Active", join_date=datetime(2024, 3, 5)
+        ))
+        connection.execute(tables["classes"].insert().values(class_id=1, class_name="Spin", max_capacity=10))
+        connection.execute(tables["class_schedule"].insert().values(
+            schedule_id=1, class_id=1, day_of_week="Monday", start_time=time(9), end_time=time(10)
+        ))
+        connection.execute(tables["class_registrations"].insert().values(
+            member_id=1, schedule_id=1, registration_date=datetime(2024, 3, 6), attendance_status="Registered"
+        ))
+        connection.execute(tables["billing"].insert().values(
+            member_id=1, billing_date=date(2024, 3, 5), amount=Decimal("49.99"), payment_status="Pending"
+        ))
+    return engine
+
+
+def test_upgrade_fills_registration_counters(tmp_path):
+    engine = _populated_baseline(tmp_path)
+    try:
+        migrations.upgrade(engine)
+        with engine.connect() as connection:
+            counters = connection.execute(select(models.ScheduleCounter.schedule_id, models.ScheduleCounter.registered_count)).all()
+        assert counters == [(1, 1)]
+    finally:
+        engine.dispose()
+
+
+def test_upgrade_rebuilds_rollups(tmp_path):
+    engine = _populated_baseline(tmp_path)
+    try:
+        migrations.upgrade(engine)
+        with Session(engine) as db:
+            values = rollups.read(db)
+        assert values["members_total"] == 1
+        assert values["members_joined:2024-03"] == 1
+        assert values["billing_pending"] == Decimal("49.99")
+        assert values["registrations_schedule:1"] == 1
+    finally:
+        engine.dispose()
+
+
+def test_upgrade_rebuilds_analytics(tmp_path):
+    engine = _populated_baseline(tmp_path)
+    try:
+        migrations.upgrade(engine)
+        with Session(engine) as db:
+            revenue = analytics.revenue(db, date(2024, 3, 1), date(2024, 3, 31), grain="month")
+            attendance = analytics.attendance(db, date(2024, 3, 1), date(2024, 3, 31), grain="month")
+        assert revenue == [{"period": "2024-03-01", "revenue": 0.0, "outstanding": 49.99, "invoices": 1}]
+        assert attendance[0]["registrations"] == 1
+    finally:
+        engine.dispose()
@@ -0,0 +1,71 @@
+"""Hot endpoints stay within their SQL statement budget.
+
+Runs with SQL_BUDGET_MODE=raise, so a route that goes over budget (an N+1
+regression) raises QueryBudgetExceeded and fails the test.
+"""
+import pytest
+import query_budget
+
+HOT_READS = [
+    "/members/",
+    "/members/{member_id}",
+    "/members/{member_id}/registrations",
+    "/members/{member_id}/billing",
+    "/members/{member_id}/recommendations?mode=prefetch",
+    "/members/{member_id}/recommendations?mode=tools",
+    "/members/{member_id}/weekly-schedule",
+    "/classes/",
+    "/classes/{class_id}",
+    "/schedule/",
+    "/schedule/{schedule_id}",
+    "/membership-plans/",
+    "/billing/pending",
+    "/admin/stats",
+    "/analytics/revenue",
+    "/analytics/attendance?group_by=class",
+]
+
+
+@pytest.fixture
+def raise_mode(monkeypatch):
+    monkeypatch.setattr(query_budget, "MODE", "raise")
+
+
+@pytest.mark.parametrize("path", HOT_READS)
+def test_read_within_budget(path, client, ids, raise_mode):
+    response = client.get(path.format(**ids))
+    assert response.status_code == 200
+    assert "X-SQL-Queries" in response.headers
+
+
+def test_writes_within_budget(client, ids, raise_mode):
+    schedule_id, member_id = ids["schedule_id"], ids["free_member_id"]
+
+    response = client.post("/registrations/", params={"member_id": member_id, "schedule_id": schedule_id})
+    assert response.status_code == 200
+    registration_id = response.json()["registration"]["registration_id"]
+    assert client.post(f"/registrations/{registration_id}/cancel").status_code == 200
+
+    response = client.post("/registrations/bulk", json=[
+        {"member_id": member_id, "schedule_id": schedule_id},
+        {"member_id": ids["member_id"], "schedule_id": schedule_id},
+    ])
+    assert response.status_code == 200
+    for result in response.json()["results"]:
+        if result["status"] == "registered":
+            assert client.post(f"/registrations/{result['registration_id']}/cancel").status_code == 200
+
+
+def test_over_budget_raises(client, ids, raise_mode, monkeypatch):
+    monkeypatch.setitem(query_budget.ROUTE_BUDGETS, "get_member_registrations", 0)
+    with pytest.raises(query_budget.QueryBudgetExceeded):
+        client.get(f"/members/{ids['member_id']}/registrations")
+
+
+def test_off_mode_counts_without_keeping_statements(database, monkeypatch):
+    models = database
+    monkeypatch.setattr(query_budget, "MODE", "off")
+    with query_budget.count_queries() as counter, models.SessionLocal() as db:
+        db.query(models.Member).first()
+    assert counter["count"] == 1
+    assert counter["statements"] == []
@@ -0,0 +1,102 @@
+"""The hot endpoint queries use an index.
+
+Drives each hot path against the seeded database and runs EXPLAIN QUERY
+PLAN on every statement it executes. A statement that reads one of the
+large tables with a full table scan fails; scans through an index
+(covering or not) and small catalog tables are fine.
+"""
+from sqlalchemy import event
+from datetime import datetime
+import re
+import pytest
+
+# Tables that grow with members and history; the rest are small catalogs
+LARGE_TABLES = {"members", "class_registrations", "billing", "waitlist_entries", "class_schedule"}
+
+# "SCAN members" (SQLite >= 3.36) or "SCAN TABLE members" without "USING ... INDEX"
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def _get(path, **params):
+    return lambda client, ids: client.get(path.format(**ids), params=params).raise_for_status()
+
+def _register_and_cancel(client, ids):
+    response = client.post("/registrations/", params={"member_id": ids["free_member_id"], "schedule_id": ids["schedule_id"]})
+    response.raise_for_status()
+    registration_id = response.json()["registration"]["registration_id"]
+    client.post(f"/registrations/{registration_id}/cancel").raise_for_status()
+
+def _waitlist_round_trip(client, ids):
+    import models
+    schedule_id, member_id = ids["schedule_id"], ids["free_member_id"]
+    # The seeded class has free spots, so joining would register straight away; queue the member directly
+    with models.SessionLocal() as db:
+        db.add(models.WaitlistEntry(member_id=member_id, schedule_id=schedule_id, priority=0, joined_at=datetime.now()))
+        db.commit()
+    assert client.post(f"/schedule/{schedule_id}/waitlist", params={"member_id": member_id}).status_code == 400
+    client.get(f"/schedule/{schedule_id}/waitlist/{member_id}").raise_for_status()
+    client.delete(f"/schedule/{schedule_id}/waitlist/{member_id}").raise_for_status()
+
+def _precomputed_lookup(client, ids):
+    import models
+    import precompute
+    with models.SessionLocal() as db:
+        precompute.get_precomputed(db, ids["member_id"])
+
+def _dashboard_stats(client, ids):
+    import models
+    import admin_stats
+    with models.SessionLocal() as db:
+        admin_stats.compute_admin_stats(db)
+
+HOT_PATHS = {
+    "GET /members/{id}": _get("/members/{member_id}"),
+    "GET /members/{id}/registrations": _get("/members/{member_id}/registrations"),
+    "GET /members/{id}/billing": _get("/members/{member_id}/billing"),
+    "GET /billing/pending": _get("/billing/pending"),
+    "GET /classes/{id}": _get("/classes/{class_id}"),
+    "GET /schedule/?day=": _get("/schedule/", day="Monday"),
+    "GET /schedule/{id}": _get("/schedule/{schedule_id}"),
+    "GET /analytics/revenue": _get("/analytics/revenue"),
+    "GET /analytics/attendance": _get("/analytics/attendance", group_by="class"),
+    "POST /registrations/ + cancel": _register_and_cancel,
+    "waitlist join, position, leave": _waitlist_round_trip,
+    "precomputed recommendation lookup": _precomputed_lookup,
+    "admin stats": _dashboard_stats,
+}
+
+
+@pytest.fixture(scope="module")
+def captured(database):
+    """Statements (with parameters) executed on any engine, in order."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            statements.append((statement, parameters))
+
+    for engine in database.ENGINES:
+        event.listen(engine, "before_cursor_execute", capture)
+    yield statements
+    for engine in database.ENGINES:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("hot_path", HOT_PATHS)
+def test_hot_path_uses_indexes(hot_path, database, client, ids, captured):
+    captured.clear()
+    HOT_PATHS[hot_path](client, ids)
+    statements = list(dict.fromkeys(
+        (s, tuple(p) if isinstance(p, (list, tuple)) else p) for s, p in captured
+    ))
+    assert statements
+
+    scans = []
+    with database.engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            scanned = sorted({m.group(1) for m in map(_FULL_SCAN.match, plan) if m} & LARGE_TABLES)
+            if scanned:
+                scans.append(f"{', '.join(scanned)}: {' '.join(statement.split())[:200]}\n    " + "\n    ".join(plan))
+
+    assert not scans, "Full table scans:\n" + "\n".join(scans)
@@ -0,0 +1,75 @@
+"""Upstream LLM calls: breaker trials end on cancellation, deadlines hold and count as failures."""
+import asyncio
+import time
+import pytest
+from ai_recommender import GymRecommender
+from llm_client import ReplayClient
+from resilience import CircuitBreaker
+
+MESSAGES = [{"role": "user", "content": "Explain this schedule."}]
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0)
+    breaker.record(0.0, ok=False)
+    assert breaker.state == "open"
+    return breaker
+
+
+class SlowClient(ReplayClient):
+    """Ignores its ``timeout``, like an SDK that retries after a timeout."""
+
+    async def achat(self, **kwargs):
+        kwargs.pop("timeout", None)
+        return await super().achat(**kwargs)
+
+
+def test_cancelled_trial_is_released():
+    breaker = _half_open_breaker()
+    recommender = GymRecommender(llm=ReplayClient(latency=5), breaker=breaker)
+    recommender._start_deadline(0)
+
+    async def cancel_trial():
+        task = asyncio.create_task(recommender._acomplete(messages=MESSAGES))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_stream_closed_early_releases_trial():
+    breaker = _half_open_breaker()
+    recommender = GymRecommender(llm=ReplayClient(chunk_chars=4), breaker=breaker)
+    recommender._start_deadline(0)
+
+    async def read_one_chunk():
+        stream = recommender._acomplete_stream(messages=MESSAGES)
+        await anext(stream)
+        await stream.aclose()
+
+    asyncio.run(read_one_chunk())
+    assert breaker.allow()
+
+
+def test_deadline_bounds_the_whole_call():
+    recommender = GymRecommender(llm=SlowClient(latency=5), breaker=CircuitBreaker())
+    recommender._start_deadline(0.1)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(recommender._acomplete(messages=MESSAGES))
+    assert time.monotonic() - started < 1
+
+
+def test_deadline_counts_as_a_failure():
+    breaker = CircuitBreaker(min_calls=1, slow_call_seconds=10)
+    recommender = GymRecommender(llm=ReplayClient(latency=5), breaker=breaker)
+    recommender._start_deadline(0.05)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(recommender._acomplete(messages=MESSAGES))
+    assert breaker.state == "open"
@@ -0,0 +1,48 @@
+"""Waitlist positions and cancellations read the database, not worker state."""
+from datetime import datetime
+import capacity
+import rollups
+import waitlist
+
+
+def test_positions_follow_other_sessions(database, ids):
+    models = database
+    schedule_id = ids["schedule_id"]
+    with models.SessionLocal() as writer, models.ReadSessionLocal() as reader:
+        members = [m for (m,) in writer.query(models.Member.member_id).limit(3)]
+        entries = [models.WaitlistEntry(member_id=m, schedule_id=schedule_id, priority=p, joined_at=datetime(2024, 1, 1, 9, i))
+                   for i, (m, p) in enumerate(zip(members, (0, 0, 3)))]
+        writer.add_all(entries)
+        writer.commit()
+        reader.rollback()
+        assert waitlist.position(reader, schedule_id, members[2]) == (1, 3)
+        assert waitlist.position(reader, schedule_id, members[1]) == (3, 3)
+
+        waitlist.leave(writer, entries[0])
+        writer.commit()
+        reader.rollback()
+        assert waitlist.position(reader, schedule_id, members[1]) == (2, 2)
+        assert waitlist.position(reader, schedule_id, members[0]) is None
+
+        for entry in entries[1:]:
+            waitlist.leave(writer, entry)
+        writer.commit()
+        reader.rollback()
+        assert waitlist.length(reader, schedule_id) == 0
+        assert rollups.reconcile(reader, dry_run=True) == {}
+
+
+def test_second_cancel_releases_nothing(database, client, ids):
+    models = database
+    schedule_id = ids["schedule_id"]
+    response = client.post("/registrations/", params={"member_id": ids["free_member_id"], "schedule_id": schedule_id})
+    registration_id = response.json()["registration"]["registration_id"]
+    with models.SessionLocal() as db:
+        registered = capacity.registered_count(db, schedule_id)
+
+    assert client.post(f"/registrations/{registration_id}/cancel").status_code == 200
+    response = client.post(f"/registrations/{registration_id}/cancel")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot cancel a registration that is Cancelled"
+    with models.SessionLocal() as db:
+        assert capacity.registered_count(db, schedule_id) == registered - 1
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import models
+
+# Shared across requests so a burst of tool calls doesn't spin up new threads each turn
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RECOMMENDER_TOOL_WORKERS", "8")),
+    thread_name_prefix="recommender-tool"
+)
+
+class ToolExecutor:
+    """Runs the tool calls of one model turn concurrently.
+
+    Each call gets its own DB session (a Session must not be shared across
+    threads). Results are memoized per (function, args) for the life of the
+    conversation, and every run is timed in ``timings``.
+    """
+
+    def __init__(self, recommender, session_factory=None):
+        self.recommender = recommender
+        # Load the shared catalog up front so worker threads don't race to build it
+        recommender.scoring
+        self.session_factory = session_factory or models.ReadSessionLocal
+        self.timings = []
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _key(self, function_name: str, function_args: dict):
+        return function_name, json.dumps(function_args, sort_keys=True)
+
+    def _run(self, function_name: str, function_args: dict):
+        db = self.session_factory()
+        try:
+            worker = self.recommender.for_session(db)
+            started = time.perf_counter()
+            result = worker._dispatch_tool(function_name, function_args)
+            duration_ms = (time.perf_counter() - started) * 1000
+        finally:
+            db.close()
+
+        with self._lock:
+            self.timings.append({
+                "tool": function_name,
+                "args": function_args,
+                "duration_ms": round(duration_ms, 3),
+                "cached": False
+            })
+        return result
+
+    def submit(self, function_name: str, function_args: dict):
+        key = self._key(function_name, function_args)
+        with self._lock:
+            future = self._memo.get(key)
+            if future is not None:
+                self.timings.append({
+                    "tool": function_name,
+                    "args": function_args,
+                    "duration_ms": 0.0,
+                    "cached": True
+                })
+                return future
+
+            # Carry the caller's context (e.g. per-request instrumentation) into the worker
+            context = contextvars.copy_context()
+            future = _pool.submit(context.run, self._run, function_name, function_args)
+            self._memo[key] = future
+            return future
+
+    async def arun_all(self, calls, timeout: float = None):
+        """Run ``[(function_name, function_args), ...]`` and return results in
+        order, awaiting the worker threads without blocking the event loop.
+
+        Raises ``TimeoutError`` if they don't all finish within ``timeout`` seconds.
+        """
+        futures = [asyncio.wrap_future(self.submit(name, args)) for name, args in calls]
+        return await asyncio.wait_for(asyncio.gather(*futures), timeout)
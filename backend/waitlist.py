@@ -0,0 +1,145 @@
+"""Per-schedule waitlists.
+
+``waitlist_entries`` is the source of truth; promotion always picks the
+next entry from the table inside the caller's transaction, and claims it
+with a conditional UPDATE so two concurrent cancellations can't promote
+the same member. A position counts only the entries ahead of the member,
+a range of the ``ix_waitlist_entries_queue`` index, and the length is the
+``waitlist_schedule:<id>`` rollup (rollups.py), kept in the writing
+transaction, so every worker sees the same queue.
+
+Members are ordered by priority (membership level, Platinum first), then by
+when they joined the waitlist.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, or_, update
+from datetime import datetime
+import models
+import capacity
+import rollups
+from scoring import LEVELS
+
+def priority_for(member: models.Member) -> int:
+    return LEVELS.index(member.membership_level) if member.membership_level in LEVELS else 0
+
+def _ahead_of(entry: models.WaitlistEntry):
+    """Waiting entries queued before ``entry``, in promotion order."""
+    WaitlistEntry = models.WaitlistEntry
+    return or_(
+        WaitlistEntry.priority > entry.priority,
+        and_(WaitlistEntry.priority == entry.priority, or_(
+            WaitlistEntry.joined_at < entry.joined_at,
+            and_(WaitlistEntry.joined_at == entry.joined_at, WaitlistEntry.entry_id < entry.entry_id)
+        ))
+    )
+
+def _waiting(schedule_id: int):
+    return (models.WaitlistEntry.schedule_id == schedule_id, models.WaitlistEntry.status == "Waiting")
+
+def position(db: Session, schedule_id: int, member_id: int):
+    """(1-based position, queue length), or None if the member isn't waiting."""
+    entry = waiting_entry(db, schedule_id, member_id)
+    if entry is None:
+        return None
+    ahead = db.query(func.count(models.WaitlistEntry.entry_id)).filter(
+        *_waiting(schedule_id), _ahead_of(entry)
+    ).scalar()
+    return ahead + 1, length(db, schedule_id)
+
+def length(db: Session, schedule_id: int) -> int:
+    value = db.query(models.KpiRollup.value).filter(
+        models.KpiRollup.key == f"waitlist_schedule:{schedule_id}"
+    ).scalar()
+    return int(value or 0)
+
+def waiting_entry(db: Session, schedule_id: int, member_id: int):
+    return db.query(models.WaitlistEntry).filter(
+        models.WaitlistEntry.schedule_id == schedule_id,
+        models.WaitlistEntry.member_id == member_id,
+        models.WaitlistEntry.status == "Waiting"
+    ).first()
+
+def join(db: Session, member: models.Member, schedule_id: int):
+    """Add a member to a schedule's waitlist, in the caller's transaction.
+
+    Promotes straight away if a spot is (or became) free, so a join racing
+    a cancellation can't leave someone waiting next to an empty spot.
+    Returns ``(entry, promoted)``.
+    """
+    entry = models.WaitlistEntry(
+        member_id=member.member_id,
+        schedule_id=schedule_id,
+        priority=priority_for(member),
+        joined_at=datetime.now()
+    )
+    db.add(entry)
+    db.flush()
+    return entry, promote(db, schedule_id)
+
+def _claim(db: Session, entry: models.WaitlistEntry, status: str) -> bool:
+    """Move a Waiting entry to ``status`` with a conditional UPDATE. Returns
+    False if another transaction moved it first."""
+    schedule_id = entry.schedule_id
+    claimed = db.execute(
+        update(models.WaitlistEntry)
+        .where(models.WaitlistEntry.entry_id == entry.entry_id, models.WaitlistEntry.status == "Waiting")
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.expire(entry)
+    if claimed:
+        # A bulk UPDATE, which the rollup events don't see
+        rollups.apply(db, {key: -amount for key, amount in rollups.waitlist_contribution(schedule_id, "Waiting").items()})
+    return bool(claimed)
+
+def leave(db: Session, entry: models.WaitlistEntry) -> bool:
+    """Take an entry off the waitlist, unless it was promoted meanwhile."""
+    return _claim(db, entry, "Left")
+
+def promote(db: Session, schedule_id: int):
+    """Register waiting members while the schedule has free spots, in the
+    caller's transaction. Returns the promoted member ids."""
+    promoted = []
+    while True:
+        entry = db.query(models.WaitlistEntry).filter(
+            models.WaitlistEntry.schedule_id == schedule_id,
+            models.WaitlistEntry.status == "Waiting"
+        ).order_by(
+            models.WaitlistEntry.priority.desc(),
+            models.WaitlistEntry.joined_at,
+            models.WaitlistEntry.entry_id
+        ).first()
+        if entry is None:
+            break
+
+        registration = db.query(models.ClassRegistration).filter(
+            models.ClassRegistration.member_id == entry.member_id,
+            models.ClassRegistration.schedule_id == schedule_id
+        ).first()
+        already_registered = registration is not None and registration.attendance_status != "Cancelled"
+
+        if not already_registered and not capacity.reserve_spot(db, schedule_id):
+            break
+
+        member_id = entry.member_id
+        if not _claim(db, entry, "Left" if already_registered else "Promoted"):
+            # Someone else took this entry; give the spot back and look again
+            if not already_registered:
+                capacity.release_spot(db, schedule_id)
+            continue
+        if already_registered:
+            continue
+
+        if registration:
+            registration.attendance_status = "Registered"
+            registration.registration_date = datetime.now()
+        else:
+            db.add(models.ClassRegistration(
+                member_id=member_id,
+                schedule_id=schedule_id,
+                registration_date=datetime.now()
+            ))
+        db.flush()
+        promoted.append(member_id)
+
+    return promoted